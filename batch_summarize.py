@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from common.summarizer import summarize_single_shot, summarize_map_reduce
+from common.llm import get_backend
+from summarize import split_pdf_into_chunks
+from qa_new.utils.helpers import file_digest
+
+class BoundedBackend:
+    """
+    Wraps an LLM backend so that at most `limit` structured calls are in flight across
+    every PDF being summarized, however the per-PDF map step fans out.
+    """
+
+    def __init__(self, backend, limit):
+        self._backend = backend
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def structured(self, prompt, response_model):
+        with self._semaphore:
+            return self._backend.structured(prompt, response_model)
+
+def collect_inputs(source):
+    """
+    Accepts a directory (every *.pdf below it), a JSON list of paths, or a text file with one path per line.
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, files in os.walk(source)
+            for name in files if name.lower().endswith(".pdf")
+        )
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        content = f.read().strip()
+    paths = json.loads(content) if content.startswith("[") else [line.strip() for line in content.splitlines()]
+    return [p if os.path.isabs(p) else os.path.join(base, p) for p in paths if p and not p.startswith("#")]
+
+def inputs_root(source, inputs):
+    """
+    Directory the output tree mirrors: the source directory itself, or for a manifest the
+    deepest folder containing every listed PDF, so reports/TCS/concall/Q4.pdf and
+    reports/INFY/concall/Q4.pdf keep their stock folders instead of both becoming Q4.json.
+    """
+    if os.path.isdir(source):
+        return source
+    return os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in inputs]) if inputs else None
+
+def output_path(out_dir, pdf_path, root):
+    relative = os.path.relpath(os.path.abspath(pdf_path), os.path.abspath(root))
+    return os.path.join(out_dir, os.path.splitext(relative)[0] + ".json")
+
+def is_done(out_file, digest):
+    try:
+        with open(out_file) as f:
+            return json.load(f).get("input_sha256") == digest
+    except (OSError, json.JSONDecodeError):
+        return False
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def summarize_one(backend, pdf_path, out_file, digest, mode, map_budget, reduce_budget, map_workers):
+    chunks = split_pdf_into_chunks(pdf_path)
+    if mode == "single_shot":
+        report, stats = summarize_single_shot(backend, chunks)
+    else:
+        report, stats = summarize_map_reduce(
+            backend, chunks,
+            map_budget=map_budget,
+            reduce_budget=reduce_budget,
+            workers=map_workers
+        )
+    write_atomic(out_file, {
+        "input": pdf_path,
+        "input_sha256": digest,
+        "stats": stats.as_dict(),
+        "report": report.model_dump(),
+    })
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize many concall PDFs into one ExtractedReport JSON each")
+    parser.add_argument("source", help="Directory of PDFs, or a manifest (JSON list or one path per line)")
+    parser.add_argument("--out", default="summaries", help="Output directory")
+    parser.add_argument("--mode", choices=["map_reduce", "single_shot"], default="map_reduce")
+    parser.add_argument("--model", default="models/gemini-2.5-flash")
+    parser.add_argument("--max-llm-calls", type=int, default=8, help="LLM calls in flight across all PDFs")
+    parser.add_argument("--files", type=int, default=4, help="PDFs processed at the same time")
+    parser.add_argument("--map-budget", type=int, default=6000)
+    parser.add_argument("--reduce-budget", type=int, default=12000)
+    args = parser.parse_args()
+
+    inputs = collect_inputs(args.source)
+    root = inputs_root(args.source, inputs)
+    backend = BoundedBackend(get_backend(args.model), args.max_llm_calls)
+
+    pending = []
+    for pdf_path in inputs:
+        out_file = output_path(args.out, pdf_path, root)
+        digest = file_digest(pdf_path)
+        if is_done(out_file, digest):
+            print(f"⏭️ {pdf_path}: up to date")
+        else:
+            pending.append((pdf_path, out_file, digest))
+
+    print(f"{len(pending)} of {len(inputs)} PDFs to summarize")
+    started = time.perf_counter()
+    failed = 0
+
+    with ThreadPoolExecutor(max_workers=args.files) as pool:
+        futures = {
+            pool.submit(
+                summarize_one, backend, pdf_path, out_file, digest, args.mode,
+                args.map_budget, args.reduce_budget, args.max_llm_calls
+            ): pdf_path
+            for pdf_path, out_file, digest in pending
+        }
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            try:
+                stats = future.result()
+                print(f"✅ {pdf_path}: {stats.as_dict()}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {pdf_path}: {e}")
+
+    print(f"Done in {time.perf_counter() - started:.1f}s, {len(pending) - failed} written, {failed} failed")
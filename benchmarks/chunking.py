@@ -0,0 +1,144 @@
+"""
+Compares the structured chunker with the old fixed-size recursive splitter on the bundled
+transcripts: chunk count and characters to embed, how many analyst questions end up in a
+different chunk from the start of their answer (and how many of them the moderator announces
+in a form QUESTION_FROM does not parse), and BM25 retrieval on the labelled TCS queries.
+
+    python benchmarks/chunking.py
+    python benchmarks/chunking.py --pdfs deepak.pdf "blue star.pdf" --max-chars 1500
+
+Recall is reported both at k chunks and at a fixed context size in characters, since larger
+chunks would otherwise win recall@k simply by carrying more text into the prompt.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import tempfile
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "qa_new"))
+
+from common.chunking import split_pages, clean_lines, find_turns, is_transcript, MAX_CHUNK_CHARS, QUESTION_FROM, CLOSING
+from common.llm import estimate_tokens
+from common.pdf_text import load_pages
+from retrieval import load_queries, squash
+
+STRATEGIES = {
+    "recursive-1000": dict(strategy="recursive", chunk_size=1000, chunk_overlap=100),
+    "recursive-800": dict(strategy="recursive", chunk_size=800, chunk_overlap=100),
+    "structured": dict(strategy="structured"),
+}
+
+def question_pairs(pages, edge=80):
+    """
+    (end of question, start of answer, announcement parsed) for every analyst question: the
+    turn after a moderator turn, by someone who did not speak in the prepared remarks, and
+    the turn after it. Found from the turns alone, not from how the chunker reads the
+    moderator's announcement (QUESTION_FROM), so questions the chunker misses still count.
+    """
+    _, turns = find_turns(clean_lines(pages))
+    if not is_transcript(turns):
+        return []
+    # Prepared remarks end at the first moderator turn after management has spoken.
+    management = set()
+    for turn in turns:
+        if turn["role"] == "moderator" and management:
+            break
+        if turn["role"] != "moderator":
+            management.add(turn["speaker"])
+    pairs = []
+    for previous, question, answer in zip(turns, turns[1:], turns[2:]):
+        if (previous["role"] == "moderator" and not CLOSING.search(previous["text"])
+                and question["role"] != "moderator" and question["speaker"] not in management
+                and answer["role"] != "moderator"):
+            pairs.append((squash(question["text"])[-edge:], squash(answer["text"])[:edge],
+                          bool(QUESTION_FROM.search(previous["text"]))))
+    return pairs
+
+def split_pairs(chunks, pairs):
+    texts = [squash(c.page_content) for c in chunks]
+    return sum(not any(q in text and a in text for text in texts) for q, a, _ in pairs)
+
+def chunk_stats(files, options):
+    totals = {"chunks": 0, "chars": 0, "tokens": 0, "pairs": 0, "pairs_unparsed": 0, "pairs_split": 0, "seconds": 0.0}
+    per_file = {}
+    for name, pages in files.items():
+        start = time.perf_counter()
+        chunks = split_pages(pages, doc_type="concall", **options)
+        seconds = time.perf_counter() - start
+        pairs = question_pairs(pages)
+        row = {
+            "chunks": len(chunks),
+            "chars": sum(len(c.page_content) for c in chunks),
+            "tokens": sum(estimate_tokens(c.page_content) for c in chunks),
+            "max_chars": max((len(c.page_content) for c in chunks), default=0),
+            "pairs": len(pairs),
+            "pairs_unparsed": sum(not parsed for _, _, parsed in pairs),
+            "pairs_split": split_pairs(chunks, pairs),
+            "seconds": round(seconds, 4),
+        }
+        per_file[name] = row
+        for key in totals:
+            totals[key] += row[key]
+    totals["seconds"] = round(totals["seconds"], 4)
+    return totals, per_file
+
+def retrieval_stats(reports, rows, options, ks=(5, 10), budgets=(4000, 8000)):
+    from utils.sparse_index import SparseIndex
+
+    index = SparseIndex(path=os.path.join(tempfile.mkdtemp(prefix="chunking-bench-"), "bm25.json"))
+    total_chunks = 0
+    for path, doc_type in reports:
+        chunks = split_pages(load_pages(path), doc_type=doc_type, **options)
+        for chunk in chunks:
+            chunk.metadata["stock"] = "TCS"
+        index.add([f"{path}:{i}" for i in range(len(chunks))], chunks)
+        total_chunks += len(chunks)
+
+    found = {f"@{k}": 0 for k in ks}
+    found.update({f"@{budget}chars": 0 for budget in budgets})
+    snippets = 0
+    for row in rows:
+        docs = [doc for _, _, doc in index.search(row["query"], k=max(ks) * 4, where={"stock": row["stock"]})]
+        texts = [squash(d.page_content) for d in docs]
+        for snippet in row["relevant"]:
+            snippet = squash(snippet)
+            rank = next((i for i, text in enumerate(texts) if snippet in text), None)
+            snippets += 1
+            if rank is None:
+                continue
+            for k in ks:
+                found[f"@{k}"] += rank < k
+            used = sum(len(d.page_content) for d in docs[:rank + 1])
+            for budget in budgets:
+                found[f"@{budget}chars"] += used <= budget
+    return {"chunks": total_chunks, "recall": {key: round(value / snippets, 3) for key, value in found.items()}}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", help="Transcripts to chunk (default: ./*.pdf)")
+    parser.add_argument("--queries", default=os.path.join(ROOT_DIR, "benchmarks", "retrieval_queries.jsonl"))
+    parser.add_argument("--reports", default=os.path.join(ROOT_DIR, "qa_new", "reports", "TCS"),
+                        help="reports/<stock> folder the queries are labelled against")
+    parser.add_argument("--max-chars", type=int, default=MAX_CHUNK_CHARS)
+    args = parser.parse_args()
+
+    STRATEGIES["structured"]["max_chars"] = args.max_chars
+    pdfs = args.pdfs or sorted(glob.glob(os.path.join(ROOT_DIR, "*.pdf")))
+    files = {os.path.basename(path): load_pages(path) for path in pdfs}
+    reports = [
+        (path, "concall" if os.path.basename(os.path.dirname(path)).lower() == "concall" else "announcement")
+        for path in sorted(glob.glob(os.path.join(args.reports, "*", "*.pdf")))
+    ]
+    rows = load_queries(args.queries)
+
+    # Imports the recursive splitter outside the timings.
+    split_pages(next(iter(files.values()))[:1], strategy="recursive")
+    result = {}
+    for name, options in STRATEGIES.items():
+        totals, per_file = chunk_stats(files, options)
+        result[name] = {"totals": totals, "files": per_file, "retrieval": retrieval_stats(reports, rows, options)}
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,86 @@
+"""
+Before/after report for context packing: prompt tokens and chunks sent to the LLM with and
+without merging, de-duplication and the token budget, plus whether the labelled snippets
+are still in the packed context.
+
+    python benchmarks/context_packing.py                      # bundled TCS queries
+    python benchmarks/context_packing.py queries.jsonl --budget 3000 --generate
+
+--generate also times answer generation on both contexts (real LLM calls unless LLM_PROVIDER=stub).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "qa_new"))
+
+from utils.context_packer import CONTEXT_TOKEN_BUDGET, pack_context
+from retrieval import load_queries, squash
+
+def covered(docs, snippets):
+    text = squash(" ".join(d.page_content for d in docs))
+    return sum(squash(s) in text for s in snippets)
+
+def benchmark(rows, retrieve, budget=CONTEXT_TOKEN_BUDGET, generate=None, build_prompt=None):
+    totals = {"tokens_before": 0, "tokens_after": 0, "chunks_in": 0, "chunks_out": 0,
+              "merged": 0, "duplicates": 0, "over_budget": 0}
+    coverage_before = coverage_after = snippets = 0
+    pack_latencies, latency_before, latency_after = [], [], []
+
+    for row in rows:
+        docs = retrieve(row["stock"], row["query"], {"stock": row["stock"]})
+
+        start = time.perf_counter()
+        packed, report = pack_context(docs, budget=budget)
+        pack_latencies.append(time.perf_counter() - start)
+
+        for key in totals:
+            totals[key] += report[key]
+        snippets += len(row["relevant"])
+        coverage_before += covered(docs, row["relevant"])
+        coverage_after += covered(packed, row["relevant"])
+
+        if generate:
+            for context, latencies in ((docs, latency_before), (packed, latency_after)):
+                start = time.perf_counter()
+                generate(build_prompt(row["stock"], row["query"], context))
+                latencies.append(time.perf_counter() - start)
+
+    result = {
+        "queries": len(rows),
+        "budget": budget,
+        "totals": totals,
+        "token_reduction": 1 - totals["tokens_after"] / totals["tokens_before"] if totals["tokens_before"] else 0.0,
+        "snippet_coverage": {
+            "before": coverage_before / snippets if snippets else None,
+            "after": coverage_after / snippets if snippets else None,
+        },
+        "pack_latency_ms_p50": statistics.median(pack_latencies) * 1e3 if pack_latencies else 0.0,
+    }
+    if generate:
+        result["generation_latency_s_p50"] = {
+            "before": statistics.median(latency_before),
+            "after": statistics.median(latency_after),
+        }
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=os.path.join(ROOT_DIR, "benchmarks", "retrieval_queries.jsonl"))
+    parser.add_argument("--budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--generate", action="store_true", help="Also time answer generation before/after")
+    args = parser.parse_args()
+
+    rows = load_queries(os.path.abspath(args.path))
+    os.chdir(os.path.join(ROOT_DIR, "qa_new"))
+    from main import retrieve, build_prompt, answer_model
+
+    print(json.dumps(benchmark(
+        rows, retrieve, budget=args.budget,
+        generate=answer_model.generate if args.generate else None,
+        build_prompt=build_prompt
+    ), indent=2))
@@ -0,0 +1,114 @@
+"""
+Import-time budget for the entry points: each one is imported in a fresh interpreter under
+`python -X importtime`, so the numbers are what a worker start, a CLI or a test pays before
+it does any work.
+
+    python benchmarks/import_time.py                      # report, exit 1 if over budget
+    python benchmarks/import_time.py --repeat 5 --top 15
+    python benchmarks/import_time.py --only qa_new/main.py --json
+
+Importing an entry point must not parse PDFs, call an LLM, open Chroma or build SDK clients;
+those happen on first use (or in qa_new main.warm_up()). HEAVY lists the packages that
+should only show up once that work starts; any of them in an import is reported.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> directory it is run from (its imports are relative to it).
+ENTRY_POINTS = {
+    "qa_new/main.py": "qa_new",
+    "qa_new/ingest.py": "qa_new",
+    "summarize.py": ".",
+    "batch_summarize.py": ".",
+    "main1.py": ".",
+    "main2.py": ".",
+    "gemini_flash.py": ".",
+    "qa/ask.py": "qa",
+    "qa/train.py": "qa",
+}
+BUDGET_FILE = os.path.join(ROOT_DIR, "benchmarks", "import_budget.json")
+HEAVY = (
+    "chromadb", "langchain_community", "langchain_google_genai", "langchain_text_splitters",
+    "google.generativeai", "openai", "instructor", "sentence_transformers", "faiss", "pypdf",
+)
+
+def parse_importtime(stderr):
+    """-> (total self microseconds, {top-level package: self microseconds}, all module names)"""
+    total = 0
+    packages = {}
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        name = name.strip()
+        total += int(self_us)
+        modules.add(name)
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return total, packages, modules
+
+def measure(entry, directory, repeat):
+    module = os.path.splitext(os.path.basename(entry))[0]
+    cwd = os.path.join(ROOT_DIR, directory)
+    code = f"import sys; sys.path.insert(0, {cwd!r}); import {module}"
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd, capture_output=True, text=True)
+        if proc.returncode:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+            return {"error": error}
+        runs.append(parse_importtime(proc.stderr))
+    totals = [total for total, _, _ in runs]
+    _, packages, modules = min(runs, key=lambda r: r[0])
+    return {
+        "ms": round(statistics.median(totals) / 1000, 1),
+        "min_ms": round(min(totals) / 1000, 1),
+        "packages": {name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda kv: -kv[1])},
+        "heavy": [h for h in HEAVY if any(name == h or name.startswith(h + ".") for name in modules)],
+    }
+
+def load_budget(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(ENTRY_POINTS), help="Entry points to measure (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per entry point; the median is reported")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest packages to list")
+    parser.add_argument("--budget", default=BUDGET_FILE, help="JSON {entry point: milliseconds}")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    budget = load_budget(args.budget)
+    results = {entry: measure(entry, ENTRY_POINTS[entry], args.repeat) for entry in args.only or ENTRY_POINTS}
+    failed = []
+    for entry, result in results.items():
+        limit = budget.get(entry)
+        result["budget_ms"] = limit
+        if "error" in result or (limit is not None and result["ms"] > limit):
+            failed.append(entry)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for entry, result in results.items():
+            if "error" in result:
+                print(f"❌ {entry}: import failed: {result['error']}")
+                continue
+            mark = "❌" if entry in failed else "✅"
+            limit = f" (budget {result['budget_ms']} ms)" if result["budget_ms"] is not None else ""
+            print(f"{mark} {entry}: {result['ms']} ms{limit}")
+            for name, ms in list(result["packages"].items())[:args.top]:
+                print(f"      {ms:>8.1f} ms  {name}")
+            if result["heavy"]:
+                print(f"      heavy imports: {', '.join(result['heavy'])}")
+    sys.exit(1 if failed else 0)
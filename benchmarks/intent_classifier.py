@@ -0,0 +1,100 @@
+"""
+Compares the local keyword intent classifier against LLM labels.
+
+    python benchmarks/intent_classifier.py                       # labels logged by /chat
+    python benchmarks/intent_classifier.py queries.txt --relabel # label a query list with the LLM first
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "qa_new"))
+
+from utils.intent_classifier import (
+    DOC_TYPES, LOCAL_CONFIDENCE_THRESHOLD, classify_local, get_doc_types_llm
+)
+
+def load_labelled(path, relabel=False):
+    rows = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if relabel:
+                query = json.loads(line)["query"] if line.startswith("{") else line
+                start = time.perf_counter()
+                doc_types = get_doc_types_llm(query)
+                rows.append({"query": query, "doc_types": doc_types, "latency": time.perf_counter() - start})
+            else:
+                rows.append(json.loads(line))
+    return rows
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+def benchmark(rows, threshold=LOCAL_CONFIDENCE_THRESHOLD, repeat=200):
+    exact = covered = covered_exact = 0
+    per_label = {d: {"tp": 0, "fp": 0, "fn": 0} for d in DOC_TYPES}
+    local_latencies = []
+
+    for row in rows:
+        expected = set(row["doc_types"])
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            predicted, confidence = classify_local(row["query"])
+        local_latencies.append((time.perf_counter() - start) / repeat)
+
+        predicted = set(predicted)
+        exact += predicted == expected
+        if confidence >= threshold:
+            covered += 1
+            covered_exact += predicted == expected
+
+        for d in DOC_TYPES:
+            per_label[d]["tp"] += d in predicted and d in expected
+            per_label[d]["fp"] += d in predicted and d not in expected
+            per_label[d]["fn"] += d not in predicted and d in expected
+
+    llm_latencies = [row["latency"] for row in rows if row.get("latency")]
+    return {
+        "queries": len(rows),
+        "threshold": threshold,
+        "exact_match_all": exact / len(rows),
+        "local_coverage": covered / len(rows),
+        "exact_match_covered": covered_exact / covered if covered else None,
+        "per_label": {
+            d: {
+                "precision": c["tp"] / (c["tp"] + c["fp"]) if c["tp"] + c["fp"] else None,
+                "recall": c["tp"] / (c["tp"] + c["fn"]) if c["tp"] + c["fn"] else None,
+            }
+            for d, c in per_label.items()
+        },
+        "local_latency_us": {
+            "p50": percentile(local_latencies, 50) * 1e6,
+            "p99": percentile(local_latencies, 99) * 1e6,
+        },
+        "llm_latency_ms": {
+            "p50": statistics.median(llm_latencies) * 1e3 if llm_latencies else None,
+            "p99": percentile(llm_latencies, 99) * 1e3 if llm_latencies else None,
+        },
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=os.path.join("qa_new", "intent_log.jsonl"),
+                        help="JSONL of {query, doc_types, latency} or, with --relabel, one query per line")
+    parser.add_argument("--relabel", action="store_true", help="Label every query with the LLM before comparing")
+    parser.add_argument("--threshold", type=float, default=LOCAL_CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    rows = load_labelled(args.path, relabel=args.relabel)
+    if not rows:
+        sys.exit(f"No labelled queries in {args.path}")
+    print(json.dumps(benchmark(rows, threshold=args.threshold), indent=2))
@@ -0,0 +1,381 @@
+"""
+Offline performance suite: stub LLM and embedding backends, no network and no API keys.
+Measures, on the bundled PDFs:
+
+    parse       PDF -> page text (pypdf), pages/sec, cold and from the page-text cache
+    split       pages -> chunks (the ingest chunker, CHUNKER), chunks/sec
+    embed       embedding batches through CachedEmbeddings, texts/sec, cold and warm cache
+    ingest      embed + Chroma + BM25 + metrics for the qa_new reports, chunks/sec
+    retrieval   retrieve() and ask_question() latency p50/p99 on the labelled TCS queries
+    summarize   single-shot and map-reduce summarizer wall time per PDF
+
+    python benchmarks/offline.py                                  # writes benchmarks/results/<commit>.json
+    python benchmarks/offline.py --only parse split --repeat 3
+    python benchmarks/offline.py --compare benchmarks/results/<old>.json
+
+Every run works in a fresh temporary directory (page-text cache, embedding cache, shards),
+so results do not depend on what was ingested locally. LLM_STUB_LATENCY adds a fixed delay
+to every stub LLM call.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QA_DIR = os.path.join(ROOT_DIR, "qa_new")
+sys.path.append(ROOT_DIR)
+sys.path.append(QA_DIR)
+
+STAGES = ("parse", "split", "embed", "ingest", "retrieval", "summarize")
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+# Relative change below this is reported as noise by --compare.
+NOISE = 0.05
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+def latency_ms(values):
+    return {
+        "p50": round(statistics.median(values) * 1e3, 3) if values else 0.0,
+        "p99": round(percentile(values, 99) * 1e3, 3),
+        "n": len(values),
+    }
+
+def rate(count, seconds):
+    return round(count / seconds, 2) if seconds else 0.0
+
+def best_of(repeat, run):
+    """Runs `run()` -> (result, seconds) `repeat` times and keeps the fastest."""
+    return min((run() for _ in range(repeat)), key=lambda r: r[1])
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR,
+                               capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None, None
+    return commit or None, bool(dirty)
+
+def setup_workspace(workdir, reports_dir):
+    """
+    Points every cache and store at `workdir` and makes it the working directory, with
+    ./reports linked to the benchmark reports. Must run before the repo modules are imported:
+    they read these paths at import time.
+    """
+    os.environ["LLM_PROVIDER"] = "stub"
+    os.environ["EMBEDDING_PROVIDER"] = "stub"
+    os.environ["PDF_TEXT_CACHE"] = os.path.join(workdir, "pdf_text_cache")
+    os.environ["EMBEDDING_CACHE"] = os.path.join(workdir, "embeddings.sqlite3")
+    os.environ["SHARDS_DIR"] = os.path.join(workdir, "shards")
+    os.symlink(os.path.abspath(reports_dir), os.path.join(workdir, "reports"))
+    os.chdir(workdir)
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Silences the pipeline's progress prints while a stage is timed."""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def bench_parse(pdfs, repeat):
+    from common import pdf_text
+
+    def cold():
+        shutil.rmtree(pdf_text.CACHE_DIR, ignore_errors=True)
+        start = time.perf_counter()
+        pages = [pdf_text.load_pages(path, workers=1) for path in pdfs]
+        return pages, time.perf_counter() - start
+
+    def warm():
+        start = time.perf_counter()
+        pages = [pdf_text.load_pages(path) for path in pdfs]
+        return pages, time.perf_counter() - start
+
+    pages, cold_seconds = best_of(repeat, cold)
+    _, warm_seconds = best_of(repeat, warm)
+    count = sum(len(p) for p in pages)
+    result = {
+        "files": len(pdfs),
+        "pages": count,
+        "seconds": round(cold_seconds, 4),
+        "pages_per_sec": rate(count, cold_seconds),
+        "cached_pages_per_sec": rate(count, warm_seconds),
+    }
+    return result, pages
+
+def bench_split(pages, repeat):
+    """`pages` holds one page list per PDF; every PDF is chunked on its own, as ingest does."""
+    from common.chunking import split_pages, chunker_id
+    from utils.helpers import CHUNK_SIZE, CHUNK_OVERLAP
+
+    # Imports the splitter outside the timing.
+    split_pages(pages[0][:1], chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+    def run():
+        start = time.perf_counter()
+        chunks = [
+            chunk for file_pages in pages
+            for chunk in split_pages(file_pages, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        ]
+        return chunks, time.perf_counter() - start
+
+    chunks, seconds = best_of(repeat, run)
+    return {
+        "chunker": chunker_id(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP),
+        "pages": sum(len(p) for p in pages),
+        "chunks": len(chunks),
+        "chars": sum(len(c.page_content) for c in chunks),
+        "seconds": round(seconds, 4),
+        "chunks_per_sec": rate(len(chunks), seconds),
+    }, chunks
+
+def bench_embed(chunks, batch_size):
+    """
+    Stub vectors cost about as much as hashing the words, so this mostly measures the cache
+    and batching around the model rather than the model.
+    """
+    from common.embeddings import CachedEmbeddings, StubEmbeddings
+
+    texts = [chunk.page_content for chunk in chunks]
+    model = CachedEmbeddings(StubEmbeddings(), model_name="stub/benchmark",
+                             cache_file=os.path.join(os.getcwd(), "embed_bench.sqlite3"))
+    result = {"texts": len(texts), "batch_size": batch_size}
+    for label in ("cold", "warm"):
+        start = time.perf_counter()
+        for i in range(0, len(texts), batch_size):
+            model.embed_documents(texts[i:i + batch_size])
+        seconds = time.perf_counter() - start
+        result[f"{label}_seconds"] = round(seconds, 4)
+        result[f"{label}_texts_per_sec"] = rate(len(texts), seconds)
+    result["cache_hits"], result["cache_misses"] = model.hits, model.misses
+    return result
+
+def bench_ingest():
+    """One pass of qa_new ingest over ./reports into fresh shards (stub embeddings)."""
+    from common.embeddings import get_embedding_model
+    from utils.helpers import load_manifest, plan_ingest
+    from utils.metrics_table import MetricsTable
+    from utils.shards import ShardPool
+    import ingest
+
+    manifest = load_manifest()
+    to_embed, to_remove = plan_ingest(manifest)
+    pool = ShardPool(get_embedding_model(), create=True)
+    metrics_table = MetricsTable()
+    stocks = sorted({record["stock"] for record in to_embed})
+
+    start = time.perf_counter()
+    chunks = sum(
+        ingest.ingest_stock(
+            pool, stock,
+            [r for r in to_embed if r["stock"] == stock],
+            [r for r in to_remove if r["stock"] == stock],
+            manifest, metrics_table
+        )
+        for stock in stocks
+    )
+    seconds = time.perf_counter() - start
+    return {
+        "stocks": len(stocks),
+        "files": len(to_embed),
+        "chunks": chunks,
+        "metrics_rows": len(metrics_table),
+        "seconds": round(seconds, 4),
+        "chunks_per_sec": rate(chunks, seconds),
+    }
+
+def bench_retrieval(rows, repeat):
+    """
+    retrieve() alone and the whole ask_question() (metrics lookup, intent, retrieval, rerank,
+    packing and stub generation). Needs the shards written by the ingest stage.
+    """
+    import main
+
+    # Clients and shards are created once per process; keep that out of the per-query numbers.
+    main.warm_up(sorted({row["stock"] for row in rows}))
+
+    retrieve_latencies, ask_latencies = [], []
+    by_source = {}
+    for _ in range(repeat):
+        for row in rows:
+            start = time.perf_counter()
+            main.retrieve(row["stock"], row["query"], {"stock": row["stock"]}, main.RERANK_CANDIDATES)
+            retrieve_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            answer = main.ask_question(row["stock"], row["query"])
+            ask_latencies.append(time.perf_counter() - start)
+            by_source.setdefault(answer.get("answered_from", "rag"), []).append(ask_latencies[-1])
+
+    return {
+        "queries": len(rows),
+        "mode": main.RETRIEVAL_MODE,
+        "retrieve_ms": latency_ms(retrieve_latencies),
+        "ask_question_ms": latency_ms(ask_latencies),
+        # Metric lookups skip retrieval entirely, so each path is also reported on its own.
+        "ask_question_by_path_ms": {source: latency_ms(values) for source, values in sorted(by_source.items())},
+    }
+
+def bench_summarize(pdfs, workers):
+    from common.chunking import split_pages
+    from common.llm import get_backend
+    from common.pdf_text import load_pages
+    from common.summarizer import summarize_single_shot, summarize_map_reduce
+
+    backend = get_backend("models/gemini-2.5-flash")
+    files = {}
+    for path in pdfs:
+        chunks = split_pages(load_pages(path), doc_type="concall")
+        files[os.path.basename(path)] = {"chunks": len(chunks)}
+        for mode, summarize in (("single_shot", summarize_single_shot), ("map_reduce", summarize_map_reduce)):
+            kwargs = {"workers": workers} if mode == "map_reduce" else {}
+            start = time.perf_counter()
+            _, stats = summarize(backend, chunks, **kwargs)
+            # RunStats rounds to 10 ms, too coarse for stub calls.
+            files[os.path.basename(path)][mode] = dict(stats.as_dict(), wall_seconds=round(time.perf_counter() - start, 4))
+    return {
+        "stub_latency": backend.latency,
+        "total_seconds": {
+            mode: round(sum(f[mode]["wall_seconds"] for f in files.values()), 4)
+            for mode in ("single_shot", "map_reduce")
+        },
+        "files": files,
+    }
+
+def run(args):
+    pdfs = args.pdfs or sorted(glob.glob(os.path.join(ROOT_DIR, "*.pdf")))
+    pdfs = [os.path.abspath(p) for p in pdfs]
+    reports_dir = os.path.abspath(args.reports)
+    rows = []
+    if "retrieval" in args.only:
+        from retrieval import load_queries
+
+        rows = load_queries(os.path.abspath(args.queries))
+
+    workdir = tempfile.mkdtemp(prefix="concall-bench-")
+    cwd = os.getcwd()
+    setup_workspace(workdir, reports_dir)
+    results = {}
+    try:
+        with quiet(not args.verbose):
+            pages = chunks = None
+            if {"parse", "split", "embed"} & set(args.only):
+                results["parse"], pages = bench_parse(pdfs, args.repeat)
+            if {"split", "embed"} & set(args.only):
+                results["split"], chunks = bench_split(pages, args.repeat)
+            if "embed" in args.only:
+                results["embed"] = bench_embed(chunks, args.batch_size)
+            if {"ingest", "retrieval"} & set(args.only):
+                results["ingest"] = bench_ingest()
+            if "retrieval" in args.only:
+                results["retrieval"] = bench_retrieval(rows, args.repeat)
+            if "summarize" in args.only:
+                results["summarize"] = bench_summarize(pdfs, args.workers)
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Workspace kept at {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    commit, dirty = git_commit()
+    return {
+        "version": 1,
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pdfs": [os.path.relpath(p, ROOT_DIR) for p in pdfs],
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def higher_is_better(name):
+    return name.endswith("_per_sec")
+
+def lower_is_better(name):
+    return name.endswith("seconds") or "_ms." in name and not name.endswith(".n")
+
+def compare(base, current):
+    """
+    Rows of (metric, base, current, relative change, verdict) for every timing metric
+    present in both results. Counts (pages, chunks, ...) are skipped.
+    """
+    base_flat, current_flat = flatten(base["results"]), flatten(current["results"])
+    rows = []
+    for name in sorted(base_flat.keys() & current_flat.keys()):
+        if not (higher_is_better(name) or lower_is_better(name)):
+            continue
+        old, new = base_flat[name], current_flat[name]
+        change = (new - old) / old if old else 0.0
+        if abs(change) < NOISE:
+            verdict = "~"
+        elif (change > 0) == higher_is_better(name):
+            verdict = "better"
+        else:
+            verdict = "worse"
+        rows.append((name, old, new, change, verdict))
+    return rows
+
+def print_comparison(base, current, rows):
+    print(f"{(base['commit'] or '?')[:10]} -> {(current['commit'] or '?')[:10]}")
+    print(f"{'metric':<50} {'base':>12} {'current':>12} {'change':>8}")
+    for name, old, new, change, verdict in rows:
+        print(f"{name:<50} {old:>12} {new:>12} {change:>+8.1%} {verdict}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", help="PDFs for parse/split/embed/summarize (default: ./*.pdf)")
+    parser.add_argument("--reports", default=os.path.join(QA_DIR, "reports"),
+                        help="reports/<stock>/<folder>/*.pdf tree ingested for the retrieval stage")
+    parser.add_argument("--queries", default=os.path.join(ROOT_DIR, "benchmarks", "retrieval_queries.jsonl"))
+    parser.add_argument("--only", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per timed stage (best run kept; queries repeated)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("EMBEDDING_BATCH_SIZE", "100")))
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent map calls in the map-reduce summarizer")
+    parser.add_argument("--out", help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", metavar="BASE", help="Print the change against an earlier results file")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary workspace")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own progress output")
+    args = parser.parse_args()
+
+    result = run(args)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{(result['commit'] or 'unknown')[:12]}{'-dirty' if result['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    tmp_file = out + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp_file, out)
+
+    print(json.dumps(result["results"], indent=2))
+    print(f"Results written to {out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        print_comparison(base, result, compare(base, result))
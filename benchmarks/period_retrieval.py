@@ -0,0 +1,173 @@
+"""
+Multi-period questions on a shard whose years are unevenly covered (the latest year has the
+most chunks, as when several quarters of concalls and announcements follow one annual report):
+one stock-filtered retrieval of RERANK_CANDIDATES, the same retrieval widened to
+RERANK_CANDIDATES x periods, and the planned retrieval (one fy-filtered retrieval per period,
+run concurrently, merged with a per-period quota).
+
+    python benchmarks/period_retrieval.py
+    python benchmarks/period_retrieval.py --chunks 20000 --weights 1 1 2 3 6
+
+Runs offline (stub embeddings, a synthetic shard in a temporary SHARDS_DIR). Per strategy:
+latency p50/p99, and over the top RERANK_TOP_N chunks (what the reranker keeps): how many of
+the asked periods are represented at all, the fraction of chunks from an asked period, and the
+smallest asked period's share relative to an equal split.
+"""
+import os
+import sys
+import json
+import time
+import random
+import contextlib
+import shutil
+import argparse
+import tempfile
+import statistics
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QA_DIR = os.path.join(ROOT_DIR, "qa_new")
+sys.path.append(ROOT_DIR)
+sys.path.append(QA_DIR)
+
+STOCK = "TCS"
+YEARS = (2021, 2022, 2023, 2024, 2025)
+DOC_TYPES = ("annual_report", "concall", "announcement")
+TOPICS = {
+    "revenue": "revenue growth constant currency topline sequential quarter deal ramp",
+    "margins": "operating margin ebit wage hikes utilisation pyramid currency headwind",
+    "attrition": "attrition headcount hiring freshers employee retention talent",
+    "deal wins": "order book total contract value deal wins pipeline large deals renewals",
+    "dividend": "dividend payout buyback shareholders cash return free cash flow",
+    "cloud": "cloud migration genai platforms hyperscaler partnerships modernisation",
+}
+FILLER = "the company management said during the period we see clients across markets continue to".split()
+QUESTIONS = (
+    "How has {topic} changed over the last 3 years?",
+    "Compare {topic} in FY23 and FY25",
+    "What did management say about {topic} in FY22, FY23 and FY24?",
+    "Trend in {topic} over the past five years",
+)
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+def latency_ms(values):
+    return {"p50": round(statistics.median(values) * 1000, 3), "p99": round(percentile(values, 99) * 1000, 3)}
+
+def synthetic_chunks(count, weights, seed=0):
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(count):
+        year = rng.choices(YEARS, weights=weights)[0]
+        topic = rng.choice(list(TOPICS))
+        words = TOPICS[topic].split()
+        text = " ".join(rng.choice(words) if rng.random() < 0.4 else rng.choice(FILLER) for _ in range(60))
+        chunks.append({
+            "id": f"c{i}",
+            "text": f"FY{year % 100} {topic}: {text}",
+            "metadata": {"stock": STOCK, "type": DOC_TYPES[i % len(DOC_TYPES)], "year": year, "fy": year,
+                         "source": f"{DOC_TYPES[i % len(DOC_TYPES)]}_{year}.pdf"},
+        })
+    return chunks
+
+def build_shard(chunks, batch_size=1000):
+    """
+    Writes the chunks to the stock's shard (Chroma + BM25, and the FAISS build with
+    VECTOR_BACKEND=faiss) without going through ingest.
+    """
+    import chromadb
+    from langchain_core.documents import Document
+    from common.embeddings import StubEmbeddings, embedding_model_name
+    from common.faiss_store import FAISS_DIR, build_faiss_index
+    from utils.shards import shard_dir, VECTOR_BACKEND
+    from utils.sparse_index import SparseIndex, SPARSE_INDEX_FILE
+
+    path = shard_dir(STOCK)
+    os.makedirs(path, exist_ok=True)
+    collection = chromadb.PersistentClient(path=path).get_or_create_collection("langchain")
+    vectors = StubEmbeddings().embed_documents([c["text"] for c in chunks])
+    for i in range(0, len(chunks), batch_size):
+        batch = chunks[i:i + batch_size]
+        collection.add(ids=[c["id"] for c in batch], embeddings=vectors[i:i + batch_size],
+                       documents=[c["text"] for c in batch], metadatas=[c["metadata"] for c in batch])
+    if VECTOR_BACKEND == "faiss":
+        build_faiss_index(os.path.join(path, FAISS_DIR), [c["id"] for c in chunks], vectors,
+                          [c["text"] for c in chunks], [c["metadata"] for c in chunks], embedding_model_name())
+    sparse = SparseIndex(path=os.path.join(path, SPARSE_INDEX_FILE))
+    sparse.add([c["id"] for c in chunks], [Document(page_content=c["text"], metadata=c["metadata"]) for c in chunks])
+    sparse.save()
+
+def balance(docs, periods, top_n):
+    years = [p["fy"] for p in periods]
+    counts = {year: 0 for year in years}
+    for doc in docs[:top_n]:
+        if doc.metadata.get("fy") in counts:
+            counts[doc.metadata["fy"]] += 1
+    kept = min(top_n, len(docs)) or 1
+    return {
+        "covered": sum(1 for c in counts.values() if c) / len(years),
+        "on_period": sum(counts.values()) / kept,
+        "min_share": min(counts.values()) / (kept / len(years)),
+    }
+
+def run(args):
+    import main
+    from utils import async_runtime
+    from utils.query_planner import merge_by_period
+
+    main.warm_up([STOCK])
+    k = main.RERANK_CANDIDATES
+    top_n = main.RERANK_TOP_N
+    strategies = {
+        "single": lambda query, periods: main.retrieve(STOCK, query, {"stock": STOCK}, k),
+        "widened": lambda query, periods: main.retrieve(STOCK, query, {"stock": STOCK}, k * len(periods)),
+        "planned": lambda query, periods: merge_by_period(async_runtime.run(main.retrieve_periods_async(
+            STOCK, query, {"stock": STOCK}, periods, main.period_k(k, periods)
+        )), k),
+    }
+    questions = [question.format(topic=topic) for question in QUESTIONS for topic in TOPICS]
+    plans = {question: main.plan_query(STOCK, question) for question in questions}
+    results = {}
+    for name, strategy in strategies.items():
+        latencies, scores = [], []
+        for _ in range(args.repeat):
+            for question in questions:
+                start = time.perf_counter()
+                docs = strategy(question, plans[question])
+                latencies.append(time.perf_counter() - start)
+                scores.append(balance(docs, plans[question], top_n))
+        results[name] = {
+            "latency_ms": latency_ms(latencies),
+            **{metric: round(statistics.mean(s[metric] for s in scores), 3) for metric in scores[0]},
+        }
+        print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+    topic = next(iter(TOPICS))
+    return {"chunks": args.chunks, "weights": args.weights, "backend": main.get_shards().backend, "cpus": os.cpu_count(),
+            "questions": len(questions), "k": k, "top_n": top_n,
+            "periods": {q.format(topic=topic): [p["label"] for p in plans[q.format(topic=topic)]] for q in QUESTIONS},
+            "results": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=6000)
+    parser.add_argument("--weights", type=float, nargs=len(YEARS), default=[1, 1, 2, 3, 8],
+                        help=f"Relative number of chunks per year {YEARS}")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="period-bench-")
+    os.environ["LLM_PROVIDER"] = "stub"
+    os.environ["EMBEDDING_PROVIDER"] = "stub"
+    os.environ["EMBEDDING_CACHE"] = os.path.join(workdir, "embeddings.sqlite3")
+    os.environ["SHARDS_DIR"] = os.path.join(workdir, "shards")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        # The pipeline's own progress prints go to stderr; stdout is the JSON result.
+        with contextlib.redirect_stdout(sys.stderr):
+            build_shard(synthetic_chunks(args.chunks, args.weights))
+            result = run(args)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(result, indent=2))
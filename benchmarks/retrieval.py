@@ -0,0 +1,98 @@
+"""
+Compares dense-only retrieval with hybrid (dense + BM25, reciprocal-rank fusion) and with hybrid
+followed by the rerank stage, on a labelled query set.
+
+    python benchmarks/retrieval.py                                  # bundled TCS queries
+    python benchmarks/retrieval.py queries.jsonl --k 5 10 20 --candidates 50
+
+Each line is {"stock", "query", "relevant": [text snippets]}; a snippet counts as found when a
+retrieved chunk contains it (case and whitespace insensitive). Needs the per-stock shards
+(Chroma + BM25) built by `python ingest.py` in ./qa_new.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "qa_new"))
+
+def load_queries(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def squash(text):
+    return " ".join(text.lower().split())
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+def benchmark(rows, retrieve, modes=("dense", "hybrid"), ks=(5, 10, 20), reranker=None, candidates=50):
+    """
+    With a reranker, an extra "hybrid+rerank" mode retrieves `candidates` chunks and reranks
+    them down to max(ks); its rerank time is reported separately from the total.
+    """
+    results = {}
+    if reranker:
+        modes = tuple(modes) + ("hybrid+rerank",)
+    for mode in modes:
+        found = {k: 0 for k in ks}
+        total = 0
+        latencies = []
+        rerank_latencies = []
+        for row in rows:
+            start = time.perf_counter()
+            if mode == "hybrid+rerank":
+                docs = retrieve(row["stock"], row["query"], {"stock": row["stock"]}, k=candidates, mode="hybrid")
+                reranked = time.perf_counter()
+                docs = reranker.rerank(row["query"], docs, max(ks))
+                rerank_latencies.append(time.perf_counter() - reranked)
+            else:
+                docs = retrieve(row["stock"], row["query"], {"stock": row["stock"]}, k=max(ks), mode=mode)
+            latencies.append(time.perf_counter() - start)
+
+            texts = [squash(d.page_content) for d in docs]
+            for snippet in row["relevant"]:
+                snippet = squash(snippet)
+                rank = next((i for i, text in enumerate(texts) if snippet in text), None)
+                for k in ks:
+                    found[k] += rank is not None and rank < k
+                total += 1
+
+        results[mode] = {
+            "recall": {f"@{k}": found[k] / total for k in ks},
+            "latency_ms": {
+                "p50": statistics.median(latencies) * 1e3,
+                "p99": percentile(latencies, 99) * 1e3,
+            },
+        }
+        if rerank_latencies:
+            results[mode]["rerank_latency_ms"] = {
+                "p50": statistics.median(rerank_latencies) * 1e3,
+                "p99": percentile(rerank_latencies, 99) * 1e3,
+            }
+    return {"queries": len(rows), "snippets": sum(len(r["relevant"]) for r in rows), "modes": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=os.path.join(ROOT_DIR, "benchmarks", "retrieval_queries.jsonl"))
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--candidates", type=int, default=None, help="First-pass k for the rerank mode (RERANK_CANDIDATES)")
+    parser.add_argument("--reranker", default=None, help="lexical, cross-encoder or none (RERANKER)")
+    args = parser.parse_args()
+
+    rows = load_queries(os.path.abspath(args.path))
+    # main.py opens the shards relative to qa_new.
+    os.chdir(os.path.join(ROOT_DIR, "qa_new"))
+    from main import retrieve, reranker, RERANK_CANDIDATES
+    from common.rerank import get_reranker
+    from utils.sparse_index import tokenize
+
+    if args.reranker:
+        reranker = get_reranker(args.reranker, tokenize=tokenize)
+    print(json.dumps(benchmark(
+        rows, retrieve, ks=sorted(args.k), reranker=reranker, candidates=args.candidates or RERANK_CANDIDATES
+    ), indent=2))
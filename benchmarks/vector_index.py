@@ -0,0 +1,230 @@
+"""
+Side-by-side of the dense retrieval backends on a shard-sized corpus: Chroma (what the shards
+use today) against FAISS flat / IVF / HNSW indexes with float32, int8 or PQ codes
+(common/faiss_store.py, VECTOR_BACKEND=faiss).
+
+    python benchmarks/vector_index.py                                  # 5000 synthetic chunks
+    python benchmarks/vector_index.py --chunks 20000 --variants chroma hnsw/int8 ivf/pq
+    python benchmarks/vector_index.py --shard TCS                      # an ingested shard's vectors
+
+Per backend: build seconds and size on disk, then, in a fresh process per backend so memory
+is not shared between them, open time, top-k latency p50/p99 without a filter and with a
+type + year filter, recall@k against exact search, and the worker's RSS split into private
+(anonymous) and shared (file-backed, i.e. memory-mapped) memory. Only the private part is
+paid again by every gunicorn worker.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QA_DIR = os.path.join(ROOT_DIR, "qa_new")
+sys.path.append(ROOT_DIR)
+sys.path.append(QA_DIR)
+
+DEFAULT_VARIANTS = ["chroma", "flat/none", "flat/int8", "ivf/none", "ivf/int8", "hnsw/none", "hnsw/int8", "hnsw/pq"]
+DOC_TYPES = ("annual_report", "concall", "announcement")
+YEARS = (2021, 2022, 2023, 2024, 2025)
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        status = dict(line.split(":", 1) for line in f)
+    return {name: round(int(status[name].split()[0]) / 1024, 1) for name in ("RssAnon", "RssFile")}
+
+def disk_mb(path):
+    total = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+    return round(total / 2**20, 2)
+
+def synthetic_corpus(count, dim, seed=0, clusters=64):
+    """Unit vectors drawn around `clusters` topics, with stock/type/year metadata spread evenly."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, count)] + rng.normal(scale=0.6, size=(count, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    metadatas = [
+        {"stock": "TCS", "type": DOC_TYPES[i % len(DOC_TYPES)], "year": YEARS[(i // len(DOC_TYPES)) % len(YEARS)],
+         "source": f"report-{i % 40}.pdf", "chunk_id": f"c{i}"}
+        for i in range(count)
+    ]
+    return [f"c{i}" for i in range(count)], vectors, [f"synthetic chunk {i}" for i in range(count)], metadatas
+
+def shard_corpus(stock):
+    import numpy as np
+    from utils.shards import shard_dir
+    from langchain_community.vectorstores import Chroma
+
+    store = Chroma(persist_directory=shard_dir(stock))
+    batch = store.get(include=["embeddings", "documents", "metadatas"])
+    for chunk_id, metadata in zip(batch["ids"], batch["metadatas"]):
+        metadata["chunk_id"] = chunk_id
+    vectors = np.array(batch["embeddings"], dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return batch["ids"], vectors, batch["documents"], batch["metadatas"]
+
+def make_queries(vectors, metadatas, count, seed=1):
+    """Perturbed corpus vectors; each also gets the type/year filter of the chunk it came from."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(vectors), count)
+    queries = vectors[picks] + rng.normal(scale=0.02, size=(count, vectors.shape[1])).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    filters = [
+        {"$and": [{"type": {"$eq": metadatas[i].get("type")}}, {"year": {"$eq": metadatas[i].get("year")}}]}
+        for i in picks
+    ]
+    return queries.astype("float32"), filters
+
+def exact_topk(vectors, metadatas, queries, filters, k):
+    from common.filters import matches
+
+    scores = queries @ vectors.T
+    unfiltered = [list(row.argsort()[::-1][:k]) for row in scores]
+    filtered = []
+    for row, where in zip(scores, filters):
+        allowed = [i for i in row.argsort()[::-1] if matches(metadatas[i], where)]
+        filtered.append(allowed[:k])
+    return unfiltered, filtered
+
+def build_chroma(path, ids, vectors, texts, metadatas, batch_size=5000):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path)
+    # The collection langchain's Chroma opens by default, as in the shards.
+    collection = client.get_or_create_collection("langchain")
+    for i in range(0, len(ids), batch_size):
+        collection.add(ids=ids[i:i + batch_size], embeddings=vectors[i:i + batch_size].tolist(),
+                       documents=texts[i:i + batch_size], metadatas=metadatas[i:i + batch_size])
+
+def build(variant, path, corpus):
+    from common.faiss_store import build_faiss_index
+
+    ids, vectors, texts, metadatas = corpus
+    start = time.perf_counter()
+    if variant == "chroma":
+        build_chroma(path, ids, vectors, texts, metadatas)
+        specs = ["chroma"]
+    else:
+        index, compression = variant.split("/")
+        manifest = build_faiss_index(path, ids, vectors, texts, metadatas, "benchmark", index=index, compression=compression)
+        specs = sorted({p["spec"] for p in manifest["partitions"]})
+    return {"build_seconds": round(time.perf_counter() - start, 3), "disk_mb": disk_mb(path), "specs": specs}
+
+def query_worker(variant, path, queries_file, k):
+    """Runs in its own process: open the store, query it, report latency, ids and RSS."""
+    import numpy as np
+
+    data = np.load(queries_file, allow_pickle=True).item()
+    queries, filters = data["queries"], data["filters"]
+    # Libraries are imported before the baseline so that only the store itself is measured.
+    import langchain_core.documents
+    if variant == "chroma":
+        from langchain_community.vectorstores import Chroma
+    else:
+        import faiss
+        from common.faiss_store import FaissStore
+    before = rss_mb()
+
+    start = time.perf_counter()
+    if variant == "chroma":
+        store = Chroma(persist_directory=path)
+        search = lambda vector, where: store.similarity_search_by_vector(vector.tolist(), k=k, filter=where)
+    else:
+        store = FaissStore(path, embedding_function=None)
+        search = lambda vector, where: [doc for doc, _ in store.similarity_search_by_vector_with_score(vector, k=k, filter=where)]
+    search(queries[0], None)
+    opened = time.perf_counter() - start
+
+    result = {"open_ms": round(opened * 1000, 1)}
+    for name, wheres in (("unfiltered", [None] * len(queries)), ("filtered", filters)):
+        latencies, ids = [], []
+        for vector, where in zip(queries, wheres):
+            start = time.perf_counter()
+            docs = search(vector, where)
+            latencies.append(time.perf_counter() - start)
+            # langchain's Chroma does not set Document.id, so the id travels in the metadata.
+            ids.append([doc.metadata["chunk_id"] for doc in docs])
+        result[name] = {
+            "p50_ms": round(statistics.median(latencies) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "ids": ids,
+        }
+    after = rss_mb()
+    result["rss_mb"] = {
+        "private": after["RssAnon"],
+        "shared": after["RssFile"],
+        "store_private": round(after["RssAnon"] - before["RssAnon"], 1),
+        "store_shared": round(after["RssFile"] - before["RssFile"], 1),
+    }
+    return result
+
+def recall(found, expected, ids):
+    hits = sum(len({ids[i] for i in truth} & set(got)) for got, truth in zip(found, expected))
+    return round(hits / max(1, sum(len(truth) for truth in expected)), 4)
+
+def run(args):
+    import numpy as np
+
+    corpus = shard_corpus(args.shard) if args.shard else synthetic_corpus(args.chunks, args.dim)
+    ids, vectors, _, metadatas = corpus
+    queries, filters = make_queries(vectors, metadatas, args.queries)
+    unfiltered_truth, filtered_truth = exact_topk(vectors, metadatas, queries, filters, args.k)
+
+    workdir = tempfile.mkdtemp(prefix="vector-bench-")
+    queries_file = os.path.join(workdir, "queries.npy")
+    np.save(queries_file, {"queries": queries, "filters": filters}, allow_pickle=True)
+    results = {}
+    try:
+        for variant in args.variants:
+            path = os.path.join(workdir, variant.replace("/", "-"))
+            row = build(variant, path, corpus)
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", variant, path, queries_file, "--k", str(args.k)],
+                capture_output=True, text=True
+            )
+            if proc.returncode:
+                row["error"] = proc.stderr.strip().splitlines()[-1]
+                results[variant] = row
+                print(f"❌ {variant}: {row['error']}", file=sys.stderr)
+                continue
+            worker = json.loads(proc.stdout.strip().splitlines()[-1])
+            row["open_ms"] = worker["open_ms"]
+            for name, truth in (("unfiltered", unfiltered_truth), ("filtered", filtered_truth)):
+                stats = worker[name]
+                row[name] = {"p50_ms": stats["p50_ms"], "p99_ms": stats["p99_ms"],
+                             f"recall@{args.k}": recall(stats.pop("ids"), truth, ids)}
+            row["rss_mb"] = worker["rss_mb"]
+            results[variant] = row
+            print(f"{variant}: {json.dumps(row)}", file=sys.stderr)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {"chunks": len(ids), "dim": int(vectors.shape[1]), "queries": len(queries), "k": args.k, "results": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--shard", help="Use the vectors of this stock's ingested shard instead (run from qa_new)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--variants", nargs="+", default=DEFAULT_VARIANTS, help="chroma and/or <flat|ivf|hnsw>/<none|int8|pq>")
+    parser.add_argument("--keep", action="store_true", help="Keep the built indexes")
+    parser.add_argument("--worker", nargs=3, metavar=("VARIANT", "PATH", "QUERIES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(query_worker(*args.worker, k=args.k)))
+    else:
+        print(json.dumps(run(args), indent=2))
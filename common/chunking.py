@@ -0,0 +1,401 @@
+import os
+import re
+import math
+from collections import Counter
+
+# "structured" splits concall transcripts by speaker turn and Q&A pair, and other reports by
+# paragraph and table; "recursive" is the old fixed-size RecursiveCharacterTextSplitter.
+CHUNKER = os.getenv("CHUNKER", "structured")
+MAX_CHUNK_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "2000"))
+# Bump when the structured output changes so that ingest re-embeds.
+STRUCTURED_VERSION = 2
+# Metadata the structured chunker adds on top of the page metadata.
+CHUNK_METADATA = ("section", "speakers", "analyst", "analyst_firm", "has_table", "page")
+
+SPEAKER_LABEL = re.compile(r"^\s*([A-Z][A-Za-z.'\-]*(?:[ \t]+[A-Z][A-Za-z.'\-]*){0,3})[ \t]*:[ \t]*")
+ROLE_LABELS = {"moderator": "moderator", "operator": "moderator", "analyst": "analyst", "management": "management"}
+NOT_SPEAKERS = {"sub", "subject", "encl", "encl.", "note", "disclaimer", "registered office", "e-mail", "website", "symbol"}
+QUESTION_FROM = re.compile(
+    r"[Qq]uestion\s+(?:is\s+)?(?:a\s+)?(?:follow-up\s+)?from\s+(?:the\s+)?line\s+(?:of|from)\s+(?:M[rs]s?\.?\s+)?"
+    r"(?P<name>[A-Z][\w.'\-]*(?:\s+[A-Z][\w.'\-]*){0,3})(?:,?\s+(?:from|of)\s+(?P<firm>[^.]+?))?\s*(?:\.|,|$|\s+[Pp]lease)"
+)
+# A moderator hand-off to the next questioner that QUESTION_FROM could not parse still ends
+# the previous exchange.
+QUESTION_TURN = re.compile(
+    r"\b(?:next|first|following)\s+question\b|\bquestion\s+(?:is\s+|comes\s+)?from\b|\bfollow-up\s+question\b",
+    re.IGNORECASE
+)
+CLOSING = re.compile(r"last question|closing (?:comments|remarks)|hand (?:the )?(?:conference|call) (?:back|over)", re.IGNORECASE)
+PAGE_NUMBER = re.compile(r"^page\s*#+\s*(?:of\s*#+)?$")
+BULLET = re.compile(r"^(?:[•●▪■◦\-–]|o\s|\d+[.)]\s|[ivx]+\.\s)")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9₹$\"'“‘(•])")
+NUMBER = re.compile(r"^\(?[-–]?(?:rs\.?|inr|₹|\$)?\d[\d,]*(?:\.\d+)?%?\)?$", re.IGNORECASE)
+
+def _line_key(line):
+    return re.sub(r"\d+", "#", " ".join(line.lower().split()))
+
+def clean_lines(pages, edge_lines=4):
+    """
+    [(page, line)] for every page, without page numbers and without the running
+    header/footer lines repeated at the top or bottom of most pages. Blank lines are kept
+    as "" because they are the only paragraph breaks pypdf leaves.
+    """
+    per_page = [[line.strip() for line in page.page_content.splitlines()] for page in pages]
+    edges = Counter()
+    for lines in per_page:
+        filled = [line for line in lines if line]
+        edges.update({_line_key(line) for line in filled[:edge_lines] + filled[-edge_lines:]})
+    repeated = {key for key, count in edges.items() if len(pages) >= 3 and count >= len(pages) / 2}
+
+    result = []
+    for number, (page, lines) in enumerate(zip(pages, per_page)):
+        number = page.metadata.get("page", number)
+        filled = [i for i, line in enumerate(lines) if line]
+        edge = set(filled[:edge_lines] + filled[-edge_lines:])
+        for i, line in enumerate(lines):
+            key = _line_key(line)
+            if PAGE_NUMBER.match(key) or (i in edge and key in repeated):
+                continue
+            result.append((number, line))
+    return result
+
+def join_lines(lines):
+    """PDF lines -> text: wrapped lines are re-joined, paragraphs and bullets keep their own line."""
+    paragraphs, current = [], []
+    for line in lines:
+        if not line or BULLET.match(line):
+            if current:
+                paragraphs.append(" ".join(current))
+            current = [line] if line else []
+        else:
+            current.append(line)
+    if current:
+        paragraphs.append(" ".join(current))
+    return "\n".join(" ".join(p.split()) for p in paragraphs if p.strip())
+
+def _hard_split(text, max_chars):
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars)
+        cut = cut if cut > max_chars // 2 else max_chars
+        pieces.append(text[:cut].strip())
+        text = text[cut:].strip()
+    return pieces + [text] if text else pieces
+
+def split_long(text, max_chars):
+    """
+    Splits text longer than max_chars at sentence boundaries into pieces of about equal
+    size, so a long turn does not end in a tiny remainder chunk.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    target = len(text) / math.ceil(len(text) / max_chars)
+    pieces, current = [], ""
+    for sentence in SENTENCE_END.split(text):
+        for part in _hard_split(sentence, max_chars):
+            if current and (len(current) + len(part) + 1 > max_chars or len(current) >= target):
+                pieces.append(current)
+                current = part
+            else:
+                current = f"{current} {part}" if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+def take_sentences(text, limit):
+    """(leading whole sentences of at most `limit` characters, the rest)."""
+    sentences = SENTENCE_END.split(text)
+    size = 0
+    for n, sentence in enumerate(sentences):
+        if size + len(sentence) > limit:
+            return " ".join(sentences[:n]), " ".join(sentences[n:])
+        size += len(sentence) + 1
+    return text, ""
+
+def _names_match(a, b):
+    a, b = set(a.lower().split()), set(b.lower().split())
+    return bool(a) and bool(b) and (a <= b or b <= a)
+
+def find_turns(lines):
+    """
+    Splits the cleaned lines into (preamble_lines, turns) at "Speaker Name:" labels.
+    A label counts as a speaker when it is the moderator/operator, occurs at least twice,
+    was announced by the moderator, or directly follows a moderator turn (hand-overs).
+    All-caps labels (the MANAGEMENT:/MODERATOR: roster on the title page) never do.
+    """
+    candidates = []
+    for i, (_, line) in enumerate(lines):
+        match = SPEAKER_LABEL.match(line)
+        if match and not match.group(1).isupper():
+            candidates.append((i, " ".join(match.group(1).split()), match.end()))
+    counts = Counter(name.lower() for _, name, _ in candidates)
+    text = " ".join(line for _, line in lines)
+    announced = [m.group("name") for m in QUESTION_FROM.finditer(text)]
+
+    accepted = []
+    after_moderator = False
+    for i, name, end in candidates:
+        key = name.lower()
+        role = ROLE_LABELS.get(key)
+        if key in NOT_SPEAKERS:
+            continue
+        if role or counts[key] >= 2 or after_moderator or any(_names_match(name, a) for a in announced):
+            accepted.append((i, name, end, role))
+            after_moderator = role == "moderator"
+
+    turns = []
+    for n, (i, name, end, role) in enumerate(accepted):
+        stop = accepted[n + 1][0] if n + 1 < len(accepted) else len(lines)
+        body = [lines[i][1][end:]] + [line for _, line in lines[i + 1:stop]]
+        turns.append({"speaker": name, "role": role, "page": lines[i][0], "text": join_lines(body)})
+    preamble = lines[:accepted[0][0]] if accepted else lines
+    return preamble, turns
+
+def is_transcript(turns, min_turns=6):
+    return len(turns) >= min_turns and len({t["speaker"] for t in turns}) >= 2
+
+def _document(text, base, **metadata):
+    from langchain_core.documents import Document
+
+    return Document(page_content=text, metadata=dict(base, **{k: v for k, v in metadata.items() if v not in (None, "")}))
+
+class _Packer:
+    """
+    Greedily packs (text, speaker, page) units into chunks of at most max_chars, without
+    overlap. flush() closes the current chunk (section and exchange boundaries). `lead` is
+    only prepended when the unit has to open a new chunk.
+    """
+
+    def __init__(self, max_chars, base, section, **metadata):
+        self.max_chars = max_chars
+        self.base = base
+        self.section = section
+        self.metadata = metadata
+        self.question = None
+        self.chunks = []
+        self.units = []
+
+    def size(self):
+        return sum(len(u[0]) + 1 for u in self.units)
+
+    def add(self, text, speaker=None, page=None, lead=""):
+        if self.units and self.size() + len(text) > self.max_chars:
+            self.flush()
+        if not self.units:
+            text = lead + text
+        self.units.append((text, speaker, page))
+
+    def flush(self):
+        if not self.units:
+            return
+        speakers = []
+        for _, speaker, _ in self.units:
+            if speaker and speaker not in speakers:
+                speakers.append(speaker)
+        page = next((p for _, _, p in self.units if p is not None), None)
+        self.chunks.append(_document(
+            "\n".join(u[0] for u in self.units), self.base,
+            section=self.section, speakers=", ".join(speakers), page=page, **self.metadata
+        ))
+        self.units = []
+
+def _add_turn(packer, label, turn, max_chars, lead=""):
+    """
+    Adds one turn, split at sentence boundaries when it does not fit. A turn that does not fit
+    next to what is already in the chunk first fills the room left (when that is at least a
+    quarter chunk), so an answer starts in the same chunk as its question.
+    """
+    head = f"{label}: "
+    text = turn["text"]
+    pieces = []
+    room = max_chars - packer.size() - len(head)
+    if packer.units and len(text) > room >= max_chars // 4:
+        first, text = take_sentences(text, room)
+        if first:
+            pieces.append(first)
+    pieces += split_long(text, max_chars - len(head) - len(lead)) if text else []
+    for n, piece in enumerate(pieces):
+        prefix = head if n == 0 else f"{label} (contd.): "
+        packer.add(f"{prefix}{piece}", turn["speaker"], turn["page"], lead=lead)
+
+def split_transcript(pages, max_chars=MAX_CHUNK_CHARS):
+    """
+    Chunks an earnings-call transcript along its structure. Prepared remarks are packed turn
+    by turn; in the Q&A every analyst's exchange is chunked on its own, a question stays with
+    its answers, and moderator hand-offs are dropped (the analyst and firm they announce go
+    into the metadata). Nothing is repeated between chunks, except that the continuation of
+    a Q&A pair too long for one chunk starts with the first line of its question.
+    Returns None when the pages do not look like a transcript.
+    """
+    lines = clean_lines(pages)
+    preamble, turns = find_turns(lines)
+    if not is_transcript(turns):
+        return None
+
+    base = {k: v for k, v in pages[0].metadata.items() if k != "page"} if pages else {}
+    chunks = split_text_blocks(pages, max_chars, lines=preamble, section="preamble") if preamble else []
+
+    section = "remarks"
+    packer = _Packer(max_chars, base, section)
+    for turn in turns:
+        if turn["role"] == "moderator":
+            intro = QUESTION_FROM.search(turn["text"])
+            if intro or (QUESTION_TURN.search(turn["text"]) and not CLOSING.search(turn["text"])):
+                packer.flush()
+                chunks += packer.chunks
+                section = "qa"
+                packer = _Packer(max_chars, base, section, analyst=intro.group("name") if intro else None,
+                                 analyst_firm=(intro.group("firm") or "").strip() if intro else None)
+                continue
+            if section == "qa" and CLOSING.search(turn["text"]):
+                packer.flush()
+                chunks += packer.chunks
+                section = "closing"
+                packer = _Packer(max_chars, base, section)
+            if section == "qa":
+                continue
+
+        if section != "qa":
+            _add_turn(packer, turn["speaker"], turn, max_chars)
+            continue
+
+        if not packer.metadata["analyst"] and not packer.units:
+            # Hand-off without a parsable name: whoever speaks first asks the question.
+            packer.metadata["analyst"] = turn["speaker"]
+        analyst = packer.metadata["analyst"]
+        if turn["role"] == "analyst" or _names_match(turn["speaker"], analyst or ""):
+            firm = packer.metadata.get("analyst_firm")
+            label = f"{turn['speaker']} ({firm})" if firm else turn["speaker"]
+            packer.question = turn["text"].split("\n")[0][:200]
+            _add_turn(packer, label, turn, max_chars)
+        else:
+            lead = f"Q: {packer.question}\n" if packer.question else ""
+            _add_turn(packer, turn["speaker"], turn, max_chars, lead=lead)
+
+    packer.flush()
+    return chunks + packer.chunks
+
+def is_table_row(line, min_numbers=2, min_share=0.25):
+    tokens = line.split()
+    numbers = sum(bool(NUMBER.match(t)) for t in tokens)
+    return len(tokens) >= 2 and numbers >= min_numbers and numbers / len(tokens) >= min_share
+
+def text_blocks(lines):
+    """
+    Groups cleaned lines into ("prose", page, text) paragraphs and ("table", page, [rows])
+    runs of at least two numeric rows. A short caption right above a table becomes its first row.
+    """
+    blocks, prose, rows = [], [], []
+
+    def close_prose():
+        if prose:
+            text = join_lines([line for _, line in prose])
+            if text:
+                blocks.append(("prose", prose[0][0], text))
+            prose.clear()
+
+    def close_table():
+        if sum(is_table_row(line) for _, line in rows) >= 2:
+            blocks.append(("table", rows[0][0], [line for _, line in rows]))
+        elif rows:
+            # A lone numeric line (addresses, phone numbers) is just prose.
+            prose.extend(rows)
+            close_prose()
+        rows.clear()
+
+    for page, line in lines:
+        if line and is_table_row(line):
+            if not rows and prose and len(prose[-1][1]) <= 100 and not prose[-1][1].endswith("."):
+                rows.append(prose.pop())
+            close_prose()
+            rows.append((page, line))
+        elif rows and line and len(line) <= 60:
+            # Row labels wrapped onto their own line stay in the table.
+            rows.append((page, line))
+        else:
+            close_table()
+            if not line:
+                close_prose()
+            else:
+                prose.append((page, line))
+    close_table()
+    close_prose()
+    return blocks
+
+def split_text_blocks(pages, max_chars=MAX_CHUNK_CHARS, lines=None, section="body"):
+    """
+    Table-aware chunking for annual reports, presentations and announcements: paragraphs are
+    packed up to max_chars and split only at sentence boundaries, and a table is never cut
+    between its caption and its rows. A table longer than max_chars is split by rows with
+    its caption repeated on each part.
+    """
+    lines = clean_lines(pages) if lines is None else lines
+    base = {k: v for k, v in pages[0].metadata.items() if k != "page"} if pages else {}
+    chunks, units, size = [], [], 0
+
+    def flush():
+        nonlocal size
+        if units:
+            chunks.append(_document(
+                "\n".join(text for text, _, _ in units), base, section=section,
+                page=units[0][1], has_table=any(table for _, _, table in units)
+            ))
+        units.clear()
+        size = 0
+
+    def add(text, page, table=False):
+        nonlocal size
+        if units and size + len(text) > max_chars:
+            flush()
+        units.append((text, page, table))
+        size += len(text) + 1
+
+    for kind, page, content in text_blocks(lines):
+        if kind == "prose":
+            for piece in split_long(content, max_chars):
+                add(piece, page)
+            continue
+        table = "\n".join(content)
+        if len(table) <= max_chars:
+            add(table, page, table=True)
+            continue
+        caption = content[0] if not is_table_row(content[0]) else ""
+        part = []
+        for row in content[1:] if caption else content:
+            if part and len(caption) + sum(len(r) + 1 for r in part) + len(row) > max_chars:
+                add("\n".join(([caption] if caption else []) + part), page, table=True)
+                flush()
+                part = []
+            part.append(row)
+        if part:
+            add("\n".join(([caption] if caption else []) + part), page, table=True)
+    flush()
+    return chunks
+
+def chunker_id(strategy=None, chunk_size=1000, chunk_overlap=100, max_chars=MAX_CHUNK_CHARS):
+    """Identifies the chunking that produced a file's vectors (stored in the ingest manifest)."""
+    strategy = strategy or CHUNKER
+    if strategy == "recursive":
+        return f"recursive-{chunk_size}-{chunk_overlap}"
+    return f"structured-v{STRUCTURED_VERSION}-{max_chars}"
+
+def split_pages(pages, doc_type=None, strategy=None, chunk_size=1000, chunk_overlap=100, max_chars=MAX_CHUNK_CHARS):
+    """
+    Splits one document's pages into chunks with the CHUNKER strategy. Structured chunking
+    uses split_transcript for anything that reads as a transcript (speaker turns) and
+    split_text_blocks otherwise; chunk_size/chunk_overlap only apply to "recursive".
+    """
+    strategy = strategy or CHUNKER
+    if strategy == "recursive":
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        return splitter.split_documents(pages)
+    if strategy != "structured":
+        raise ValueError(f"Unknown CHUNKER {strategy!r} (structured or recursive)")
+
+    if doc_type in (None, "concall"):
+        chunks = split_transcript(pages, max_chars)
+        if chunks is not None:
+            return chunks
+    return split_text_blocks(pages, max_chars)
@@ -0,0 +1,136 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import httpx
+from langchain_core.embeddings import Embeddings
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens are added per second up to `capacity`.
+    Each acquire() reserves its tokens under a thread lock and then sleeps until they are
+    due, so one bucket paces every caller in the process, whichever thread or loop it runs on.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Takes `tokens` (going into debt if needed) and returns the seconds until they are due."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate) - tokens
+            self.updated = now
+            return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self, tokens=1):
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+class EmbeddingScheduler(Embeddings):
+    """
+    Calls the Gemini batchEmbedContents REST endpoint directly, splitting texts into
+    batches of `batch_size` and sending up to `concurrency` batches at a time.
+    Requests are paced by a token bucket of `requests_per_minute` and retried with
+    exponential backoff on 429/5xx and connection errors.
+
+    The bucket, the concurrency limit and the HTTP client are shared by every call: the
+    requests run on the scheduler's own event loop thread (started on first use), so calls
+    from several ingest threads together stay within `requests_per_minute` and `concurrency`
+    and reuse the same connections.
+
+    Point `base_url` at common/fake_embedding_server.py to exercise it without quota.
+    """
+
+    def __init__(self, model="models/embedding-001", api_key=None, base_url=GEMINI_BASE_URL,
+                 batch_size=100, concurrency=8, requests_per_minute=1500,
+                 max_retries=6, backoff=1.0, timeout=60.0):
+        self.model = model
+        self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.requests = 0
+        self.retries = 0
+        self.bucket = TokenBucket(requests_per_minute / 60.0, capacity=concurrency)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=timeout, limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="embedding-scheduler", daemon=True).start()
+        return self._loop
+
+    async def _post_batch(self, texts, task_type):
+        body = {
+            "requests": [
+                {"model": self.model, "content": {"parts": [{"text": text}]}, "taskType": task_type}
+                for text in texts
+            ]
+        }
+        url = f"{self.base_url}/v1beta/{self.model}:batchEmbedContents"
+
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            self.requests += 1
+            try:
+                response = await self._client.post(url, json=body, headers={"x-goog-api-key": self.api_key or ""})
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            else:
+                if response.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return [item["values"] for item in response.json()["embeddings"]]
+                retry_after = response.headers.get("retry-after")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** attempt
+
+            self.retries += 1
+            await asyncio.sleep(delay + random.uniform(0, self.backoff))
+
+    async def _embed(self, texts, task_type):
+        async def run(batch):
+            async with self._semaphore:
+                return await self._post_batch(batch, task_type)
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [vector for batch in results for vector in batch]
+
+    async def aembed_documents(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        if not texts:
+            return []
+        # The shared client and semaphore belong to the scheduler's loop.
+        future = asyncio.run_coroutine_threadsafe(self._embed(texts, task_type), self._get_loop())
+        return await asyncio.wrap_future(future)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text], task_type="RETRIEVAL_QUERY"))[0]
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return asyncio.run_coroutine_threadsafe(self._embed(texts, "RETRIEVAL_DOCUMENT"), self._get_loop()).result()
+
+    def embed_query(self, text):
+        return asyncio.run_coroutine_threadsafe(self._embed([text], "RETRIEVAL_QUERY"), self._get_loop()).result()[0]
@@ -0,0 +1,155 @@
+import os
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from langchain_core.embeddings import Embeddings
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBEDDING_MODEL = "models/embedding-001"
+CACHE_FILE = os.getenv("EMBEDDING_CACHE", os.path.join(ROOT_DIR, ".embedding_cache.sqlite3"))
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with an on-disk SQLite cache keyed by
+    sha256(model name + document/query + normalized chunk text).
+    Only the misses of each call are sent to the wrapped model.
+    """
+
+    def __init__(self, embedding_model, model_name=EMBEDDING_MODEL, cache_file=CACHE_FILE):
+        self.embedding_model = embedding_model
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(cache_file, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f"{self.model_name}\n{kind}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        """
+        Cached vectors for `keys`, counting each key found as a hit and each distinct key
+        not found as a miss (duplicates of a miss are embedded once and reused).
+        """
+        found = {}
+        unique = list(set(keys))
+        with self._lock:
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            misses = len(unique) - len(found)
+            self.hits += len(keys) - misses
+            self.misses += misses
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items]
+            )
+            self._db.commit()
+
+    def embed_documents(self, texts):
+        keys = [self._key("document", text) for text in texts]
+        found = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.embedding_model.embed_documents(list(missing.values()))
+            computed = list(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        key = self._key("query", text)
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+
+        vector = self.embedding_model.embed_query(text)
+        self._store([(key, vector)])
+        return vector
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        rate = (hits / total * 100) if total else 0.0
+        return f"Embedding cache: {hits} hits, {misses} misses ({rate:.1f}% hit rate)"
+
+class StubEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings: hashed bag of words, L2-normalized, so texts that
+    share words still land near each other in retrieval benchmarks.
+    """
+
+    def __init__(self, dim=768):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = [0.0] * self.dim
+        for word in normalize_text(text).lower().split():
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+def embedding_provider():
+    return os.getenv("EMBEDDING_PROVIDER") or ("stub" if os.getenv("LLM_PROVIDER") == "stub" else "gemini")
+
+def embedding_model_name():
+    """Name the configured embedding model's vectors are recorded under (cache keys, FAISS builds, snapshots)."""
+    return f"stub/{EMBEDDING_MODEL}" if embedding_provider() == "stub" else EMBEDDING_MODEL
+
+def get_embedding_model(scheduled=True):
+    """
+    Returns the cached embedding model. `scheduled` routes document embedding through
+    EmbeddingScheduler (for ingest); serving uses langchain's gRPC client, which keeps
+    its channel open between queries. EMBEDDING_PROVIDER=stub (or LLM_PROVIDER=stub)
+    returns StubEmbeddings instead.
+    """
+    if embedding_provider() == "stub":
+        return CachedEmbeddings(StubEmbeddings(), model_name=embedding_model_name())
+
+    if not scheduled:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        return CachedEmbeddings(GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL))
+
+    from common.embedding_scheduler import EmbeddingScheduler, GEMINI_BASE_URL
+
+    scheduler = EmbeddingScheduler(
+        model=EMBEDDING_MODEL,
+        base_url=os.getenv("EMBEDDING_BASE_URL", GEMINI_BASE_URL),
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "100")),
+        concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", "8")),
+        requests_per_minute=float(os.getenv("EMBEDDING_RPM", "1500"))
+    )
+    return CachedEmbeddings(scheduler)
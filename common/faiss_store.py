@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import shutil
+import threading
+from common.filters import matches, may_match, filter_fields
+
+# "flat" (exact), "ivf" (inverted lists, FAISS_NPROBE probed per query) or "hnsw" (graph).
+FAISS_INDEX = os.getenv("FAISS_INDEX", "hnsw")
+# Stored vector codes: "none" (float32), "int8" (scalar quantizer, 4x smaller, ~99% recall) or
+# "pq" (product quantizer, smallest, but recall drops sharply; only for very large shards).
+FAISS_COMPRESSION = os.getenv("FAISS_COMPRESSION", "none")
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+# OpenMP threads per process. Queries are single vectors over small partitions, so extra
+# threads only contend with the other workers on the host.
+FAISS_THREADS = int(os.getenv("FAISS_THREADS", "1"))
+FAISS_DIR = "faiss"
+FAISS_FORMAT_VERSION = 1
+# Each (stock, type, fiscal year) gets its own sub-index; filters on these fields pick
+# sub-indexes instead of scanning and discarding.
+PARTITION_FIELDS = ("stock", "type", "fy")
+HNSW_M = 32
+# IVF lists and PQ centroids (2**nbits per sub-quantizer) need ~39 training points each;
+# partitions too small for them are built flat / int8 instead.
+IVF_POINTS_PER_LIST = 39
+PQ_MIN_POINTS = {8: 256 * IVF_POINTS_PER_LIST, 4: 16 * IVF_POINTS_PER_LIST}
+MAX_TRAIN_POINTS = 50000
+# Candidates fetched per partition for each result kept when the filter also looks at
+# fields outside the partition key.
+POST_FILTER_OVERSAMPLE = 4
+
+def _faiss():
+    import faiss
+
+    faiss.omp_set_num_threads(FAISS_THREADS)
+    return faiss
+
+def pq_subquantizers(dim):
+    """One PQ sub-vector per 8 dimensions (96 bytes per 768-d vector at 8 bits)."""
+    for width in (8, 4, 2, 1):
+        if dim % width == 0:
+            return dim // width
+
+def index_spec(index, compression, count, dim):
+    """faiss.index_factory string for one partition of `count` vectors."""
+    codec = {"none": "Flat", "int8": "SQ8"}.get(compression)
+    if compression == "pq":
+        nbits = next((bits for bits, points in sorted(PQ_MIN_POINTS.items(), reverse=True) if count >= points), None)
+        codec = f"PQ{pq_subquantizers(dim)}x{nbits}" if nbits else "SQ8"
+    if codec is None:
+        raise ValueError(f"Unknown FAISS_COMPRESSION {compression!r} (none, int8 or pq)")
+
+    if index == "ivf":
+        nlist = min(int(4 * count ** 0.5), count // IVF_POINTS_PER_LIST)
+        return f"IVF{nlist},{codec}" if nlist >= 4 else codec
+    if index == "hnsw":
+        return f"HNSW{HNSW_M}" if codec == "Flat" else f"HNSW{HNSW_M}_{codec}"
+    if index == "flat":
+        return codec
+    raise ValueError(f"Unknown FAISS_INDEX {index!r} (flat, ivf or hnsw)")
+
+def current_build(path):
+    try:
+        with open(os.path.join(path, "CURRENT")) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def build_faiss_index(path, ids, vectors, texts, metadatas, embedding_model, index=FAISS_INDEX,
+                      compression=FAISS_COMPRESSION, partition_fields=PARTITION_FIELDS):
+    """
+    Writes a new read-only build under `path` and points `path`/CURRENT at it:
+
+        <build>/manifest.json    dims, embedding model, one entry per partition
+        <build>/p<N>.faiss       one FAISS index per (stock, type, fy) partition
+        <build>/chunks.jsonl     {"id", "text", "metadata"} per row, partition by partition
+        <build>/offsets.npy      byte offset of every row in chunks.jsonl
+
+    Readers that still have the previous build mapped keep working; builds older than that
+    are deleted.
+    """
+    import numpy as np
+
+    faiss = _faiss()
+    if len(vectors) != len(ids):
+        raise ValueError(f"{len(ids)} ids but {len(vectors)} vectors")
+    vectors = np.array(vectors, dtype="float32").reshape(len(ids), -1) if ids else np.zeros((0, 0), dtype="float32")
+    dim = vectors.shape[1]
+    if len(vectors):
+        faiss.normalize_L2(vectors)
+
+    partitions = {}
+    for row, metadata in enumerate(metadatas):
+        values = tuple((metadata or {}).get(field) for field in partition_fields)
+        partitions.setdefault(values, []).append(row)
+
+    os.makedirs(path, exist_ok=True)
+    build = time.strftime("%Y%m%d%H%M%S") + f"-{time.time_ns() % 10**9:09d}"
+    tmp_dir = os.path.join(path, build + ".tmp")
+    os.makedirs(tmp_dir)
+
+    entries = []
+    offsets = [0]
+    start = 0
+    with open(os.path.join(tmp_dir, "chunks.jsonl"), "wb") as chunks:
+        for number, (values, rows) in enumerate(sorted(partitions.items(), key=lambda kv: repr(kv[0]))):
+            spec = index_spec(index, compression, len(rows), dim)
+            part = vectors[rows]
+            faiss_index = faiss.index_factory(dim, spec, faiss.METRIC_L2)
+            for inner in (faiss_index, getattr(faiss_index, "storage", None)):
+                inner = inner and faiss.downcast_index(inner)
+                # Polysemous codes are never used at search time and training them takes minutes.
+                if hasattr(inner, "do_polysemous_training"):
+                    inner.do_polysemous_training = False
+            if not faiss_index.is_trained:
+                sample = part if len(part) <= MAX_TRAIN_POINTS else part[np.random.default_rng(0).choice(len(part), MAX_TRAIN_POINTS, replace=False)]
+                faiss_index.train(sample)
+            faiss_index.add(part)
+            file_name = f"p{number}.faiss"
+            faiss.write_index(faiss_index, os.path.join(tmp_dir, file_name))
+
+            for row in rows:
+                line = json.dumps({"id": ids[row], "text": texts[row], "metadata": metadatas[row] or {}}, ensure_ascii=False)
+                chunks.write(line.encode("utf-8") + b"\n")
+                offsets.append(chunks.tell())
+            entries.append({
+                "values": dict(zip(partition_fields, values)),
+                "spec": spec,
+                "file": file_name,
+                "start": start,
+                "count": len(rows),
+            })
+            start += len(rows)
+
+    np.save(os.path.join(tmp_dir, "offsets.npy"), np.array(offsets, dtype="int64"))
+    manifest = {
+        "version": FAISS_FORMAT_VERSION,
+        "dim": dim,
+        # L2 on unit vectors ranks like cosine and is supported by every index type (HNSW+PQ is L2-only).
+        "metric": "l2_normalized",
+        "embedding_model": embedding_model,
+        "index": index,
+        "compression": compression,
+        "partition_fields": list(partition_fields),
+        "count": len(ids),
+        "built_at": time.time(),
+        "partitions": entries,
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_dir, os.path.join(path, build))
+
+    previous = current_build(path)
+    tmp_file = os.path.join(path, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp_file, "w") as f:
+        f.write(build)
+    os.replace(tmp_file, os.path.join(path, "CURRENT"))
+
+    for name in os.listdir(path):
+        if name not in (build, previous, "CURRENT") and os.path.isdir(os.path.join(path, name)):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    return manifest
+
+def build_from_chroma(vectorstore, path, embedding_model, batch_size=1000, **options):
+    """Builds the FAISS index from the vectors already stored in a Chroma collection (no re-embedding)."""
+    ids, vectors, texts, metadatas = [], [], [], []
+    offset = 0
+    while True:
+        batch = vectorstore.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        ids += batch["ids"]
+        vectors += list(batch["embeddings"])
+        texts += batch["documents"]
+        metadatas += batch["metadatas"]
+        offset += len(batch["ids"])
+    return build_faiss_index(path, ids, vectors, texts, metadatas, embedding_model, **options)
+
+class _Build:
+    """One loaded build: memory-mapped sub-indexes and chunk rows."""
+
+    def __init__(self, path, name):
+        import mmap
+        import numpy as np
+
+        faiss = _faiss()
+        self.name = name
+        self.path = os.path.join(path, name)
+        with open(os.path.join(self.path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != FAISS_FORMAT_VERSION:
+            raise ValueError(f"{self.path}: unsupported FAISS index version {self.manifest.get('version')}")
+
+        self.partitions = []
+        for entry in self.manifest["partitions"]:
+            # IVF lists are mapped through MMAP; flat, SQ/PQ codes and HNSW graphs through MMAP_IFC.
+            # Either way the pages are file-backed and shared by every process that maps them.
+            mmap_flag = faiss.IO_FLAG_MMAP if entry["spec"].startswith("IVF") else faiss.IO_FLAG_MMAP_IFC
+            faiss_index = faiss.read_index(os.path.join(self.path, entry["file"]), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+            if entry["spec"].startswith("IVF"):
+                faiss.extract_index_ivf(faiss_index).nprobe = FAISS_NPROBE
+            elif entry["spec"].startswith("HNSW"):
+                faiss_index.hnsw.efSearch = FAISS_EF_SEARCH
+            self.partitions.append((entry, faiss_index))
+
+        self.offsets = np.load(os.path.join(self.path, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(self.path, "chunks.jsonl"), "rb") as f:
+            self.chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def row(self, i):
+        return json.loads(self.chunks[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+class FaissStore:
+    """
+    Read-only vector store over a build_faiss_index() directory, with the part of langchain's
+    VectorStore API the QA code calls (similarity_search, similarity_search_with_score).
+
+    Index files, chunk text and offsets are memory-mapped, so gunicorn workers on one host
+    share their pages instead of each holding a copy. A `where` filter first selects the
+    partitions whose stock/type/fy can match; conditions on other fields are applied to
+    the candidates. A new build published by ingest is picked up by refresh().
+    """
+
+    def __init__(self, path, embedding_function, reload_interval=5.0):
+        self.path = path
+        self.embedding_function = embedding_function
+        self.reload_interval = reload_interval
+        self._build = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.refresh(force=True)
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def __len__(self):
+        return self._build.manifest["count"]
+
+    def refresh(self, force=False):
+        """Switches to the build CURRENT points at if ingest has published a new one."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_interval:
+            return
+        with self._lock:
+            self._checked = now
+            name = current_build(self.path)
+            if name is None:
+                raise FileNotFoundError(f"No FAISS index in {self.path}")
+            if self._build is not None and self._build.name == name:
+                return
+            build = _Build(self.path, name)
+            expected = getattr(self.embedding_function, "model_name", None)
+            if expected and build.manifest["embedding_model"] != expected:
+                raise ValueError(
+                    f"{self.path} was built with {build.manifest['embedding_model']!r}, "
+                    f"queries are embedded with {expected!r}; rebuild the index"
+                )
+            self._build = build
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        import numpy as np
+
+        self.refresh()
+        build = self._build
+        query = np.array([embedding], dtype="float32")
+        _faiss().normalize_L2(query)
+
+        post_filter = bool(filter_fields(filter) - set(build.manifest["partition_fields"]))
+        fetch = k * POST_FILTER_OVERSAMPLE if post_filter else k
+        candidates = []
+        for entry, faiss_index in build.partitions:
+            if not may_match(entry["values"], filter):
+                continue
+            distances, rows = faiss_index.search(query, min(fetch, entry["count"]))
+            # Squared L2 between unit vectors is 2 - 2 * cosine.
+            candidates += [(1 - float(d) / 2, entry["start"] + int(r)) for d, r in zip(distances[0], rows[0]) if r >= 0]
+
+        from langchain_core.documents import Document
+
+        results = []
+        for score, row in sorted(candidates, reverse=True):
+            chunk = build.row(row)
+            if post_filter and not matches(chunk["metadata"], filter):
+                continue
+            results.append((Document(page_content=chunk["text"], metadata=chunk["metadata"], id=chunk["id"]), score))
+            if len(results) == k:
+                break
+        return results
+
+    def similarity_search_with_score(self, query, k=4, filter=None):
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
@@ -0,0 +1,87 @@
+"""
+Local stand-in for the Gemini batchEmbedContents endpoint, for exercising
+EmbeddingScheduler without network access or quota.
+
+    python -m common.fake_embedding_server --port 8765 --latency 0.2 --error-rate 0.1
+    EMBEDDING_BASE_URL=http://127.0.0.1:8765 python qa_new/ingest.py
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def fake_vector(text, dim):
+    """Deterministic unit-ish vector derived from the text hash."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    values = [rng.uniform(-1, 1) for _ in range(dim)]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+def make_handler(dim=768, latency=0.0, error_rate=0.0, max_batch=100):
+    stats = {"requests": 0, "errors": 0, "texts": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            requests = body.get("requests", [])
+
+            with lock:
+                stats["requests"] += 1
+
+            if latency:
+                time.sleep(latency)
+
+            if len(requests) > max_batch:
+                return self._send(400, {"error": {"message": f"at most {max_batch} requests per batch"}})
+
+            if random.random() < error_rate:
+                with lock:
+                    stats["errors"] += 1
+                return self._send(random.choice([429, 503]), {"error": {"message": "injected failure"}})
+
+            with lock:
+                stats["texts"] += len(requests)
+            embeddings = [
+                {"values": fake_vector(" ".join(p.get("text", "") for p in r["content"]["parts"]), dim)}
+                for r in requests
+            ]
+            self._send(200, {"embeddings": embeddings})
+
+        def do_GET(self):
+            with lock:
+                self._send(200, dict(stats))
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def serve(port=8765, **kwargs):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(**kwargs))
+    server.daemon_threads = True
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gemini embedding server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to sleep per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/503")
+    args = parser.parse_args()
+
+    server = serve(args.port, dim=args.dim, latency=args.latency, error_rate=args.error_rate)
+    print(f"Fake embedding server listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,84 @@
+import operator
+
+COMPARISONS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+def _compare(value, op, expected):
+    if op == "$eq":
+        return value == expected
+    if op == "$ne":
+        return value != expected
+    if op == "$in":
+        return value in expected
+    if op == "$nin":
+        return value not in expected
+    if op in COMPARISONS:
+        # Like Chroma: a chunk without the field (or with a value of another type) does not match.
+        try:
+            return value is not None and COMPARISONS[op](value, expected)
+        except TypeError:
+            return False
+    raise ValueError(f"Unsupported filter operator {op!r}")
+
+def matches(metadata, where):
+    """
+    Evaluates the subset of Chroma `where` filters used in this repo ({"field": value}, $eq,
+    $ne, $in, $nin, $gt, $gte, $lt, $lte, $and, $or) against a metadata dict. Any other
+    operator raises ValueError rather than matching everything.
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, c) for c in condition):
+                return False
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported filter operator {key!r}")
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if not _compare(value, op, expected):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def filter_fields(where):
+    """Metadata fields a `where` filter looks at."""
+    fields = set()
+    for key, condition in (where or {}).items():
+        if key in ("$and", "$or"):
+            for c in condition:
+                fields |= filter_fields(c)
+        else:
+            fields.add(key)
+    return fields
+
+def may_match(values, where):
+    """
+    Like matches(), but for a partition that only knows some of the fields (e.g. stock, type
+    and fy): a condition on any other field counts as satisfied, so the partitions this
+    selects are a superset of the ones holding matching chunks. Unsupported operators raise
+    ValueError like in matches().
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(may_match(values, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(may_match(values, c) for c in condition):
+                return False
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported filter operator {key!r}")
+        elif key in values:
+            if not matches(values, {key: condition}):
+                return False
+        elif isinstance(condition, dict):
+            for op in condition:
+                if op not in ("$eq", "$ne", "$in", "$nin") and op not in COMPARISONS:
+                    raise ValueError(f"Unsupported filter operator {op!r}")
+    return True
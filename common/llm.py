@@ -0,0 +1,374 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import get_args, get_origin
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+DEFAULT_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+
+def is_retryable(error):
+    """
+    Timeouts, rate limits (429) and server errors (5xx) are worth another attempt; anything
+    else (bad request, auth, a response that failed validation, a bug) fails the same way again.
+    Checked by class name and status code so that no provider SDK has to be imported.
+    """
+    if isinstance(error, TimeoutError) or any("Timeout" in cls.__name__ or "DeadlineExceeded" in cls.__name__
+                                              for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        code = getattr(error, "code", None)
+        status = code if isinstance(code, int) else None
+    return status == 429 or (status is not None and 500 <= status < 600)
+
+def estimate_tokens(text, chars_per_token=4.0):
+    return int(len(text) / chars_per_token) + 1
+
+class Metrics:
+    """
+    Per-backend call counters. Cheap enough to stay on for every call.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, input_tokens=0, output_tokens=0):
+        with self._lock:
+            self.calls += 1
+            self.latency_seconds += latency
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def record_error(self, retried):
+        with self._lock:
+            self.errors += 1
+            self.retries += retried
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "avg_latency_ms": round(self.latency_seconds / self.calls * 1000, 1) if self.calls else 0.0,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+            }
+
+class LLMBackend:
+    """
+    One long-lived client per provider/model. Entry points get instances through get_backend().
+
+    generate / agenerate / stream return plain text; structured returns
+    (response_model instance, (input_tokens, output_tokens)) through instructor.
+    Every call has a timeout, is retried with backoff on timeouts, 429 and 5xx (is_retryable),
+    and is recorded in `metrics`, failures included. stream is retried only until its first
+    chunk has been yielded; a failure after that is recorded and raised to the caller.
+    """
+
+    provider = None
+
+    def __init__(self, model, timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_RETRIES):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.metrics = Metrics()
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _connect(self):
+        """Builds the provider SDK client. Subclasses import their SDK here, not at module level."""
+        return None
+
+    @property
+    def client(self):
+        # Created on the first call rather than in get_backend(), so modules can hold a
+        # backend at import time without loading the SDK.
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._connect()
+        return self._client
+
+    def warm_up(self):
+        """Creates the SDK client now instead of on the first request."""
+        return self.client
+
+    def _with_retries(self, call):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return call()
+            except Exception as e:
+                retry = attempt < self.max_retries and is_retryable(e)
+                self.metrics.record_error(retried=retry)
+                if not retry:
+                    raise
+                time.sleep(2 ** attempt + random.uniform(0, 1))
+
+    async def _with_retries_async(self, call):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await call()
+            except Exception as e:
+                retry = attempt < self.max_retries and is_retryable(e)
+                self.metrics.record_error(retried=retry)
+                if not retry:
+                    raise
+                await asyncio.sleep(2 ** attempt + random.uniform(0, 1))
+
+    def generate(self, prompt, timeout=None):
+        start = time.perf_counter()
+        text, usage = self._with_retries(lambda: self._generate(prompt, timeout or self.timeout))
+        self.metrics.record(time.perf_counter() - start, *usage)
+        return text
+
+    async def agenerate(self, prompt, timeout=None):
+        start = time.perf_counter()
+        text, usage = await self._with_retries_async(lambda: self._agenerate(prompt, timeout or self.timeout))
+        self.metrics.record(time.perf_counter() - start, *usage)
+        return text
+
+    def stream(self, prompt, timeout=None):
+        start = time.perf_counter()
+        parts = []
+        for attempt in range(self.max_retries + 1):
+            try:
+                for part in self._stream(prompt, timeout or self.timeout):
+                    parts.append(part)
+                    yield part
+                break
+            except Exception as e:
+                # Text already sent to the caller cannot be taken back, so only a stream that
+                # failed before its first chunk is started again.
+                retry = not parts and attempt < self.max_retries and is_retryable(e)
+                self.metrics.record_error(retried=retry)
+                if not retry:
+                    raise
+                time.sleep(2 ** attempt + random.uniform(0, 1))
+        self.metrics.record(time.perf_counter() - start, estimate_tokens(prompt), estimate_tokens("".join(parts)))
+
+    def structured(self, prompt, response_model, timeout=None):
+        start = time.perf_counter()
+        result, usage = self._with_retries(lambda: self._structured(prompt, response_model, timeout or self.timeout))
+        if usage is None:
+            usage = estimate_tokens(prompt), estimate_tokens(result.model_dump_json())
+        self.metrics.record(time.perf_counter() - start, *usage)
+        return result, usage
+
+    def count_tokens(self, text):
+        return estimate_tokens(text)
+
+class GeminiBackend(LLMBackend):
+    provider = "gemini"
+
+    def __init__(self, model, **kwargs):
+        super().__init__(model, **kwargs)
+        self._instructor = None
+
+    def _connect(self):
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        return genai.GenerativeModel(model_name=self.model)
+
+    @staticmethod
+    def _usage(response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return 0, 0
+        return usage.prompt_token_count or 0, usage.candidates_token_count or 0
+
+    def _generate(self, prompt, timeout):
+        response = self.client.generate_content(prompt, request_options={"timeout": timeout})
+        return response.text, self._usage(response)
+
+    async def _agenerate(self, prompt, timeout):
+        response = await self.client.generate_content_async(prompt, request_options={"timeout": timeout})
+        return response.text, self._usage(response)
+
+    def _stream(self, prompt, timeout):
+        for part in self.client.generate_content(prompt, stream=True, request_options={"timeout": timeout}):
+            yield part.text
+
+    def _structured(self, prompt, response_model, timeout):
+        import instructor
+
+        if self._instructor is None:
+            self._instructor = instructor.from_gemini(self.client, mode=instructor.Mode.GEMINI_JSON)
+        result, completion = self._instructor.messages.create_with_completion(
+            messages=[{"role": "user", "content": prompt}],
+            response_model=response_model,
+            request_options={"timeout": timeout}
+        )
+        return result, self._usage(completion)
+
+    def count_tokens(self, text):
+        return self.client.count_tokens(contents=text).total_tokens
+
+class OpenAIBackend(LLMBackend):
+    provider = "openai"
+
+    def __init__(self, model, **kwargs):
+        super().__init__(model, **kwargs)
+        self.async_client = None
+        self._instructor = None
+
+    def _connect(self):
+        from openai import OpenAI
+
+        # Retries are handled here so they are counted in the metrics.
+        return OpenAI(api_key=os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEy"), max_retries=0)
+
+    @staticmethod
+    def _usage(response):
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return 0, 0
+        return usage.prompt_tokens or 0, usage.completion_tokens or 0
+
+    def _messages(self, prompt):
+        return [{"role": "user", "content": prompt}]
+
+    def _generate(self, prompt, timeout):
+        response = self.client.chat.completions.create(model=self.model, messages=self._messages(prompt), timeout=timeout)
+        return response.choices[0].message.content, self._usage(response)
+
+    async def _agenerate(self, prompt, timeout):
+        if self.async_client is None:
+            from openai import AsyncOpenAI
+
+            self.async_client = AsyncOpenAI(api_key=self.client.api_key, max_retries=0)
+        response = await self.async_client.chat.completions.create(
+            model=self.model, messages=self._messages(prompt), timeout=timeout
+        )
+        return response.choices[0].message.content, self._usage(response)
+
+    def _stream(self, prompt, timeout):
+        response = self.client.chat.completions.create(
+            model=self.model, messages=self._messages(prompt), timeout=timeout, stream=True
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _structured(self, prompt, response_model, timeout):
+        import instructor
+
+        if self._instructor is None:
+            self._instructor = instructor.from_openai(self.client)
+        result, completion = self._instructor.chat.completions.create_with_completion(
+            model=self.model,
+            messages=self._messages(prompt),
+            response_model=response_model,
+            timeout=timeout
+        )
+        return result, self._usage(completion)
+
+class StubBackend(LLMBackend):
+    """
+    Deterministic offline backend for load tests and benchmarks: the same prompt always
+    gets the same answer, after LLM_STUB_LATENCY seconds (default 0).
+    """
+
+    provider = "stub"
+
+    def __init__(self, model, latency=None, **kwargs):
+        super().__init__(model, **kwargs)
+        self.latency = float(os.getenv("LLM_STUB_LATENCY", "0")) if latency is None else latency
+
+    def _text(self, prompt, words=120):
+        seed = hashlib.sha256(f"{self.model}\n{prompt}".encode("utf-8")).hexdigest()
+        rng = random.Random(seed)
+        vocabulary = ["revenue", "margin", "growth", "<b>₹1,200 crore</b>", "guidance", "demand",
+                      "<b>12% YoY</b>", "capex", "order book", "outlook", "EBITDA", "expansion"]
+        body = " ".join(rng.choice(vocabulary) for _ in range(words))
+        return f"**Stub answer {seed[:8]}:** {body}\n\n**Conclusion:** stub response from {self.model}."
+
+    def _usage(self, prompt, text):
+        return estimate_tokens(prompt), estimate_tokens(text)
+
+    def _respond(self, prompt):
+        if "comma-separated" in prompt and "annual_report" in prompt:
+            # The intent classifier prompt: answer with every doc type.
+            text = "annual_report, concall, announcement"
+        else:
+            text = self._text(prompt)
+        return text, self._usage(prompt, text)
+
+    def _generate(self, prompt, timeout):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def _agenerate(self, prompt, timeout):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    def _stream(self, prompt, timeout):
+        text, _ = self._generate(prompt, timeout)
+        for i in range(0, len(text), 40):
+            yield text[i:i + 40]
+
+    def _fill(self, annotation, name, seed):
+        origin = get_origin(annotation)
+        if origin is list:
+            return [self._fill(get_args(annotation)[0], name, f"{seed}{i}") for i in range(3)]
+        if annotation is str:
+            return f"<b>{name.replace('_', ' ').title()}:</b> {self._text(seed, words=40)}"
+        if annotation in (int, float):
+            return annotation(int(hashlib.sha256(seed.encode()).hexdigest()[:4], 16) % 1000)
+        if annotation is bool:
+            return True
+        if hasattr(annotation, "model_fields"):
+            return self._build(annotation, seed)
+        return None
+
+    def _build(self, response_model, seed):
+        return response_model(**{
+            name: self._fill(field.annotation, name, f"{seed}{name}")
+            for name, field in response_model.model_fields.items()
+        })
+
+    def _structured(self, prompt, response_model, timeout):
+        if self.latency:
+            time.sleep(self.latency)
+        result = self._build(response_model, prompt)
+        return result, self._usage(prompt, result.model_dump_json())
+
+PROVIDERS = {"gemini": GeminiBackend, "openai": OpenAIBackend, "stub": StubBackend}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def infer_provider(model):
+    return "openai" if model.startswith(("gpt-", "o1", "o3", "o4")) else "gemini"
+
+def get_backend(model="models/gemini-2.5-flash", provider=None):
+    """
+    Returns the process-wide backend for (provider, model), creating it on first use.
+    An explicit `provider` wins; otherwise LLM_PROVIDER (e.g. stub, so nothing touches the
+    network) and then the model name decide.
+    """
+    provider = provider or os.getenv("LLM_PROVIDER") or infer_provider(model)
+    key = (provider, model)
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = PROVIDERS[provider](model)
+        return _backends[key]
+
+def all_metrics():
+    with _backends_lock:
+        return {f"{provider}:{model}": backend.metrics.snapshot() for (provider, model), backend in _backends.items()}
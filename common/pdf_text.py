@@ -0,0 +1,144 @@
+import os
+import json
+import zlib
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.getenv("PDF_TEXT_CACHE", os.path.join(ROOT_DIR, ".pdf_text_cache"))
+# Bump when the extraction itself changes so old cached text is not reused.
+EXTRACTOR_VERSION = 1
+PAGES_PER_TASK = 16
+
+def pdf_digest(path, block_size=1 << 20):
+    sha = hashlib.sha256(f"pdf-text-v{EXTRACTOR_VERSION}\n".encode("utf-8"))
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def _cache_paths(digest):
+    return os.path.join(CACHE_DIR, f"{digest}.bin"), os.path.join(CACHE_DIR, f"{digest}.json")
+
+def _extract_range(path, start, stop):
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _page_count(path):
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+def _document(path, number, total, text):
+    from langchain_core.documents import Document
+
+    return Document(page_content=text, metadata={"source": path, "page": number, "total_pages": total})
+
+class _CacheWriter:
+    """
+    Appends zlib-compressed pages to <digest>.bin and writes the <digest>.json index
+    of (offset, length) pairs last, so a half-written cache is never read.
+    """
+
+    def __init__(self, digest, source):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.bin_path, self.index_path = _cache_paths(digest)
+        self.tmp_path = f"{self.bin_path}.{os.getpid()}.tmp"
+        self.source = source
+        self.offsets = []
+        self.file = open(self.tmp_path, "wb")
+
+    def add(self, text):
+        blob = zlib.compress(text.encode("utf-8"), 6)
+        self.offsets.append([self.file.tell(), len(blob)])
+        self.file.write(blob)
+
+    def commit(self):
+        self.file.close()
+        os.replace(self.tmp_path, self.bin_path)
+        tmp_index = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_index, "w") as f:
+            json.dump({"source": self.source, "pages": len(self.offsets), "offsets": self.offsets}, f)
+        os.replace(tmp_index, self.index_path)
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def _read_index(digest):
+    _, index_path = _cache_paths(digest)
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _iter_cached(path, digest, index):
+    bin_path, _ = _cache_paths(digest)
+    total = index["pages"]
+    with open(bin_path, "rb") as f:
+        for number, (offset, length) in enumerate(index["offsets"]):
+            f.seek(offset)
+            yield _document(path, number, total, zlib.decompress(f.read(length)).decode("utf-8"))
+
+def iter_pages(path):
+    """
+    Lazily yields one Document per page. Cached text is read page by page; otherwise the
+    PDF is parsed page by page and cached as it goes (the cache is only kept if the
+    iteration runs to the end).
+    """
+    digest = pdf_digest(path)
+    index = _read_index(digest)
+    if index:
+        yield from _iter_cached(path, digest, index)
+        return
+
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    total = len(reader.pages)
+    writer = _CacheWriter(digest, path)
+    try:
+        for number, page in enumerate(reader.pages):
+            text = page.extract_text() or ""
+            writer.add(text)
+            yield _document(path, number, total, text)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
+def load_pages(path, workers=None):
+    """
+    Returns every page of the PDF as a Document (same shape as PyPDFLoader.load()).
+    Cached text is returned without opening the PDF; otherwise pages are extracted in
+    ranges of PAGES_PER_TASK across a process pool and then cached. workers=1 parses in-process.
+    """
+    digest = pdf_digest(path)
+    index = _read_index(digest)
+    if index:
+        return list(_iter_cached(path, digest, index))
+
+    total = _page_count(path)
+    ranges = [(start, min(start + PAGES_PER_TASK, total)) for start in range(0, total, PAGES_PER_TASK)]
+
+    if workers == 1 or len(ranges) <= 1:
+        texts = [text for start, stop in ranges for text in _extract_range(path, start, stop)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(_extract_range, [path] * len(ranges), *zip(*ranges))
+            texts = [text for part in parts for text in part]
+
+    writer = _CacheWriter(digest, path)
+    try:
+        for text in texts:
+            writer.add(text)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
+    return [_document(path, number, total, text) for number, text in enumerate(texts)]
@@ -0,0 +1,116 @@
+import os
+import re
+import math
+import threading
+import importlib.util
+from collections import Counter
+
+RERANKER = os.getenv("RERANKER", "lexical")
+CROSS_ENCODER_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Weight of the first-pass position in the lexical score, so the semantic signal is not lost.
+RETRIEVAL_PRIOR = float(os.getenv("RERANK_RETRIEVAL_PRIOR", "0.3"))
+
+_WORDS = re.compile(r"[₹$]?\d[\d,]*(?:\.\d+)?%?|[^\W\d_]\w*")
+
+def simple_tokenize(text):
+    return [t.replace(",", "") for t in _WORDS.findall(text.lower())]
+
+class Reranker:
+    """
+    Re-orders a wide, cheap candidate set so that only the best `top_n` reach the prompt.
+    Subclasses implement score(query, docs) -> one float per doc (higher is better).
+    """
+
+    name = None
+
+    def score(self, query, docs):
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Loads whatever the first rerank would otherwise load (a model, for the cross-encoder)."""
+
+    def rerank(self, query, docs, top_n):
+        if len(docs) <= 1:
+            return docs[:top_n]
+        scores = self.score(query, docs)
+        order = sorted(range(len(docs)), key=lambda i: (-scores[i], i))
+        return [docs[i] for i in order[:top_n]]
+
+class NoopReranker(Reranker):
+    """Keeps the retrieval order; only cuts the list to top_n."""
+
+    name = "none"
+
+    def score(self, query, docs):
+        return [-i for i in range(len(docs))]
+
+class LexicalReranker(Reranker):
+    """
+    Pure-Python reranker: idf-weighted coverage of the query terms in each candidate (idf taken
+    over the candidate set itself) plus a RETRIEVAL_PRIOR bonus that decays with the retrieval
+    position. Microseconds per candidate, no model to load.
+    """
+
+    name = "lexical"
+
+    def __init__(self, tokenize=simple_tokenize, prior=RETRIEVAL_PRIOR):
+        self.tokenize = tokenize
+        self.prior = prior
+
+    def score(self, query, docs):
+        terms = set(self.tokenize(query))
+        counts = [Counter(self.tokenize(d.page_content)) for d in docs]
+        n = len(docs)
+        idf = {t: math.log(1 + n / (1 + sum(t in c for c in counts))) for t in terms}
+        total = sum(idf.values()) or 1.0
+        return [
+            sum(idf[t] for t in terms if t in c) / total + self.prior * (1 - i / n)
+            for i, c in enumerate(counts)
+        ]
+
+class CrossEncoderReranker(Reranker):
+    """
+    sentence-transformers cross-encoder (CPU-sized MiniLM by default). Optional dependency:
+    pip install sentence-transformers.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name=CROSS_ENCODER_MODEL, batch_size=32):
+        if importlib.util.find_spec("sentence_transformers") is None:
+            raise ImportError("RERANKER=cross-encoder needs `pip install sentence-transformers`")
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        # sentence-transformers pulls in torch; the model is loaded on the first rerank (or in warm_up).
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def warm_up(self):
+        return self.model
+
+    def score(self, query, docs):
+        pairs = [(query, d.page_content) for d in docs]
+        return [float(s) for s in self.model.predict(pairs, batch_size=self.batch_size)]
+
+RERANKERS = {r.name: r for r in (NoopReranker, LexicalReranker, CrossEncoderReranker)}
+
+def get_reranker(name=None, tokenize=None):
+    """
+    RERANKER selects the implementation: lexical (default), cross-encoder or none.
+    `tokenize` replaces the lexical reranker's tokenizer (e.g. the BM25 one in qa_new).
+    """
+    name = name or RERANKER
+    if name == LexicalReranker.name and tokenize:
+        return LexicalReranker(tokenize)
+    return RERANKERS[name]()
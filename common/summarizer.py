@@ -0,0 +1,238 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, Field
+from common.llm import estimate_tokens
+
+class ExtractedReport(BaseModel):
+    company_name:str = "No available content found"
+    quarterly_earnings_summary: str = Field(..., description="~300-word summary of Q4 FY25 earnings")
+    new_projects_and_capex_planning: str = Field(..., description="~300-word detailed summary of new projects & capex planning")
+    management_guidance: str = Field(..., description="~300-word detailed summary of management guidance and strategic outlook")
+    overall_summary: str = Field(...,description="~150-word detailed summary of overall conclusion")
+
+class SectionFacts(BaseModel):
+    company_name: str = ""
+    quarterly_earnings_summary: list[str] = Field(default_factory=list, description="Facts about this quarter's financial performance")
+    new_projects_and_capex_planning: list[str] = Field(default_factory=list, description="Facts about projects, capex, expansions and investments")
+    management_guidance: list[str] = Field(default_factory=list, description="Forward-looking statements and guidance from management")
+
+SECTIONS = ("quarterly_earnings_summary", "new_projects_and_capex_planning", "management_guidance")
+
+SINGLE_SHOT_PROMPT = """
+            You are a financial analyst assistant. Analyze the entire text of the company’s quarterly earnings conference call (concall) transcript provided below. 
+            From this transcript, extract and summarize the following three key areas. 
+            Your summaries must be highly insightful, context-rich, and approximately 300 words each. 
+            Focus on clarity, financial relevance, and executive tone.
+
+            **company_name**  
+                > The official name of the company holding the earnings call. 
+                This is usually mentioned at the beginning of the transcript or in opening remarks.
+            
+            Each field’s content must be ~300 words and formatted in plain-text replicating the style below:
+                
+            ### Output format [Example]:
+            1. Quarterly Earnings Summary (**quarterly_earnings_summary**) [Total ~300 words]:
+            Revenue: ₹788 crore, down 1.2% YoY due to muted consumer demand.
+            Gross Margin: ₹455 crore; margin contracted by 230 bps YoY due to product mix (higher franchise and e‑commerce) and value proposition pricing.
+            EBITDA Margin: 25.5% (adjusted 23.5% after accounting changes); declined 14 bps YoY.
+            PAT: ₹46 crore; declined by 215 bps YoY.
+            Inventory: Reduced by 16% YoY; aged inventory reduced by 30–35%.
+            Same‑store metrics (ZBM initiative):
+            Inventory lines down 40%, size availability up 300 bps.
+            Retrieval time cut to 45 seconds (vs. 1.5 minutes earlier).
+            Volume growth from ZBM stores in mid‑single digits.
+
+            2. New Projects & Capex Planning (**new_projects_and_capex_planning**) [Total ~300 words]:
+            Zero Base Merchandising (ZBM):
+            Expanded to 146 stores (targeting 300 by December 2025).
+            Aims to declutter stores, improve consumer experience, and optimize inventory.
+            Portfolio Innovation:
+            Floatz: Strong growth (>40% YoY), aiming ₹200 crore revenue in FY26.
+            Power: Expanded with Move+, EasySlide, and premium “Stamina+” lines.
+            Hush Puppies: Premium positioning via campaigns; expanding store footprint.
+            Customer First Program:
+            A major transformation project focusing on data-led decision making, agility, and consumer centricity.
+            Capex:
+            Largest-ever backend investment at Batanagar: new PUDIP machine (advanced manufacturing).
+            Strategy: automate and own high-tech manufacturing; outsource labor-intensive parts.
+
+            3. Management Guidance (**management_guidance**) [Total ~300 words]:
+            Store Expansion:
+            FY25 saw 100 new stores; FY26 will see higher addition.
+            Maintain 80:20 mix between franchise and company-owned stores.
+            Demand Outlook:
+            Cautiously optimistic despite muted environment.
+            Focus on volume-driven growth over pricing-led growth.
+            Pricing to be adjusted via cost optimization and product value.
+            Channel Mix (FY25):
+            COCO: ~70%, Franchise: 7.5%, E-commerce: 10%, Distribution (IND): ~12–13%.
+            Gross Margin Strategy:
+            Will stabilize over time with improved cost structures and value positioning.
+            Premiumization (via Power & Hush Puppies) and mass value segments to run in parallel.
+            Inventory & Working Capital:
+            Further optimization planned.
+            Aged inventory already at industry best-in-class (~2–3% of total).
+            Export Opportunity:
+            Post BIS norms, Bata India is 100% localized and aims to export to Bata Global in future.
+
+            4. Overall Summary (**overall_summary**) [Total ~150 words and precise]:
+            For example of Bata Company,
+            Bata India’s latest quarterly performance reflects resilience amid a subdued consumer demand environment. 
+            While revenue declined slightly by 1.2% YoY, volume growth and effective inventory management signal operational strength. 
+            Margin pressures due to strategic channel shifts and value pricing are being tackled through structural cost resets and 
+            backend efficiencies. The company’s sharp focus on innovation, store modernization through initiatives like ZBM, 
+            and aggressive expansion plans—especially in underpenetrated markets—underscore a growth-oriented outlook. With its 
+            ‘Customer First’ transformation and emerging export potential, Bata is positioning itself for long-term value creation through 
+            a balanced play of affordability, premiumization, and operational agility.
+
+            Now generate all three sections using exactly that tone and bullet‑like style (not numbered, no headings), separated by blank lines within each field. Do **not** include any additional keys, commentary, or header text.
+            Try to add all sub parameters that are mentioned with '\n' seperated under those 3 main categories.
+            Try to add <b></b> around the sub parameters like <b>Export Opportunity:</b>.
+            Try to add <b></b> around the important places like growth numbers or any value or important things like <b>₹200 crore</b>.
+            
+            ### Transcript Content:
+            {text}"""
+
+MAP_PROMPT = """
+            You are a financial analyst assistant reading one part of a company's quarterly earnings conference call (concall) transcript.
+            Extract every concrete fact in this part that belongs to one of the sections below. Keep figures, units, periods and
+            the speaker's tone exactly as stated. One short sentence per fact. Leave a section empty if this part has nothing for it.
+
+            **company_name**: the official company name, only if it is mentioned in this part.
+            **quarterly_earnings_summary**: revenue, EBITDA, PAT, margins, YoY/QoQ comparisons, contributors and detractors, anomalies.
+            **new_projects_and_capex_planning**: projects, capital expenditure, investments, capacity or geographic expansion, R&D, timelines.
+            **management_guidance**: guidance on revenue and margins, demand outlook, business environment, risks, segment commentary.
+
+            ### Transcript Part:
+            {text}"""
+
+REDUCE_PROMPT = """
+            You are a financial analyst assistant. Below are facts extracted from every part of a company's quarterly earnings
+            conference call (concall) transcript, grouped by section. Write the final report from these facts only.
+
+            Each of quarterly_earnings_summary, new_projects_and_capex_planning and management_guidance must be ~300 words,
+            overall_summary ~150 words, in an executive tone and bullet-like style (not numbered, no headings), with sub parameters
+            '\n' seperated. Add <b></b> around the sub parameters like <b>Export Opportunity:</b> and around important values
+            like <b>₹200 crore</b> or <b>40% YoY</b>. Do **not** include any additional keys, commentary, or header text.
+
+            ### Company Name:
+            {company_name}
+
+            ### Extracted Facts:
+            {facts}"""
+
+class RunStats:
+    def __init__(self, mode):
+        self.mode = mode
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, usage):
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += usage[0]
+            self.output_tokens += usage[1]
+
+    def as_dict(self):
+        return {
+            "mode": self.mode,
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "wall_seconds": round(self.wall_seconds, 2),
+        }
+
+def _create(backend, prompt, response_model, stats):
+    result, usage = backend.structured(prompt, response_model)
+    stats.record(usage)
+    return result
+
+def group_chunks(chunks, budget_tokens, count_tokens=estimate_tokens):
+    """
+    Greedily packs chunk texts, in order, into groups of at most budget_tokens each.
+    A single chunk larger than the budget becomes its own group.
+    """
+    groups, current, used = [], [], 0
+    for chunk in chunks:
+        text = getattr(chunk, "page_content", chunk)
+        tokens = count_tokens(text)
+        if current and used + tokens > budget_tokens:
+            groups.append("\n\n".join(current))
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+def merge_facts(parts, reduce_budget, count_tokens=estimate_tokens):
+    """
+    Merges the per-group facts, dropping exact duplicates, and trims each section
+    evenly from the end until the facts fit into reduce_budget tokens.
+    """
+    company_name = next((p.company_name for p in parts if p.company_name), "")
+    merged = {}
+    for section in SECTIONS:
+        seen, facts = set(), []
+        for part in parts:
+            for fact in getattr(part, section):
+                key = " ".join(fact.lower().split())
+                if key and key not in seen:
+                    seen.add(key)
+                    facts.append(fact.strip())
+        merged[section] = facts
+
+    def render():
+        return "\n\n".join(
+            f"{section}:\n" + "\n".join(f"- {fact}" for fact in merged[section]) for section in SECTIONS
+        )
+
+    text = render()
+    while count_tokens(text) > reduce_budget and any(len(merged[s]) > 1 for s in SECTIONS):
+        longest = max(SECTIONS, key=lambda s: len(merged[s]))
+        merged[longest].pop()
+        text = render()
+    return company_name, text
+
+def summarize_single_shot(backend, chunks):
+    """
+    The original mode: the whole transcript in one prompt.
+    """
+    stats = RunStats("single_shot")
+    start = time.perf_counter()
+    text = "\n\n".join(getattr(chunk, "page_content", chunk) for chunk in chunks)
+    report = _create(backend, SINGLE_SHOT_PROMPT.format(text=text), ExtractedReport, stats)
+    stats.wall_seconds = time.perf_counter() - start
+    return report, stats
+
+def summarize_map_reduce(backend, chunks, map_budget=6000, reduce_budget=12000, workers=4,
+                         count_tokens=estimate_tokens):
+    """
+    Extracts SectionFacts from groups of at most map_budget tokens in parallel, then writes
+    the ExtractedReport from the merged facts (trimmed to reduce_budget tokens) in one call.
+    """
+    stats = RunStats("map_reduce")
+    start = time.perf_counter()
+    groups = group_chunks(chunks, map_budget, count_tokens)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(
+            lambda group: _create(backend, MAP_PROMPT.format(text=group), SectionFacts, stats),
+            groups
+        ))
+
+    company_name, facts = merge_facts(parts, reduce_budget, count_tokens)
+    report = _create(
+        backend,
+        REDUCE_PROMPT.format(company_name=company_name or "Unknown", facts=facts),
+        ExtractedReport,
+        stats
+    )
+    if company_name and report.company_name == ExtractedReport.model_fields["company_name"].default:
+        report.company_name = company_name
+    stats.wall_seconds = time.perf_counter() - start
+    return report, stats
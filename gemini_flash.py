@@ -1,36 +1,18 @@
-import instructor
 from dotenv import load_dotenv
-import google.generativeai as genai
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from common.pdf_text import load_pages
+from common.chunking import split_pages
 import json
-from pydantic import BaseModel,Field,field_validator
+from common.llm import get_backend
+from common.summarizer import ExtractedReport
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-
-gemini_client = genai.GenerativeModel(
-        model_name='models/gemini-2.5-flash'
-    )
-
-class ExtractedReport(BaseModel):
-    company_name:str = "No available content found"
-    quarterly_earnings_summary: str = Field(..., description="~300-word summary of Q4 FY25 earnings")
-    new_projects_and_capex_planning: str = Field(..., description="~300-word detailed summary of new projects & capex planning")
-    management_guidance: str = Field(..., description="~300-word detailed summary of management guidance and strategic outlook")
-    overall_summary: str = Field(...,description="~150-word detailed summary of overall conclusion")
-
-client = instructor.from_gemini(
-    gemini_client,
-    mode=instructor.Mode.GEMINI_JSON
-)
+client = get_backend('models/gemini-2.5-flash')
 
 def load_concall_pdf(pdf_path: str):
     try:
-        loader = PyPDFLoader(pdf_path)
-        return loader.load()
+        return load_pages(pdf_path)
     except Exception as e:
         print("Error loading PDF:", e)
 
@@ -38,16 +20,15 @@ def load_concall_pdf(pdf_path: str):
 def split_pdf_into_chunks(pdf_path: str):
     try:
         documents = load_concall_pdf(pdf_path)
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        return splitter.split_documents(documents)
+        return split_pages(documents, doc_type="concall")
     except Exception as e:
         print("Error splitting PDF:", e)
 
-def prompt():
+def prompt(pdf_path='tips_re.pdf'):
     try:
-        chunks = split_pdf_into_chunks('tips_re.pdf')
+        chunks = split_pdf_into_chunks(pdf_path)
         text = "\n\n".join(chunk.page_content for chunk in chunks)
-        print("Input token usage --> ",gemini_client.count_tokens(contents=text).total_tokens)
+        print("Input token usage --> ",client.count_tokens(text))
         return f"""
             You are a financial analyst assistant. Analyze the entire text of the company’s 
             quarterly earnings conference call (concall) transcript provided below. 
@@ -147,19 +128,15 @@ def prompt():
         print("Error : ",e)
         return ""
 
-response = client.messages.create(
-    messages=[
-        {
-            "role":"user",
-            "content": prompt()
-        }
-    ],
-    response_model=ExtractedReport
-)
-
-# raw_text = response.choices[0].message.content
-print(dir(response))
-print("Output Token : ",gemini_client.count_tokens(contents="\n".join(response.model_dump().values())).total_tokens)
-
-with open('flash_res3.json','w') as jsn:
-    jsn.write(json.dumps(response.model_dump(),indent=2))
+def run(pdf_path='tips_re.pdf', out_path='flash_res3.json'):
+    response, usage = client.structured(prompt(pdf_path), ExtractedReport)
+
+    # raw_text = response.choices[0].message.content
+    print(dir(response))
+    print("Output Token : ",usage[1])
+
+    with open(out_path,'w') as jsn:
+        jsn.write(json.dumps(response.model_dump(),indent=2))
+
+if __name__ == "__main__":
+    run()
@@ -1,15 +1,14 @@
-from openai import OpenAI
-import instructor
 from dotenv import load_dotenv
-from pydantic import BaseModel,Field
+from common.llm import get_backend
+from common.summarizer import ExtractedReport
 import os
 import json
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from common.pdf_text import load_pages
+from common.chunking import split_pages
 
 load_dotenv()
 
-client = instructor.from_openai(OpenAI(api_key=os.getenv('OPENAI_API_KEy')))
+client = get_backend('gpt-4.1-mini')
 
 gpt_mini = """
 You are a financial analysis assistant. Analyze the full earnings conference call (concall) transcript provided below and extract summaries in the **exact format** described. Be structured, consistent, and follow the output format without adding anything extra.
@@ -34,17 +33,9 @@ Transcript:
 """
 
 
-class ExtractedReport(BaseModel):
-    company_name:str = "No available content found"
-    quarterly_earnings_summary: str = Field(..., description="~300-word summary of Q4 FY25 earnings")
-    new_projects_and_capex_planning: str = Field(..., description="~300-word detailed summary of new projects & capex planning")
-    management_guidance: str = Field(..., description="~300-word detailed summary of management guidance and strategic outlook")
-    overall_summary: str = Field(...,description="~150-word detailed summary of overall conclusion")
-
 def load_concall_pdf(pdf_path: str):
     try:
-        loader = PyPDFLoader(pdf_path)
-        return loader.load()
+        return load_pages(pdf_path)
     except Exception as e:
         print("Error loading PDF:", e)
 
@@ -52,14 +43,13 @@ def load_concall_pdf(pdf_path: str):
 def split_pdf_into_chunks(pdf_path: str):
     try:
         documents = load_concall_pdf(pdf_path)
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        return splitter.split_documents(documents)
+        return split_pages(documents, doc_type="concall")
     except Exception as e:
         print("Error splitting PDF:", e)
 
-def prompt():
+def prompt(pdf_path='blue star.pdf'):
     try:
-        chunks = split_pdf_into_chunks('blue star.pdf')
+        chunks = split_pdf_into_chunks(pdf_path)
         text = "\n\n".join(chunk.page_content for chunk in chunks)
         # print("Input token usage --> ",client.count_tokens(contents=text).total_tokens)
         return f"""
@@ -86,18 +76,13 @@ Transcript:
         print("Error : ",e)
         return ""
 
-response = client.chat.completions.create(
-    model = 'gpt-4.1-mini',
-    messages=[
-        {
-            "role":"user",
-            "content": prompt()
-        }
-    ],
-    response_model=ExtractedReport
-)
-
-# print("Output Token : ",gemini_client.count_tokens(contents="\n".join(response.model_dump().values())).total_tokens)
-
-with open('openai_4.1_mini_res1.json','w') as jsn:
-    jsn.write(json.dumps(response.model_dump(),indent=2))
+def run(pdf_path='blue star.pdf', out_path='openai_4.1_mini_res1.json'):
+    response, usage = client.structured(prompt(pdf_path), ExtractedReport)
+
+    print("Output Token : ",usage[1])
+
+    with open(out_path,'w') as jsn:
+        jsn.write(json.dumps(response.model_dump(),indent=2))
+
+if __name__ == "__main__":
+    run()
@@ -1,25 +1,28 @@
-from langchain_community.vectorstores import Chroma
-from dotenv import load_dotenv
 import os
-import google.generativeai as genai
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-load_dotenv()
+from dotenv import load_dotenv
+from common.llm import get_backend
+from common.rerank import get_reranker
+from store import get_store, build_filter, VECTOR_BACKEND
 
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+load_dotenv()
 
-embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+gemini_client = get_backend('models/gemini-2.5-flash')
+reranker = get_reranker()
 
-gemini_client = genai.GenerativeModel(
-        model_name='models/gemini-2.5-flash'
-    )
+# Candidates pulled from the index, and how many of them the reranker passes to the prompt.
+RERANK_CANDIDATES = int(os.getenv("QA_RERANK_CANDIDATES", "20"))
+RERANK_TOP_N = int(os.getenv("QA_RERANK_TOP_N", "5"))
 
-def ask(company_name:str,qrt:str,question:str,pdf_type:str="concall"):
+def ask(company_name:str,qrt:str|list[str],question:str,pdf_type:str="concall"):
+    """
+    qrt can be a single quarter ("Q4FY25") or a list of quarters to search across.
+    """
     try:
-        vectorstore = Chroma(
-            persist_directory=f"./chroma_store/{company_name}_{pdf_type}_{qrt.replace(' ', '_')}",
-            embedding_function=embedding_model
-        )
+        vectorstore = get_store(backend=VECTOR_BACKEND)
 
         prompt_template = """
             You are a highly skilled financial analyst with deep expertise in equity research, earnings call analysis, and financial statement interpretation.
@@ -41,15 +44,16 @@ def ask(company_name:str,qrt:str,question:str,pdf_type:str="concall"):
             ### Answer (as a financial expert):
             """
         
-        retriever = vectorstore.as_retriever(search_type="similarity", k=3)
-        docs = retriever.get_relevant_documents(question)
+        start = time.perf_counter()
+        docs = vectorstore.similarity_search(question, k=RERANK_CANDIDATES, filter=build_filter(company_name, qrt, pdf_type))
+        retrieved = time.perf_counter()
+        docs = reranker.rerank(question, docs, RERANK_TOP_N)
+        print(f"retrieve {(retrieved - start) * 1000:.1f}ms ({RERANK_CANDIDATES}), rerank {(time.perf_counter() - retrieved) * 1000:.1f}ms ({RERANK_TOP_N})")
         context = "\n".join([doc.page_content for doc in docs])
 
         prompt = prompt_template.format(user_question=question, context=context)
 
-        response = gemini_client.generate_content(prompt)
-
-        return response.text
+        return gemini_client.generate(prompt)
     except Exception as e:
         print(e)
 
@@ -0,0 +1,73 @@
+import os
+import re
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import chromadb
+from store import STORE_DIR, COLLECTION_NAME
+
+def parse_store_name(name, metadata):
+    """
+    Recovers (company, pdf_type, quarter) from a '{company}_{type}_{quarter}' directory,
+    preferring the company/quarter that train.py stored in the chunk metadata.
+    """
+    company = metadata.get("company")
+    quarter = metadata.get("quarter")
+    if company and quarter:
+        prefix, suffix = f"{company}_", f"_{quarter.replace(' ', '_')}"
+        if name.startswith(prefix) and name.endswith(suffix):
+            return company, name[len(prefix):-len(suffix)], quarter
+
+    match = re.match(r"^([^_]+)_(.+)_([^_]+)$", name)
+    if not match:
+        raise ValueError(f"Cannot parse store name {name!r}")
+    return match.group(1), match.group(2), match.group(3)
+
+def migrate(source_root="./chroma_store", batch_size=500):
+    """
+    Copies every per-quarter store under source_root into the combined collection,
+    reusing the stored embeddings (no embedding calls). Ids are prefixed with the
+    source directory name, so running it again only overwrites the same records.
+    """
+    target = chromadb.PersistentClient(path=STORE_DIR).get_or_create_collection(COLLECTION_NAME)
+    target_dir = os.path.abspath(STORE_DIR)
+
+    for name in sorted(os.listdir(source_root)):
+        path = os.path.join(source_root, name)
+        if os.path.abspath(path) == target_dir or not os.path.isfile(os.path.join(path, "chroma.sqlite3")):
+            continue
+
+        client = chromadb.PersistentClient(path=path)
+        copied = 0
+        for collection in client.list_collections():
+            collection = client.get_collection(getattr(collection, "name", collection))
+            total = collection.count()
+            for offset in range(0, total, batch_size):
+                batch = collection.get(
+                    include=["embeddings", "documents", "metadatas"],
+                    limit=batch_size,
+                    offset=offset
+                )
+                metadatas = []
+                for metadata in batch["metadatas"]:
+                    metadata = dict(metadata or {})
+                    company, pdf_type, quarter = parse_store_name(name, metadata)
+                    metadata.update({"company": company, "quarter": quarter, "type": pdf_type})
+                    metadatas.append(metadata)
+
+                target.upsert(
+                    ids=[f"{name}:{i}" for i in batch["ids"]],
+                    embeddings=batch["embeddings"],
+                    documents=batch["documents"],
+                    metadatas=metadatas
+                )
+                copied += len(batch["ids"])
+
+        print(f"✅ {name}: {copied} chunks copied into {STORE_DIR}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge per-quarter chroma_store/* directories into one collection")
+    parser.add_argument("--source", default="./chroma_store")
+    args = parser.parse_args()
+    migrate(args.source)
@@ -0,0 +1,68 @@
+import os
+import threading
+
+STORE_DIR = "./chroma_store/qa_index"
+COLLECTION_NAME = "concalls"
+# "faiss" answers ask() from a read-only FAISS build of the collection (FAISS_STORE_DIR),
+# rebuilt by train(); "chroma" queries the collection directly.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+FAISS_STORE_DIR = "./chroma_store/qa_index_faiss"
+# Metadata train() stores on every chunk; each combination gets its own FAISS sub-index.
+PARTITION_FIELDS = ("company", "type", "quarter")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(persist_directory=STORE_DIR, collection_name=COLLECTION_NAME, scheduled=False, backend="chroma"):
+    """
+    Returns the process-wide Chroma handle for the combined qa index, opening it on first use.
+    Every company/quarter/type lives in this one collection and is told apart by metadata.
+    backend="faiss" returns the read-only FAISS build of it instead (for queries only).
+    """
+    from common.embeddings import get_embedding_model
+
+    key = (persist_directory, collection_name, scheduled, backend)
+    with _stores_lock:
+        if key not in _stores:
+            if backend == "faiss":
+                from common.faiss_store import FaissStore
+
+                _stores[key] = FaissStore(FAISS_STORE_DIR, get_embedding_model(scheduled=False))
+            else:
+                from langchain_community.vectorstores import Chroma
+
+                _stores[key] = Chroma(
+                    collection_name=collection_name,
+                    persist_directory=persist_directory,
+                    embedding_function=get_embedding_model(scheduled=scheduled)
+                )
+        return _stores[key]
+
+def build_faiss_store(index=None, compression=None):
+    """Rebuilds FAISS_STORE_DIR from the vectors in the Chroma collection (no re-embedding)."""
+    from common.faiss_store import build_from_chroma, FAISS_INDEX, FAISS_COMPRESSION
+
+    vectorstore = get_store()
+    return build_from_chroma(
+        vectorstore, FAISS_STORE_DIR, vectorstore.embeddings.model_name,
+        index=index or FAISS_INDEX, compression=compression or FAISS_COMPRESSION, partition_fields=PARTITION_FIELDS
+    )
+
+def build_filter(company_name=None, quarters=None, pdf_type=None):
+    """
+    Chroma `where` clause for any mix of company, one or more quarters and document type.
+    """
+    if isinstance(quarters, str):
+        quarters = [quarters]
+
+    clauses = []
+    if company_name:
+        clauses.append({"company": {"$eq": company_name}})
+    if quarters:
+        clauses.append({"quarter": {"$in": list(quarters)}})
+    if pdf_type:
+        clauses.append({"type": {"$eq": pdf_type}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -1,41 +1,32 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-import google.generativeai as genai
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from dotenv import load_dotenv
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import Chroma
-
-load_dotenv()
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-
-embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+from common.chunking import split_pages
+from dotenv import load_dotenv
+from common.pdf_text import load_pages
+from store import get_store, build_filter, build_faiss_store, STORE_DIR, VECTOR_BACKEND, FAISS_STORE_DIR
 
-gemini_client = genai.GenerativeModel(
-        model_name='models/gemini-2.5-flash'
-    )
+load_dotenv()
 
 def load_concall_pdf(pdf_path: str):
     try:
-        loader = PyPDFLoader(pdf_path)
-        return loader.load()
+        return load_pages(pdf_path)
     except Exception as e:
         print("Error loading PDF:", e)
 
 
-def split_pdf_into_chunks(pdf_path: str):
+def split_pdf_into_chunks(pdf_path: str, pdf_type: str = "concall"):
     try:
         documents = load_concall_pdf(pdf_path)
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        return splitter.split_documents(documents)
+        return split_pages(documents, doc_type=pdf_type)
     except Exception as e:
         print("Error splitting PDF:", e)
 
 def train(company_name:str,qrt:str,pdf_path:str,pdf_type:str="concall"):
     try:
         print(f"Training on: {company_name} - {qrt}")
-        chunks = split_pdf_into_chunks(pdf_path)
+        chunks = split_pdf_into_chunks(pdf_path, pdf_type)
 
         if not chunks:
             print("No chunks to process.")
@@ -44,15 +35,17 @@ def train(company_name:str,qrt:str,pdf_path:str,pdf_type:str="concall"):
         for doc in chunks:
             doc.metadata["company"] = company_name
             doc.metadata["quarter"] = qrt
-        
-        persist_dir = f"./chroma_store/{company_name}_{pdf_type}_{qrt.replace(' ', '_')}"
-        vectorstore = Chroma.from_documents(
-            documents=chunks,
-            embedding=embedding_model,
-            persist_directory=persist_dir
-        )
-        vectorstore.persist()
-        print(f"Training complete. Data stored at: {persist_dir}")
+            doc.metadata["type"] = pdf_type
+
+        vectorstore = get_store(scheduled=True)
+        # Re-training a company/quarter/type replaces its previous chunks.
+        vectorstore.delete(where=build_filter(company_name, qrt, pdf_type))
+        vectorstore.add_documents(chunks)
+        print(vectorstore.embeddings.stats())
+        print(f"Training complete. Data stored at: {STORE_DIR}")
+        if VECTOR_BACKEND == "faiss":
+            manifest = build_faiss_store()
+            print(f"FAISS index rebuilt with {manifest['count']} chunks at: {FAISS_STORE_DIR}")
     except Exception as e:
         print(e)
 
@@ -1,20 +1,282 @@
-from utils.helpers import load_new_pdfs
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
 import os
-import google.generativeai as genai
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.helpers import (
+    load_manifest, save_manifest, plan_ingest, iter_pdf_chunks, source_filter, fiscal_year_metadata, chunk_ids
+)
+from utils.answer_cache import bump_stock_versions
+from utils.sparse_index import SPARSE_INDEX_FILE
+from utils.metrics_table import MetricsTable, METRICS_TABLE_FILE
+from utils.shards import (
+    SHARDS_DIR, VECTOR_BACKEND, ShardPool, shard_dir, list_shards, migrate_legacy_db, read_shard_info, write_shard_info
+)
+from common.faiss_store import FAISS_DIR, current_build
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Guards the manifest, metrics table and stock versions shared by the per-stock workers.
+_shared_lock = threading.Lock()
+# Written into a shard once every chunk in it carries its fiscal year ("fy"); shards ingested
+# before that are backfilled once from their file names.
+FISCAL_YEAR_MARKER = ".fy"
+
+def get_shard_pool():
+    # Imported lazily so that a no-op ingest does not pay for langchain/genai start-up.
+    from common.embeddings import get_embedding_model
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return ShardPool(get_embedding_model(), create=True)
+
+def rebuild_sparse_index(shard, batch_size=1000):
+    """
+    Rebuilds a shard's BM25 index from every chunk already in its Chroma collection (no re-embedding).
+    """
+    from langchain_core.documents import Document
+
+    offset = 0
+    while True:
+        batch = shard.vectorstore.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        shard.sparse.add(batch["ids"], [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(batch["documents"], batch["metadatas"])
+        ])
+        offset += len(batch["ids"])
+    shard.sparse.save()
+    print(f"✅ {shard.stock}: BM25 index rebuilt with {len(shard.sparse)} chunks.")
+
+def backfill_fiscal_year(shard, batch_size=1000):
+    """
+    Adds the "fy" field to chunks ingested before it existed, from their source file names.
+    Only the Chroma metadata changes (no re-embedding); returns how many chunks were updated.
+    """
+    collection = shard.vectorstore._collection
+    updated = 0
+    offset = 0
+    while True:
+        batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        ids, metadatas = [], []
+        for doc_id, metadata in zip(batch["ids"], batch["metadatas"]):
+            fy = fiscal_year_metadata((metadata or {}).get("source", ""))
+            if fy and (metadata or {}).get("fy") != fy["fy"]:
+                ids.append(doc_id)
+                metadatas.append({**(metadata or {}), **fy})
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+        offset += len(batch["ids"])
+    print(f"✅ {shard.stock}: fiscal year added to {updated} chunks.")
+    return updated
+
+def rebuild_faiss_index(shard):
+    """
+    Rebuilds a shard's read-only FAISS index (VECTOR_BACKEND=faiss) from the vectors already in
+    its Chroma collection (no re-embedding). Servers switch to the new build on their next refresh.
+    """
+    from common.faiss_store import build_from_chroma
+
+    start = time.perf_counter()
+    model = read_shard_info(shard.path).get("embedding_model") or shard.vectorstore.embeddings.model_name
+    manifest = build_from_chroma(shard.vectorstore, os.path.join(shard.path, FAISS_DIR), model)
+    print(f"✅ {shard.stock}: FAISS index rebuilt with {manifest['count']} chunks in {len(manifest['partitions'])} "
+          f"partitions ({manifest['index']}/{manifest['compression']}, {time.perf_counter() - start:.2f}s).")
+
+def rebuild_metrics_table(manifest):
+    """
+    Re-extracts metrics from every file already in the manifest (pages come from the PDF
+    text cache, nothing is embedded).
+    """
+    from common.pdf_text import load_pages
+    from utils.metric_extractor import extract_metrics
+
+    table = MetricsTable()
+    for record in manifest["files"].values():
+        if os.path.exists(record["path"]):
+            table.add(extract_metrics(load_pages(record["path"]), record))
+    table.save()
+    print(f"✅ Metrics table rebuilt with {len(table)} rows.")
+    return table
+
+def check_embedding_model(shard, model):
+    """
+    Records the embedding model of a new shard and refuses to add vectors from another model
+    to one that has it recorded. Shards from before the record stay unrecorded (unknown).
+    """
+    recorded = read_shard_info(shard.path).get("embedding_model")
+    if recorded is None and not shard.vectorstore._collection.count():
+        write_shard_info(shard.path, embedding_model=model)
+    elif recorded is not None and recorded != model:
+        raise ValueError(f"{shard.stock}: shard holds vectors from {recorded!r}, ingest embeds with {model!r}; "
+                         f"delete {shard.path} and re-ingest it")
+
+def ingest_stock(pool, stock, to_embed, to_remove, manifest, metrics_table, workers=1, page_workers=None,
+                 rebuild_sparse=False, rebuild_faiss=False, backfill_fy=False):
+    """
+    Applies one stock's changes to its own shard. Runs on a worker thread next to other
+    stocks; only the shared manifest/metrics updates are serialized.
+    """
+    with pool.use(stock) as shard:
+        if to_embed:
+            check_embedding_model(shard, pool.embedding_function.model_name)
+        if backfill_fy and backfill_fiscal_year(shard):
+            # The BM25 index and the FAISS build (partitioned on fy) are rebuilt from Chroma.
+            rebuild_sparse = True
+            rebuild_faiss = rebuild_faiss or VECTOR_BACKEND == "faiss" or current_build(os.path.join(shard.path, FAISS_DIR))
+        if rebuild_sparse:
+            rebuild_sparse_index(shard)
+        else:
+            shard.sparse.load()
+
+        # The BM25 index, metrics table and manifest are written once per stock, after the last
+        # file (or the first failure), instead of after every file. Until then a file is not in
+        # the manifest, and an interrupted run embeds it again over the same chunk ids.
+        dropped, removed_keys, embedded, metric_rows = [], [], {}, []
+        total_chunks = 0
+        try:
+            for record in to_remove:
+                shard.vectorstore.delete(where=source_filter(record))
+                shard.sparse.delete(source_filter(record))
+                dropped.append(record)
+                removed_keys.append(record["key"])
+                print(f"🗑️ Removed vectors for {record['stock']}/{record['type']}/{record['source']}")
+
+            for record, chunks, metrics in iter_pdf_chunks(to_embed, workers=workers, page_workers=page_workers):
+                start = time.perf_counter()
+                key = record.pop("key")
+                if record.pop("replaces"):
+                    shard.vectorstore.delete(where=source_filter(record))
+                    shard.sparse.delete(source_filter(record))
+                    dropped.append(record)
+                if chunks:
+                    shard.sparse.add(shard.vectorstore.add_documents(chunks, ids=chunk_ids(record, len(chunks))), chunks)
+                metric_rows += metrics
+                embedded[key] = record
+
+                total_chunks += len(chunks)
+                print(f"For {record['stock']} Report Type {record['type']} and file {record['source']} is embeded! ({time.perf_counter() - start:.2f}s)")
+        finally:
+            if dropped or embedded:
+                shard.sparse.save()
+                with _shared_lock:
+                    for record in dropped:
+                        metrics_table.delete(source_filter(record))
+                    metrics_table.add(metric_rows)
+                    metrics_table.save()
+                    for key in removed_keys:
+                        manifest["files"].pop(key, None)
+                    manifest["files"].update(embedded)
+                    save_manifest(manifest)
+                    bump_stock_versions([stock])
+
+        if rebuild_faiss or (VECTOR_BACKEND == "faiss" and (to_embed or to_remove)):
+            rebuild_faiss_index(shard)
+            with _shared_lock:
+                # Answers cached while the old FAISS build was still being served are dropped too.
+                bump_stock_versions([stock])
+        # Every chunk now carries "fy": backfilled above or written by split_pdf.
+        open(os.path.join(shard.path, FISCAL_YEAR_MARKER), "w").close()
+        return total_chunks
+
+def ingest(workers=1, stock_workers=4, rebuild_sparse=False, rebuild_metrics=False, rebuild_faiss=False):
+    """
+    Brings the per-stock shards under SHARDS_DIR (Chroma + BM25) and the metrics table in line
+    with ./reports: embeds new and changed PDFs and drops the chunks and metrics of removed or
+    replaced ones. Stocks are ingested in parallel, each into its own shard.
+    Unchanged files are skipped without being opened.
+    """
+    # A no-op once SHARDS_DIR exists, unless an earlier split of ./chroma_db failed partway.
+    migrated = migrate_legacy_db()
+    if migrated:
+        print(f"✅ Split ./chroma_db into per-stock shards: {migrated}")
+
+    manifest = load_manifest()
+    to_embed, to_remove = plan_ingest(manifest)
+    # Files ingested before the metrics table existed (or before its current version) are backfilled once.
+    rebuild_metrics = rebuild_metrics or (bool(manifest["files"]) and not MetricsTable().is_current())
+    metrics_table = rebuild_metrics_table(manifest) if rebuild_metrics else MetricsTable().load()
+
+    # Shards whose chunks predate their BM25 index are backfilled from Chroma.
+    sparse_missing = {
+        stock for stock in list_shards()
+        if rebuild_sparse or not os.path.exists(os.path.join(shard_dir(stock), SPARSE_INDEX_FILE))
+    }
+
+    # With VECTOR_BACKEND=faiss, shards that have no FAISS build yet get one from Chroma.
+    faiss_missing = {
+        stock for stock in list_shards()
+        if rebuild_faiss or (VECTOR_BACKEND == "faiss" and not current_build(os.path.join(shard_dir(stock), FAISS_DIR)))
+    }
+
+    # Shards ingested before chunks carried their fiscal year get it added once.
+    fy_missing = {stock for stock in list_shards() if not os.path.exists(os.path.join(shard_dir(stock), FISCAL_YEAR_MARKER))}
+
+    stocks = {}
+    for record in to_embed:
+        stocks.setdefault(record["stock"], ([], []))[0].append(record)
+    for record in to_remove:
+        stocks.setdefault(record["stock"], ([], []))[1].append(record)
+    for stock in sparse_missing | faiss_missing | fy_missing:
+        stocks.setdefault(stock, ([], []))
+
+    if not stocks:
+        save_manifest(manifest)
+        print("✅ No new files to embed.")
+        return
+
+    # Every stock worker parses with its own process pool (one per file, or one per file's pages
+    # when workers == 1): split the CPUs between them rather than starting stock_workers x
+    # cpu_count processes.
+    stock_workers = max(1, min(stock_workers, len(stocks)))
+    cpu_share = max(1, (os.cpu_count() or 1) // stock_workers)
+    if workers != 1:
+        workers = min(workers or cpu_share, cpu_share)
+    print(f"⚙️ {stock_workers} stocks in parallel, {workers if workers != 1 else cpu_share} parsing processes each")
+
+    pool = get_shard_pool()
+    started = time.perf_counter()
+    total_chunks = 0
+    with ThreadPoolExecutor(max_workers=stock_workers) as executor:
+        futures = {
+            executor.submit(
+                ingest_stock, pool, stock, embed, remove, manifest, metrics_table,
+                workers=workers, page_workers=cpu_share, rebuild_sparse=stock in sparse_missing,
+                rebuild_faiss=stock in faiss_missing, backfill_fy=stock in fy_missing
+            ): stock
+            for stock, (embed, remove) in stocks.items()
+        }
+        for future in as_completed(futures):
+            try:
+                total_chunks += future.result()
+            except Exception as e:
+                print(f"❌ {futures[future]}: {e}")
+
+    print(pool.embedding_function.stats())
+    print(f"✅ Added {total_chunks} new chunks from {len(to_embed)} new or changed PDFs, removed {len(to_remove)} PDFs "
+          f"across {len(stocks)} stocks in {time.perf_counter() - started:.2f}s.")
 
-embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-docs = load_new_pdfs()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Embed new PDFs under ./reports into per-stock shards in {SHARDS_DIR}")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("INGEST_WORKERS", "1")),
+                        help="Number of PDF parsing processes. 1 keeps the old serial mode, 0 uses every CPU.")
+    parser.add_argument("--stocks", type=int, default=int(os.getenv("INGEST_STOCK_WORKERS", "4")),
+                        help="Stocks ingested in parallel, each into its own shard")
+    parser.add_argument("--rebuild-sparse", action="store_true",
+                        help=f"Rebuild every shard's {SPARSE_INDEX_FILE} from the chunks already in it")
+    parser.add_argument("--rebuild-metrics", action="store_true",
+                        help=f"Re-extract {METRICS_TABLE_FILE} from every ingested PDF")
+    parser.add_argument("--rebuild-faiss", action="store_true",
+                        help=f"Rebuild every shard's {FAISS_DIR}/ index from its Chroma vectors (FAISS_INDEX, FAISS_COMPRESSION)")
+    args = parser.parse_args()
 
-if not docs:
-    print("✅ No new files to embed.")
-else:
-    vectorstore = Chroma(persist_directory="./chroma_db", embedding_function=embedding_model)
-    vectorstore.add_documents(docs)
-    print(f"✅ Added {len(docs)} new chunks from new PDFs.")
+    ingest(workers=args.workers or None, stock_workers=args.stocks, rebuild_sparse=args.rebuild_sparse,
+           rebuild_metrics=args.rebuild_metrics, rebuild_faiss=args.rebuild_faiss)
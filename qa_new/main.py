@@ -1,10 +1,26 @@
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from utils.intent_classifier import get_doc_types
-import google.generativeai as genai
 import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.llm import get_backend, all_metrics, estimate_tokens
+from common.rerank import get_reranker
+from utils.intent_classifier import get_doc_types, get_doc_types_async, classifier_model
+from utils.answer_cache import AnswerCache
+from utils.sparse_index import reciprocal_rank_fusion, tokenize
+from utils.shards import ShardPool
+from utils.context_packer import pack_context
+from utils.timing import StageTimer
+from utils.telemetry import registry, record_request
+from utils.metrics_table import MetricsTable
+from utils.metric_extractor import parse_metric_query, has_scale, METRIC_LABELS
+from utils.query_planner import plan_periods, period_filter, merge_by_period
+from utils import async_runtime
 from dotenv import load_dotenv
 import re
+import json
+import time
+import asyncio
+import threading
 from calendar import month_abbr
 import markdown
 from datetime import datetime
@@ -38,45 +54,140 @@ def parse_filename(file_name):
     
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+DEFAULT_STOCK = os.getenv("DEFAULT_STOCK", "TCS")
+# Comma-separated stocks whose shards warm_up() opens ahead of the first request.
+WARM_UP_STOCKS = [s.strip().upper() for s in os.getenv("WARM_UP_STOCKS", DEFAULT_STOCK).split(",") if s.strip()]
 
-vectorstore = Chroma(persist_directory="./chroma_db", embedding_function=GoogleGenerativeAIEmbeddings(model="models/embedding-001"))
+# The embedding client and the shard pool are created on first use (or by warm_up()), so
+# importing this module opens no Chroma handles and loads no embedding SDK.
+_embedding_model = None
+_shards = None
+_services_lock = threading.RLock()
 
-def ask_question(stock, query):
+def get_embeddings():
+    global _embedding_model
+    with _services_lock:
+        if _embedding_model is None:
+            from common.embeddings import get_embedding_model
 
-    doc_types = get_doc_types(query)
-    print("Suggested Doc Types : ",doc_types)
+            _embedding_model = get_embedding_model(scheduled=False)
+        return _embedding_model
+
+def get_shards():
+    """One Chroma collection + BM25 index per stock, opened on first use and kept in a bounded LRU."""
+    global _shards
+    with _services_lock:
+        if _shards is None:
+            _shards = ShardPool(get_embeddings())
+        return _shards
+
+# Metric/period/value rows extracted at ingest, for questions that only need a number.
+metrics_table = MetricsTable()
+
+# Near-duplicate lookups (cosine >= this) are off unless set; even then a near match must name
+# the same periods and numbers as the question.
+answer_similarity = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    embed=(lambda text: get_embeddings().embed_query(text)) if answer_similarity else None,
+    similarity=answer_similarity
+)
+
+answer_model = get_backend("models/gemini-2.5-flash")
+
+TOP_K = 20
+# Stock-only candidates fetched while the intent classifier is still running.
+SPECULATIVE_K = 60
+MIN_SPECULATIVE_DOCS = 10
+# "hybrid" fuses dense and BM25 results; "dense" is the old embedding-only retrieval.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RRF_K = 60
+# Wide, cheap first pass; only the reranked top N are packed into the prompt.
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "12"))
+# Questions about several periods get one filtered retrieval per period, each this many
+# candidates at least, instead of one wide retrieval.
+MIN_PERIOD_K = 10
+# Metric lookups are answered straight from the metrics table only when every row is at least
+# this confident; the rest go through retrieval and the LLM.
+MIN_METRIC_CONFIDENCE = float(os.getenv("MIN_METRIC_CONFIDENCE", "0.8"))
+
+reranker = get_reranker(tokenize=tokenize)
+
+def retrieve_dense(shard, query, filters, k=TOP_K):
+    # Same call for the Chroma and FAISS (VECTOR_BACKEND) vector stores.
+    return shard.vectorstore.similarity_search(query, k=k, filter=filters)
+
+def retrieve_sparse(shard, query, filters, k=TOP_K):
+    return [doc for _, _, doc in shard.sparse.search(query, k=k, where=filters)]
+
+def retrieve(stock, query, filters, k=TOP_K, mode=None):
+    """
+    Dense retrieval fused with BM25 through reciprocal-rank fusion, so exact figures,
+    tickers and FY/quarter references are found even when the embedding blurs them.
+    Only the stock's own shard is searched.
+    """
+    with get_shards().use(stock) as shard:
+        docs = retrieve_dense(shard, query, filters, k)
+        if (mode or RETRIEVAL_MODE) == "dense":
+            return docs
+        return reciprocal_rank_fusion([docs, retrieve_sparse(shard, query, filters, k)], k=RRF_K, limit=k)
+
+def plan_query(stock, query):
+    """Periods the question asks about, limited to the fiscal years the stock's shard has chunks for."""
+    with get_shards().use(stock) as shard:
+        return plan_periods(query, shard.sparse.field_values("fy"))
 
-    filters = {
+def period_k(total, periods):
+    return max(MIN_PERIOD_K, -(-total // len(periods)))
+
+async def retrieve_periods_async(stock, query, filters, periods, k):
+    """
+    One retrieval per planned period, run concurrently, each with the period's fiscal year pushed
+    into the filter. Returns one ranking per period, in plan order.
+    """
+    return list(await asyncio.gather(*[
+        asyncio.to_thread(retrieve, stock, query, period_filter(filters, period["fy"]), k) for period in periods
+    ]))
+
+def doc_type_filters(stock, doc_types):
+    return {
         "$and": [
             {"stock": {"$eq": stock}},
             {"type": {"$in": doc_types}}
         ]
     }
 
-    retriever = vectorstore.as_retriever(search_kwargs={
-        "k": 20,
-        "filter": filters
-    })
-    
-    docs = retriever.invoke(query)
+def assemble_context(query, docs, timer, periods=None):
+    """
+    Reranks the candidates down to RERANK_TOP_N, then merges, de-duplicates and budgets
+    them before they go into the prompt. With `periods`, docs holds one candidate list per
+    period; each is reranked on its own and gets an equal share of the top N.
+    """
+    timer.count("retrieved_docs", sum(len(d) for d in docs) if periods else len(docs))
+    with timer.stage("rerank"):
+        if periods:
+            timer.count("periods", len(periods))
+            docs = merge_by_period([reranker.rerank(query, d, RERANK_TOP_N) for d in docs], RERANK_TOP_N)
+        else:
+            docs = reranker.rerank(query, docs, RERANK_TOP_N)
+    with timer.stage("pack"):
+        packed, report = pack_context(docs)
+    timer.count("context_docs", len(packed))
+    timer.count("context_tokens_saved", report["tokens_before"] - report["tokens_after"])
+    return packed
 
-    if not docs:
-        retriever = vectorstore.as_retriever(search_kwargs={
-            "k": 20,
-            "filter": {
-                "stock": stock
-            }
-        })
-        docs = retriever.invoke(query)
-
-    sources = list({
-        f"{d.metadata['type'].replace('_', ' ').title()} - {parse_filename(d.metadata['source'])}"
-        for d in docs
-    })
+def build_prompt_timed(stock, query, docs, timer):
+    with timer.stage("prompt"):
+        prompt = build_prompt(stock, query, docs)
+    timer.count("prompt_tokens", estimate_tokens(prompt))
+    return prompt
+
+def build_prompt(stock, query, docs):
     context = "\n\n".join([d.page_content for d in docs])
 
-    prompt = f"""
+    return f"""
         You are an intelligent and professional financial analyst assistant. 
         Your role is to carefully read, synthesize, and summarize information from official company documents such as annual reports, 
         earnings call transcripts, and regulatory announcements. 
@@ -135,37 +246,386 @@ def ask_question(stock, query):
         <b>Answer:</b>
     """
 
-    response = genai.GenerativeModel("models/gemini-2.5-flash").generate_content(prompt)
+def format_sources(docs):
+    return list({
+        f"{d.metadata['type'].replace('_', ' ').title()} - {parse_filename(d.metadata['source'])}"
+        for d in docs
+    })
+
+def build_answer(stock, query, docs, text, timer=None):
+    timer = timer or StageTimer()
+    timer.count("completion_tokens", estimate_tokens(text))
+    sources = format_sources(docs)
+    with timer.stage("markdown"):
+        cleaned_output = convert_markdown_bold_to_html(text.strip())
+        reply = markdown.markdown(cleaned_output)
+
+    return {
+        "stock": stock,
+        "question": query,
+        "sources": sources,
+        "document_count": len(sources),
+        "reply": reply
+    }
+
+def format_value(row):
+    value = f"{row['value']:,.2f}".rstrip("0").rstrip(".")
+    qualifier = f"{row['qualifier']} " if row.get("qualifier") else ""
+    if row["unit"] == "%":
+        return f"{qualifier}{value}%"
+    currency, _, scale = row["unit"].partition(" ")
+    return f"{qualifier}{currency}{value} {scale}".strip()
 
-    content = response.text.strip()
-    cleaned_output = convert_markdown_bold_to_html(content)
+def answer_from_metrics(stock, query):
+    """
+    Answers direct metric and trend lookups ("What was TCS revenue in FY24?") from the
+    metrics table without retrieval or generation. Returns None when the question is
+    narrative, the table has nothing for it, or any row is below MIN_METRIC_CONFIDENCE or
+    lacks a scale, so the caller falls back to RAG.
+    """
+    parsed = parse_metric_query(query)
+    if not parsed:
+        return None
+    rows = metrics_table.lookup(stock, parsed["metrics"], parsed["periods"])
+    if parsed["last_years"]:
+        years = sorted({r["period"] for r in rows if r["period"].startswith("FY")})[-parsed["last_years"]:]
+        rows = [r for r in rows if r["period"] in years]
+    if not rows:
+        return None
+    if any((r["confidence"] or 0.0) < MIN_METRIC_CONFIDENCE or not has_scale(r["metric"], r["unit"]) for r in rows):
+        return None
 
+    lines = []
+    for metric in parsed["metrics"]:
+        entries = [
+            f"<b>{r['period']}:</b> <b>{format_value(r)}</b> "
+            f"(<i>{r['type'].replace('_', ' ').title()} - {parse_filename(r['source'])}, p. {r['page']}</i>)"
+            for r in rows if r["metric"] == metric
+        ]
+        if entries:
+            lines.append(f"<b>{METRIC_LABELS[metric]}:</b><br>" + "<br>".join(entries))
+
+    sources = list({f"{r['type'].replace('_', ' ').title()} - {parse_filename(r['source'])}" for r in rows})
     return {
         "stock": stock,
         "question": query,
         "sources": sources,
         "document_count": len(sources),
-        "reply": markdown.markdown(cleaned_output)
+        "reply": "<p>" + "<br><br>".join(lines) + "</p>",
+        "answered_from": "metrics",
     }
 
+def ask_question(stock, query):
+    timer = StageTimer()
+    with timer.stage("metrics"):
+        answer = answer_from_metrics(stock, query)
+    if answer:
+        record_request(timer, "ask_question", "metrics", stock=stock)
+        return answer
+
+    with timer.stage("classify"):
+        doc_types = get_doc_types(query)
+    print("Suggested Doc Types : ",doc_types)
+
+    periods = plan_query(stock, query)
+    by_period = []
+    if periods:
+        print("Periods : ", [p["label"] for p in periods])
+        with timer.stage("retrieve"):
+            by_period = async_runtime.run(retrieve_periods_async(
+                stock, query, doc_type_filters(stock, doc_types), periods, period_k(RERANK_CANDIDATES, periods)
+            ))
+
+    if any(by_period):
+        docs = assemble_context(query, by_period, timer, periods=periods)
+    else:
+        with timer.stage("retrieve"):
+            docs = retrieve(stock, query, doc_type_filters(stock, doc_types), RERANK_CANDIDATES)
+
+        if not docs:
+            timer.count("retrieval_fallbacks")
+            with timer.stage("retrieve_fallback"):
+                docs = retrieve(stock, query, {"stock": stock}, RERANK_CANDIDATES)
+
+        docs = assemble_context(query, docs, timer)
+    prompt = build_prompt_timed(stock, query, docs, timer)
+    with timer.stage("generate"):
+        text = answer_model.generate(prompt)
+    answer = build_answer(stock, query, docs, text, timer)
+    record_request(timer, "ask_question", "rag", stock=stock)
+    return answer
 
-from flask import Flask,request,jsonify
+async def retrieve_docs_async(stock, query, timer):
+    """
+    Runs the intent classification and a wider stock-only retrieval concurrently, then
+    narrows the candidates to the suggested doc types. A filtered retrieval is only issued
+    when too few candidates survive the intersection. The result is packed by assemble_context.
+
+    Questions about specific periods (plan_query) retrieve per period instead, concurrently
+    and with the fiscal year in the filter, so each period gets its share of the context.
+    """
+    periods = plan_query(stock, query)
+    if periods:
+        print("Periods : ", [p["label"] for p in periods])
+        retrieval = retrieve_periods_async(stock, query, {"stock": stock}, periods, period_k(SPECULATIVE_K, periods))
+    else:
+        retrieval = asyncio.to_thread(retrieve, stock, query, {"stock": stock}, SPECULATIVE_K)
+    doc_types, candidates = await asyncio.gather(
+        timer.measure("classify", get_doc_types_async(query)),
+        timer.measure("retrieve", retrieval)
+    )
+    print("Suggested Doc Types : ",doc_types)
+
+    if periods:
+        if any(candidates):
+            k = period_k(RERANK_CANDIDATES, periods)
+            # A period with none of the suggested doc types keeps its other candidates.
+            by_period = [[d for d in docs if d.metadata.get("type") in doc_types][:k] or docs[:k] for docs in candidates]
+            return assemble_context(query, by_period, timer, periods=periods)
+        # No chunk is tagged with any of the fiscal years: retrieve as for any other question.
+        timer.count("retrieval_fallbacks")
+        candidates = await timer.measure("retrieve_fallback", asyncio.to_thread(
+            retrieve, stock, query, {"stock": stock}, SPECULATIVE_K
+        ))
+
+    docs = [d for d in candidates if d.metadata.get("type") in doc_types][:RERANK_CANDIDATES]
+
+    if len(docs) < MIN_SPECULATIVE_DOCS and len(candidates) == SPECULATIVE_K:
+        timer.count("retrieval_fallbacks")
+        docs = await timer.measure("retrieve_fallback", asyncio.to_thread(
+            retrieve, stock, query, doc_type_filters(stock, doc_types), RERANK_CANDIDATES
+        ))
+
+    if not docs:
+        docs = candidates[:RERANK_CANDIDATES]
+
+    return assemble_context(query, docs, timer)
+
+async def ask_question_async(stock, query, timer):
+    """
+    Same answer as ask_question, with retrieval done by retrieve_docs_async and generation
+    on the shared async client. The caller records `timer` once the request is done.
+    """
+    with timer.stage("metrics"):
+        answer = answer_from_metrics(stock, query)
+    if answer:
+        return answer
+
+    docs = await retrieve_docs_async(stock, query, timer)
+    prompt = build_prompt_timed(stock, query, docs, timer)
+    text = await timer.measure("generate", answer_model.agenerate(prompt))
+    return build_answer(stock, query, docs, text, timer)
+
+class IncrementalMarkdown:
+    """
+    Converts streamed model text to HTML one complete block at a time.
+    Text is only rendered up to the last blank line seen, so a chunk never ends
+    inside a half-written tag, bold marker or list.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.text = ""
+
+    def feed(self, text):
+        self.buffer += text
+        self.text += text
+        cut = self.buffer.rfind("\n\n")
+        if cut == -1:
+            return ""
+        ready, self.buffer = self.buffer[:cut], self.buffer[cut + 2:]
+        return self._render(ready)
+
+    def flush(self):
+        ready, self.buffer = self.buffer, ""
+        return self._render(ready)
+
+    def _render(self, text):
+        if not text.strip():
+            return ""
+        return markdown.markdown(convert_markdown_bold_to_html(text.strip())) + "\n"
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_answer(stock, query, docs, timer, version):
+    """
+    Yields Server-Sent Events: `sources` first, then `chunk` events with ready-to-insert
+    HTML as Gemini streams tokens, then `done` with the full answer (as /chat would return it).
+    If generation fails midway, an `error` event replaces `done` before the exception propagates.
+    """
+    sources = format_sources(docs)
+    yield sse("sources", {"stock": stock, "question": query, "sources": sources, "document_count": len(sources)})
+
+    outcome = "aborted"
+    try:
+        prompt = build_prompt_timed(stock, query, docs, timer)
+        renderer = IncrementalMarkdown()
+        with timer.stage("generate"):
+            for part in answer_model.stream(prompt):
+                html = renderer.feed(part)
+                if html:
+                    yield sse("chunk", {"html": html})
+
+        html = renderer.flush()
+        if html:
+            yield sse("chunk", {"html": html})
+
+        answer = build_answer(stock, query, docs, renderer.text, timer)
+        answer_cache.put(stock, query, answer, version)
+        outcome = "rag"
+        yield sse("done", dict(answer, cached=False))
+    except Exception as e:
+        outcome = "error"
+        print(f"❌ Streaming answer for {stock} failed: {e!r}")
+        # The 200 and part of the answer are already sent; tell the client instead of just closing.
+        yield sse("error", {"error": "Sorry, something went wrong while generating the answer."})
+        raise
+    finally:
+        record_request(timer, "chat_stream", outcome, stock=stock)
+
+
+from flask import Flask,request,jsonify,Response,abort,make_response
 from flask_cors import CORS
 
 app = Flask(__name__)
 
 CORS(app,origins="*")
 
+def request_stock():
+    """
+    The `stock` field of the request (DEFAULT_STOCK when omitted), or None if it has no shard.
+    Aborts with 400 when it is not a string.
+    """
+    stock = request.json.get('stock') or DEFAULT_STOCK
+    if not isinstance(stock, str):
+        abort(make_response(jsonify({"error": "stock must be a string"}), 400))
+    stock = stock.strip().upper()
+    return stock if get_shards().exists(stock) else None
+
+def unknown_stock():
+    return jsonify({"error": f"No reports ingested for stock {request.json.get('stock')!r}"}), 404
+
 @app.post('/chat')
 def chat():
     query = request.json.get('query')
-    res = ask_question(
-        stock='TCS',
-        query=query
-    )
+    stock = request_stock()
+    if not stock:
+        return unknown_stock()
+
+    timer = StageTimer()
+    # Taken before anything is retrieved, so an ingest finishing mid-request invalidates this answer.
+    version = answer_cache.version(stock)
+    with timer.stage("cache"):
+        cached = answer_cache.get(stock, query)
+    if cached:
+        record_request(timer, "chat", "cached", stock=stock)
+        return jsonify(dict(cached, cached=True))
+
+    try:
+        res = async_runtime.run(ask_question_async(
+            stock=stock,
+            query=query,
+            timer=timer
+        ))
+    except Exception:
+        record_request(timer, "chat", "error", stock=stock)
+        raise
+    record_request(timer, "chat", res.get("answered_from", "rag"), stock=stock)
+    answer_cache.put(stock, query, res, version)
+    res = dict(res, cached=False)
     # print(res.get('reply'))
     return jsonify(res)
 
+@app.post('/chat/stream')
+def chat_stream():
+    query = request.json.get('query')
+    stock = request_stock()
+    if not stock:
+        return unknown_stock()
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    timer = StageTimer()
+    # Taken before anything is retrieved, so an ingest finishing mid-request invalidates this answer.
+    version = answer_cache.version(stock)
+    with timer.stage("cache"):
+        cached = answer_cache.get(stock, query)
+    if cached:
+        record_request(timer, "chat_stream", "cached", stock=stock)
+        events = [
+            sse("sources", {k: cached[k] for k in ("stock", "question", "sources", "document_count")}),
+            sse("chunk", {"html": cached["reply"]}),
+            sse("done", dict(cached, cached=True))
+        ]
+        return Response(events, mimetype="text/event-stream", headers=headers)
+
+    with timer.stage("metrics"):
+        answer = answer_from_metrics(stock, query)
+    if answer:
+        record_request(timer, "chat_stream", "metrics", stock=stock)
+        events = [
+            sse("sources", {k: answer[k] for k in ("stock", "question", "sources", "document_count")}),
+            sse("chunk", {"html": answer["reply"]}),
+            sse("done", dict(answer, cached=False))
+        ]
+        return Response(events, mimetype="text/event-stream", headers=headers)
+
+    try:
+        docs = async_runtime.run(retrieve_docs_async(stock, query, timer))
+    except Exception:
+        record_request(timer, "chat_stream", "error", stock=stock)
+        raise
+    return Response(stream_answer(stock, query, docs, timer, version), mimetype="text/event-stream", headers=headers)
+
+def collect_service_metrics():
+    """Scrape-time counters and gauges from the caches, shard pool and LLM backends."""
+    samples = [
+        ("qa_answer_cache_hits", "counter", "Answer cache hits", {}, answer_cache.hits),
+        ("qa_answer_cache_misses", "counter", "Answer cache misses", {}, answer_cache.misses),
+    ]
+    # Scraping does not create the embedding client or shard pool if no request has yet.
+    if hasattr(_embedding_model, "hits"):
+        samples += [
+            ("qa_embedding_cache_hits", "counter", "Embedding cache hits", {}, _embedding_model.hits),
+            ("qa_embedding_cache_misses", "counter", "Embedding cache misses", {}, _embedding_model.misses),
+        ]
+    if _shards is not None:
+        samples += [
+            (f"qa_shards_{name}", "gauge", f"Shard pool {name}", {}, value)
+            for name, value in _shards.stats().items()
+        ]
+    for backend, snapshot in all_metrics().items():
+        for name in ("calls", "errors", "retries", "input_tokens", "output_tokens"):
+            samples.append((f"llm_{name}_total", "counter", f"LLM {name.replace('_', ' ')}", {"backend": backend}, snapshot[name]))
+    return samples
+
+registry.add_collector(collect_service_metrics)
+
+@app.get('/metrics')
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+def warm_up(stocks=None):
+    """
+    Does the work the first request would otherwise pay for: the embedding and LLM clients,
+    the reranker model, the shared event loop, the metrics table and the shards (Chroma + BM25)
+    of `stocks` (WARM_UP_STOCKS by default). Call it once per serving worker after the fork,
+    e.g. from gunicorn's post_worker_init hook; `python main.py` runs it before serving.
+    """
+    start = time.perf_counter()
+    pool = get_shards()
+    answer_model.warm_up()
+    classifier_model.warm_up()
+    reranker.warm_up()
+    async_runtime.get_loop()
+    metrics_table.refresh()
+    opened = []
+    for stock in stocks or WARM_UP_STOCKS:
+        if pool.exists(stock):
+            with pool.use(stock) as shard:
+                shard.sparse.refresh()
+            opened.append(stock)
+    print(f"✅ Warmed up in {time.perf_counter() - start:.2f}s (shards: {', '.join(opened) or 'none'})")
 
 if __name__ == "__main__":
     # res = ask_question(
@@ -173,4 +633,5 @@ if __name__ == "__main__":
     #     query="What has the company been doing to grow? Has the company created any new revenue streams over the last 3 years? Has it launched any new products or innovations?"
     # )
     # print(res)
-    app.run(debug=True)
\ No newline at end of file
+    warm_up()
+    app.run(debug=True, threaded=True)
\ No newline at end of file
@@ -0,0 +1,353 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.helpers import load_manifest, save_manifest
+from utils.answer_cache import bump_stock_versions
+from utils.sparse_index import SparseIndex, SPARSE_INDEX_FILE
+from utils.metrics_table import MetricsTable, COLUMNS
+from utils.shards import SHARDS_DIR, VECTOR_BACKEND, shard_dir, shard_name, list_shards, read_shard_info, write_shard_info
+from common.embeddings import embedding_model_name
+from common.faiss_store import FAISS_DIR
+import io
+import gzip
+import json
+import time
+import hashlib
+import tarfile
+import argparse
+import tempfile
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILE = "snapshot.json"
+# Members of the snapshot tar. vectors.npy is stored uncompressed so it can be memory-mapped
+# straight out of the archive; the text and metadata columns are gzipped.
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+CHUNKS_FILE = "chunks.json.gz"
+MANIFEST_FILE = "manifest.json"
+METRICS_FILE = "metrics_table.json"
+# Same collection name langchain's Chroma opens by default.
+COLLECTION = "langchain"
+
+def _sha256(fileobj, block_size=1 << 20):
+    sha = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        sha.update(block)
+    return sha.hexdigest()
+
+def read_shard(path, batch_size=1000):
+    """
+    -> (ids, vectors, texts, metadatas) of a shard's Chroma collection, read with chromadb
+    directly so that exporting needs no embedding client.
+    """
+    import chromadb
+    import numpy as np
+
+    client = chromadb.PersistentClient(path=path)
+    if COLLECTION not in [getattr(c, "name", c) for c in client.list_collections()]:
+        return [], np.zeros((0, 0), dtype="float32"), [], []
+    collection = client.get_collection(COLLECTION)
+    ids, vectors, texts, metadatas = [], [], [], []
+    for offset in range(0, collection.count(), batch_size):
+        batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        ids += batch["ids"]
+        vectors.append(np.asarray(batch["embeddings"], dtype="float32"))
+        texts += batch["documents"]
+        metadatas += [metadata or {} for metadata in batch["metadatas"]]
+    return ids, np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype="float32"), texts, metadatas
+
+def quantize(vectors):
+    """float32 rows -> (int8 rows, float32 per-row scale); row ≈ codes * scale."""
+    import numpy as np
+
+    scales = np.abs(vectors).max(axis=1) / 127 if len(vectors) else np.zeros(0, dtype="float32")
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).clip(-127, 127).astype("int8")
+    return codes, scales.astype("float32")
+
+def shards_embedding_model(paths, embedding_model=None):
+    """
+    The embedding model the shards' vectors were built with, as ingest recorded it. Raises
+    ValueError when they disagree (with each other or with `embedding_model`), or when none
+    has a record and `embedding_model` does not say which model built them.
+    """
+    recorded = {os.path.basename(path): read_shard_info(path).get("embedding_model") for path in paths}
+    models = {model for model in recorded.values() if model} | ({embedding_model} if embedding_model else set())
+    if len(models) > 1:
+        raise ValueError("Shards were built with different embedding models: " + ", ".join(
+            f"{name}={model or 'unrecorded'}" for name, model in sorted(recorded.items())
+        ) + (f" (asked for {embedding_model!r})" if embedding_model else ""))
+    if not models:
+        raise ValueError("No shard records its embedding model (ingested before it was recorded); "
+                         "pass embedding_model / --embedding-model")
+    unrecorded = sorted(name for name, model in recorded.items() if not model)
+    if unrecorded:
+        print(f"⚠️ {', '.join(unrecorded)}: embedding model not recorded, exporting as {next(iter(models))!r}")
+    return next(iter(models))
+
+def export_snapshot(out_path, stocks=None, dtype="float32", base_dir=SHARDS_DIR, embedding_model=None):
+    """
+    Writes every shard (or just `stocks`) under base_dir to one versioned tar file:
+
+        snapshot.json         format version, embedding model, dims, per-shard row ranges, checksums
+        vectors.npy           all embeddings, one contiguous (rows, dim) float32 or int8 array
+        scales.npy            per-row scale of the int8 codes (dtype="int8" only)
+        chunks.json.gz        {"id": [...], "text": [...], "metadata": {field: [...]}}, row order as vectors.npy
+        manifest.json         the ingestion manifest records of those stocks
+        metrics_table.json    their rows of the metrics table
+
+    Vectors come from Chroma as stored; nothing is re-parsed or re-embedded. The embedding
+    model is the one ingest recorded for the shards (shards_embedding_model); shards built
+    with different models are not exported together.
+    """
+    import numpy as np
+
+    if dtype not in ("float32", "int8"):
+        raise ValueError(f"Unknown snapshot dtype {dtype!r} (float32 or int8)")
+    names = sorted({shard_name(stock) for stock in stocks}) if stocks else list_shards(base_dir)
+    missing = [name for name in names if not os.path.isdir(os.path.join(base_dir, name))]
+    if missing:
+        raise KeyError(f"No shard for {', '.join(missing)} in {base_dir}")
+    embedding_model = shards_embedding_model([os.path.join(base_dir, name) for name in names], embedding_model)
+
+    start = time.perf_counter()
+    shards = {}
+    ids, texts, metadatas, blocks = [], [], [], []
+    for name in names:
+        shard_ids, shard_vectors, shard_texts, shard_metadatas = read_shard(os.path.join(base_dir, name))
+        shards[name] = {"start": len(ids), "count": len(shard_ids)}
+        ids += shard_ids
+        texts += shard_texts
+        metadatas += shard_metadatas
+        if len(shard_ids):
+            blocks.append(shard_vectors)
+    vectors = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype="float32")
+    if len({block.shape[1] for block in blocks}) > 1:
+        raise ValueError("Shards hold vectors of different dimensions; re-ingest before exporting")
+
+    fields = sorted({field for metadata in metadatas for field in metadata})
+    chunks = {
+        "id": ids,
+        "text": texts,
+        "metadata": {field: [metadata.get(field) for metadata in metadatas] for field in fields},
+    }
+    manifest = load_manifest()
+    files = {key: record for key, record in manifest["files"].items() if shard_name(record["stock"]) in shards}
+    table = MetricsTable().load()
+    rows = [i for i, stock in enumerate(table.columns["stock"]) if stock and shard_name(stock) in shards]
+
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(out_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=out_dir, prefix=".snapshot-") as tmp_dir:
+        members = {}
+        if dtype == "int8":
+            codes, scales = quantize(vectors)
+            np.save(os.path.join(tmp_dir, VECTORS_FILE), codes)
+            np.save(os.path.join(tmp_dir, SCALES_FILE), scales)
+        else:
+            np.save(os.path.join(tmp_dir, VECTORS_FILE), vectors)
+        # mtime=0 keeps the bytes (and checksum) of identical exports identical.
+        with gzip.GzipFile(os.path.join(tmp_dir, CHUNKS_FILE), "wb", mtime=0) as f:
+            f.write(json.dumps(chunks, ensure_ascii=False).encode("utf-8"))
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            json.dump({"version": manifest["version"], "files": files}, f)
+        with open(os.path.join(tmp_dir, METRICS_FILE), "w") as f:
+            json.dump({"columns": {name: [table.columns[name][i] for i in rows] for name in COLUMNS}}, f)
+
+        for member in sorted(os.listdir(tmp_dir)):
+            with open(os.path.join(tmp_dir, member), "rb") as f:
+                members[member] = {"sha256": _sha256(f), "bytes": os.path.getsize(os.path.join(tmp_dir, member))}
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "embedding_model": embedding_model,
+            "dim": int(vectors.shape[1]),
+            "dtype": dtype,
+            "count": len(ids),
+            "shards": shards,
+            "members": members,
+        }
+        with open(os.path.join(tmp_dir, SNAPSHOT_FILE), "w") as f:
+            json.dump(header, f, indent=2)
+
+        tmp_file = out_path + ".tmp"
+        with tarfile.open(tmp_file, "w", format=tarfile.PAX_FORMAT) as tar:
+            for member in [SNAPSHOT_FILE] + sorted(members):
+                tar.add(os.path.join(tmp_dir, member), arcname=member)
+        os.replace(tmp_file, out_path)
+    print(f"✅ Exported {len(ids)} chunks from {len(shards)} shards to {out_path} "
+          f"({dtype}, {os.path.getsize(out_path) / 2**20:.1f} MB, {time.perf_counter() - start:.2f}s).")
+    return header
+
+class Snapshot:
+    """
+    Read side of a snapshot tar. Opening it only reads snapshot.json and checks the format
+    version and embedding model; vectors() memory-maps vectors.npy inside the archive, so
+    nothing is extracted or copied.
+    """
+
+    def __init__(self, path, embedding_model=None):
+        self.path = path
+        self._tar = tarfile.open(path, "r:")
+        self.header = json.load(self._tar.extractfile(SNAPSHOT_FILE))
+        if self.header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{path}: snapshot format {self.header.get('version')}, expected {SNAPSHOT_VERSION}")
+        embedding_model = embedding_model or embedding_model_name()
+        if self.header["embedding_model"] != embedding_model:
+            raise ValueError(f"{path} was built with embedding model {self.header['embedding_model']!r}, "
+                             f"this node embeds queries with {embedding_model!r}")
+        self._chunks = None
+
+    def close(self):
+        self._tar.close()
+
+    def verify(self):
+        """Checks every member against the checksums recorded at export; raises ValueError."""
+        for member, expected in self.header["members"].items():
+            info = self._tar.getmember(member)
+            if info.size != expected["bytes"] or _sha256(self._tar.extractfile(info)) != expected["sha256"]:
+                raise ValueError(f"{self.path}: {member} is corrupt (size or sha256 mismatch)")
+
+    def _memmap(self, member):
+        import numpy as np
+
+        info = self._tar.getmember(member)
+        with open(self.path, "rb") as f:
+            f.seek(info.offset_data)
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            offset = f.tell()
+        if fortran_order:
+            raise ValueError(f"{self.path}: {member} is not C-ordered")
+        if not shape[0]:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    def vectors(self, shard=None):
+        """(rows, dim) float32 vectors of one shard (or all), read through the memory map."""
+        import numpy as np
+
+        rows = slice(None)
+        if shard is not None:
+            entry = self.header["shards"][shard]
+            rows = slice(entry["start"], entry["start"] + entry["count"])
+        vectors = self._memmap(VECTORS_FILE)[rows]
+        if self.header["dtype"] == "int8":
+            vectors = vectors.astype("float32") * self._memmap(SCALES_FILE)[rows][:, None]
+        if len(vectors) and vectors.shape[1] != self.header["dim"]:
+            raise ValueError(f"{self.path}: vectors have {vectors.shape[1]} dims, header says {self.header['dim']}")
+        return np.asarray(vectors, dtype="float32")
+
+    def chunks(self, shard=None):
+        """-> (ids, texts, metadatas) of one shard (or all), in vector row order."""
+        if self._chunks is None:
+            with gzip.GzipFile(fileobj=self._tar.extractfile(CHUNKS_FILE)) as f:
+                self._chunks = json.load(f)
+        start, end = 0, len(self._chunks["id"])
+        if shard is not None:
+            entry = self.header["shards"][shard]
+            start, end = entry["start"], entry["start"] + entry["count"]
+        columns = self._chunks["metadata"]
+        metadatas = [
+            {field: values[i] for field, values in columns.items() if values[i] is not None}
+            for i in range(start, end)
+        ]
+        return self._chunks["id"][start:end], self._chunks["text"][start:end], metadatas
+
+    def read_json(self, member):
+        return json.load(io.TextIOWrapper(self._tar.extractfile(member), encoding="utf-8"))
+
+def load_chroma(path, ids, vectors, texts, metadatas, batch_size=1000):
+    """Replaces the shard's Chroma collection with the snapshot rows, stored embeddings included."""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path)
+    if COLLECTION in [getattr(c, "name", c) for c in client.list_collections()]:
+        client.delete_collection(COLLECTION)
+    collection = client.get_or_create_collection(COLLECTION)
+    for i in range(0, len(ids), batch_size):
+        collection.add(ids=ids[i:i + batch_size], embeddings=vectors[i:i + batch_size],
+                       documents=texts[i:i + batch_size], metadatas=metadatas[i:i + batch_size])
+
+def import_snapshot(path, stores=None, base_dir=SHARDS_DIR, verify=True):
+    """
+    Bootstraps this node's shards from a snapshot: for every shard in it, rebuilds the vector
+    store(s) in `stores` ("faiss" and/or "chroma"; default VECTOR_BACKEND) and the BM25 index
+    from the stored vectors and text, then merges the shards' manifest records and metrics rows
+    into this node's. No embedding calls are made. Shards in the snapshot replace local ones.
+
+    A replica bootstrapped with stores=["faiss"] only has no Chroma collection to ingest into;
+    import with "chroma" as well on nodes that will also run ingest.py.
+    """
+    from langchain_core.documents import Document
+    from common.faiss_store import build_faiss_index
+
+    stores = stores or [VECTOR_BACKEND]
+    start = time.perf_counter()
+    snapshot = Snapshot(path)
+    try:
+        if verify:
+            snapshot.verify()
+        header = snapshot.header
+        for name in header["shards"]:
+            shard_start = time.perf_counter()
+            target = shard_dir(name, base_dir)
+            os.makedirs(target, exist_ok=True)
+            ids, texts, metadatas = snapshot.chunks(name)
+            vectors = snapshot.vectors(name)
+            if "faiss" in stores:
+                build_faiss_index(os.path.join(target, FAISS_DIR), ids, vectors, texts, metadatas,
+                                  header["embedding_model"])
+            if "chroma" in stores:
+                load_chroma(target, ids, vectors, texts, metadatas)
+            write_shard_info(target, embedding_model=header["embedding_model"])
+            sparse = SparseIndex(path=os.path.join(target, SPARSE_INDEX_FILE))
+            sparse.add(ids, [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)])
+            sparse.save()
+            print(f"✅ {name}: {len(ids)} chunks loaded into {' + '.join(stores)} ({time.perf_counter() - shard_start:.2f}s)")
+
+        imported = set(header["shards"])
+        manifest = load_manifest()
+        manifest["files"] = {
+            key: record for key, record in manifest["files"].items() if shard_name(record["stock"]) not in imported
+        }
+        manifest["files"].update(snapshot.read_json(MANIFEST_FILE)["files"])
+        save_manifest(manifest)
+
+        table = MetricsTable().load()
+        table.delete({"stock": {"$in": sorted({s for s in table.columns["stock"] if s and shard_name(s) in imported})}})
+        columns = snapshot.read_json(METRICS_FILE)["columns"]
+        table.add([{name: columns[name][i] for name in COLUMNS if name in columns} for i in range(len(columns["stock"]))])
+        table.save()
+
+        stocks = {record["stock"] for record in manifest["files"].values() if shard_name(record["stock"]) in imported}
+        bump_stock_versions(sorted(stocks | imported))
+    finally:
+        snapshot.close()
+    print(f"✅ Imported {header['count']} chunks in {len(header['shards'])} shards from {path} "
+          f"in {time.perf_counter() - start:.2f}s, no embedding calls.")
+    return header
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Export / import the shards in {SHARDS_DIR} as a portable snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write the shards' vectors, chunks, manifest and metrics to a snapshot")
+    export_parser.add_argument("out", help="Snapshot file to write (e.g. snapshots/2025-06-01.tar)")
+    export_parser.add_argument("--stocks", nargs="+", help="Only these stocks (default: every shard)")
+    export_parser.add_argument("--dtype", choices=("float32", "int8"), default="float32",
+                               help="int8 stores 4x smaller vectors with a per-row scale")
+    export_parser.add_argument("--embedding-model",
+                               help="Model that built shards ingested before it was recorded (must match recorded ones)")
+    import_parser = commands.add_parser("import", help="Bootstrap this node's shards from a snapshot")
+    import_parser.add_argument("snapshot", help="Snapshot file written by export")
+    import_parser.add_argument("--stores", nargs="+", choices=("faiss", "chroma"),
+                               help=f"Vector stores to load (default: VECTOR_BACKEND={VECTOR_BACKEND})")
+    import_parser.add_argument("--no-verify", action="store_true", help="Skip the per-member sha256 checks")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(args.out, stocks=args.stocks, dtype=args.dtype, embedding_model=args.embedding_model)
+    else:
+        import_snapshot(args.snapshot, stores=args.stores, verify=not args.no_verify)
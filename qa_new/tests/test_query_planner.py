@@ -0,0 +1,82 @@
+import os
+import sys
+from datetime import date
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from utils.helpers import fiscal_year_metadata
+from utils.query_planner import plan_periods, period_filter, merge_by_period
+
+TODAY = date(2026, 10, 18)  # FY27
+
+def labels(periods):
+    return [(p["label"], p["fy"]) for p in periods]
+
+def test_no_period():
+    assert plan_periods("What is the company's AI strategy?", today=TODAY) == []
+
+def test_explicit_fiscal_years_and_quarters():
+    assert labels(plan_periods("Compare margins in FY23 and Q3 FY25", today=TODAY)) == [("FY23", 2023), ("Q3FY25", 2025)]
+    assert labels(plan_periods("Revenue in FY2023-24", today=TODAY)) == [("FY24", 2024)]
+
+def test_quarter_and_year_of_the_same_fy_merge():
+    assert labels(plan_periods("Q3 FY25 versus the whole of FY25", today=TODAY)) == [("FY25", 2025)]
+
+def test_calendar_year_is_read_as_fy():
+    assert labels(plan_periods("What happened in 2024?", today=TODAY)) == [("FY24", 2024)]
+    # Amounts and ids are not years.
+    assert plan_periods("Orders worth ₹2024 crore", today=TODAY) == []
+
+def test_relative_years_are_fiscal():
+    assert labels(plan_periods("How did last year go?", today=TODAY)) == [("FY26", 2026)]
+    assert labels(plan_periods("Outlook for this financial year", today=TODAY)) == [("FY27", 2027)]
+    # Before April the current FY is still the previous calendar year's.
+    assert labels(plan_periods("How did last year go?", today=date(2026, 2, 1))) == [("FY25", 2025)]
+
+def test_last_year_matches_chunks_of_reports_dated_in_the_calendar_year_before():
+    # A June 2025 announcement is about FY26, the FY "last year" means in October 2026.
+    fy = fiscal_year_metadata("M6Y2025D20.pdf")["fy"]
+    assert labels(plan_periods("What did they announce last year?", available_fys={2024, 2025, fy}, today=TODAY)) == [("FY26", 2026)]
+
+def test_last_n_years_uses_the_latest_on_record():
+    assert labels(plan_periods("Trend over the last 3 years", available_fys={2021, 2022, 2023, 2024}, today=TODAY)) == [
+        ("FY22", 2022), ("FY23", 2023), ("FY24", 2024)
+    ]
+    assert labels(plan_periods("Trend over the last two years", today=TODAY)) == [("FY25", 2025), ("FY26", 2026)]
+
+def test_periods_without_chunks_are_dropped():
+    assert labels(plan_periods("FY21 versus FY24", available_fys={2024}, today=TODAY)) == [("FY24", 2024)]
+
+def test_fiscal_year_metadata():
+    assert fiscal_year_metadata("Q4_2025.pdf") == {"fy": 2025}
+    assert fiscal_year_metadata("AnnualReport2024.pdf") == {"fy": 2024}
+    assert fiscal_year_metadata("M3Y2025D15.pdf") == {"fy": 2025}
+    assert fiscal_year_metadata("M4Y2025D15.pdf") == {"fy": 2026}
+    assert fiscal_year_metadata("presentation.pdf") == {}
+
+def test_period_filter():
+    assert period_filter(None, 2025) == {"fy": {"$eq": 2025}}
+    assert period_filter({"stock": "TCS"}, 2025) == {"$and": [{"stock": "TCS"}, {"fy": {"$eq": 2025}}]}
+    both = {"$and": [{"stock": {"$eq": "TCS"}}, {"type": {"$in": ["concall"]}}]}
+    assert period_filter(both, 2025) == {"$and": both["$and"] + [{"fy": {"$eq": 2025}}]}
+    assert both == {"$and": [{"stock": {"$eq": "TCS"}}, {"type": {"$in": ["concall"]}}]}
+
+def doc(source, text):
+    return Document(page_content=text, metadata={"source": source})
+
+def test_merge_by_period_takes_turns_most_recent_first():
+    old = [doc("a.pdf", f"old {i}") for i in range(3)]
+    new = [doc("b.pdf", f"new {i}") for i in range(10)]
+    merged = merge_by_period([old, new], 6)
+    assert [d.page_content for d in merged] == ["new 0", "old 0", "new 1", "old 1", "new 2", "old 2"]
+
+def test_merge_by_period_gives_unused_shares_to_the_others():
+    short = [doc("a.pdf", "only")]
+    long = [doc("b.pdf", f"new {i}") for i in range(5)]
+    assert [d.page_content for d in merge_by_period([short, long], 4)] == ["new 0", "only", "new 1", "new 2"]
+
+def test_merge_by_period_drops_duplicates():
+    shared = doc("a.pdf", "same")
+    merged = merge_by_period([[shared, doc("a.pdf", "x")], [doc("a.pdf", "same"), doc("b.pdf", "y")]], 10)
+    assert [d.page_content for d in merged] == ["same", "y", "x"]
+    assert merge_by_period([], 5) == []
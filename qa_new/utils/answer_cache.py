@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
+from utils.sparse_index import tokenize
+
+STOCK_VERSIONS_FILE = "stock_versions.json"
+RELATIVE_PERIOD = re.compile(
+    r"\b(?:last|previous|past|prior|current|this|next)\s+(?:\d+\s+|two\s+|three\s+|four\s+|five\s+)?"
+    r"(?:financial\s+|fiscal\s+)?(?:years?|quarters?)\b",
+    re.IGNORECASE
+)
+
+def normalize_query(query):
+    return " ".join(re.sub(r"[^\w\s₹%.]", " ", query.lower()).split())
+
+def query_facts(query):
+    """
+    The parts of a question a near-duplicate must repeat exactly: FY/quarter references,
+    numbers and amounts (any token with a digit) and relative periods ("last 3 years").
+    "revenue in FY24" and "revenue in FY25" embed almost identically but differ here.
+    """
+    facts = {token for token in tokenize(query) if any(ch.isdigit() for ch in token)}
+    facts |= {" ".join(match.group().lower().split()) for match in RELATIVE_PERIOD.finditer(query)}
+    return frozenset(facts)
+
+def load_stock_versions():
+    try:
+        with open(STOCK_VERSIONS_FILE) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def bump_stock_versions(stocks):
+    """
+    Called by ingest.py after a stock's documents change so that running servers
+    drop every cached answer for that stock.
+    """
+    versions = load_stock_versions()
+    for stock in stocks:
+        versions[stock] = time.time_ns()
+    tmp_file = STOCK_VERSIONS_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(versions, f, indent=2)
+    os.replace(tmp_file, STOCK_VERSIONS_FILE)
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class AnswerCache:
+    """
+    LRU + TTL cache of /chat answers keyed by (stock, normalized query).
+
+    When `embed` is given, an exact-key miss falls back to the most similar cached
+    question for the same stock with cosine similarity >= `similarity`, provided both name
+    the same periods and numbers (query_facts). `embed` gets the raw query, the same text
+    retrieval embeds, so the embedding cache serves both.
+    Entries are invalidated when ingest.py bumps the stock's version in STOCK_VERSIONS_FILE;
+    callers take version() when a request starts and store the answer under it, so an answer
+    generated while an ingest ran is never saved as current.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, embed=None, similarity=0.95, version_check_interval=1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.similarity = similarity
+        self.version_check_interval = version_check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._versions_mtime = None
+        self._versions_checked = 0.0
+
+    def _refresh_versions(self):
+        now = time.monotonic()
+        if now - self._versions_checked < self.version_check_interval:
+            return
+        self._versions_checked = now
+        try:
+            mtime = os.stat(STOCK_VERSIONS_FILE).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._versions_mtime:
+            self._versions_mtime = mtime
+            self._versions = load_stock_versions()
+
+    def version(self, stock):
+        """The stock's current document version; pass it to put() with the answer built from it."""
+        with self._lock:
+            self._refresh_versions()
+            return self._versions.get(stock)
+
+    def _valid(self, entry, stock):
+        return time.time() - entry["created"] < self.ttl and entry["version"] == self._versions.get(stock)
+
+    def get(self, stock, query):
+        key = (stock, normalize_query(query))
+        with self._lock:
+            self._refresh_versions()
+            entry = self._entries.get(key)
+            if entry and self._valid(entry, stock):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["answer"]
+            if entry:
+                del self._entries[key]
+            facts = query_facts(query)
+            candidates = [(k, e) for k, e in self._entries.items()
+                          if k[0] == stock and e["embedding"] and e["facts"] == facts and self._valid(e, stock)]
+
+        if self.embed and candidates:
+            embedding = self.embed(query)
+            best_key, best_score = None, self.similarity
+            for k, e in candidates:
+                score = cosine(embedding, e["embedding"])
+                if score >= best_score:
+                    best_key, best_score = k, score
+            if best_key:
+                with self._lock:
+                    entry = self._entries.get(best_key)
+                    if entry:
+                        self._entries.move_to_end(best_key)
+                        self.hits += 1
+                        return entry["answer"]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, stock, query, answer, version):
+        """Stores `answer` under the stock `version` taken (version()) before it was generated."""
+        key = (stock, normalize_query(query))
+        embedding = self.embed(query) if self.embed else None
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "created": time.time(),
+                "version": version,
+                "embedding": embedding,
+                "facts": query_facts(query),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,24 @@
+import asyncio
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+def get_loop():
+    """
+    Returns the process-wide event loop, starting it on a daemon thread on first use.
+    Started lazily so that forked server workers each get their own loop.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-runtime", daemon=True).start()
+    return _loop
+
+def run(coro, timeout=None):
+    """
+    Runs a coroutine on the shared loop and blocks the calling (request) thread until it finishes.
+    All requests share the loop, so async gRPC/HTTP clients bound to it are reused across chats.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
@@ -0,0 +1,104 @@
+import os
+from common.llm import estimate_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.8"))
+# The splitter overlaps chunks by up to 100 characters; anything shorter than this is not an overlap.
+MIN_OVERLAP = 20
+MAX_OVERLAP = 200
+SHINGLE_SIZE = 5
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Hashed word shingles. With ~20 chunks per answer exact Jaccard is cheaper than MinHash."""
+    words = text.lower().split()
+    return frozenset(hash(" ".join(words[i:i + size])) for i in range(max(1, len(words) - size + 1)))
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def overlap(left, right):
+    """Length of the longest suffix of `left` that `right` starts with (0 if under MIN_OVERLAP)."""
+    if len(right) < MIN_OVERLAP:
+        return 0
+    head = right[:MIN_OVERLAP]
+    start = left.find(head, max(0, len(left) - MAX_OVERLAP))
+    while start != -1:
+        size = len(left) - start
+        if size <= len(right) and right.startswith(left[start:]):
+            return size
+        start = left.find(head, start + 1)
+    return 0
+
+def merge_adjacent(ranked):
+    """
+    Joins chunks of the same source whose text continues one another (the splitter's overlap),
+    so the shared text is sent once. Each item is (rank, Document); a merged chunk keeps the
+    best rank of its parts.
+    """
+    merged = []
+    by_source = {}
+    for rank, doc in ranked:
+        by_source.setdefault(doc.metadata.get("source"), []).append([rank, doc.page_content, doc])
+
+    for parts in by_source.values():
+        joined = True
+        while joined and len(parts) > 1:
+            joined = False
+            for left in parts:
+                for right in parts:
+                    if left is right:
+                        continue
+                    size = overlap(left[1], right[1])
+                    if size:
+                        left[0] = min(left[0], right[0])
+                        left[1] += right[1][size:]
+                        parts.remove(right)
+                        joined = True
+                        break
+                if joined:
+                    break
+        merged.extend(parts)
+
+    return merged
+
+def pack_context(docs, budget=CONTEXT_TOKEN_BUDGET, duplicate_similarity=DUPLICATE_SIMILARITY, count_tokens=estimate_tokens):
+    """
+    Turns retrieved chunks (best first) into the context actually sent to the LLM:
+    overlapping neighbours are merged, near-duplicates (e.g. the same boilerplate in two
+    reports) are dropped, and the rest are packed in relevance order into `budget` tokens.
+
+    Returns (documents, report) where report has the before/after chunk and token counts.
+    """
+    from langchain_core.documents import Document
+
+    tokens_before = sum(count_tokens(d.page_content) for d in docs)
+    merged = sorted(merge_adjacent(list(enumerate(docs))), key=lambda part: part[0])
+
+    kept, signatures, duplicates = [], [], 0
+    for rank, text, doc in merged:
+        signature = shingles(text)
+        if any(jaccard(signature, other) >= duplicate_similarity for other in signatures):
+            duplicates += 1
+            continue
+        signatures.append(signature)
+        kept.append((text, doc))
+
+    packed, used, over_budget = [], 0, 0
+    for text, doc in kept:
+        tokens = count_tokens(text)
+        if budget and used + tokens > budget:
+            over_budget += 1
+            continue
+        used += tokens
+        packed.append(Document(page_content=text, metadata=dict(doc.metadata)))
+
+    return packed, {
+        "chunks_in": len(docs),
+        "merged": len(docs) - len(merged),
+        "duplicates": duplicates,
+        "over_budget": over_budget,
+        "chunks_out": len(packed),
+        "tokens_before": tokens_before,
+        "tokens_after": used,
+        "budget": budget,
+    }
@@ -1,11 +1,18 @@
 import os
 import json
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import re
 
 TRACK_FILE = "ingested_files.json"
+MANIFEST_VERSION = 2
 TYPE_MAP = {"annual": "annual_report", "announcements": "announcement", "concall": "concall"}
+# Size of the recursive splitter chunks (CHUNKER=recursive); files embedded before the manifest
+# recorded a chunker were split that way.
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+LEGACY_CHUNKER = f"recursive-{CHUNK_SIZE}-{CHUNK_OVERLAP}"
 
 def load_ingested():
     if os.path.exists(TRACK_FILE):
@@ -24,48 +31,203 @@ def extract_year(file_name):
     match = re.search(r"\d{4}", file_name)
     return int(match.group()) if match else None
 
+def fiscal_year_metadata(source):
+    """
+    {"fy": 2026} for a report about FY26 (document_period), which is what period filters
+    match on; "year" is only the calendar year in the file name. Empty when the name has no date.
+    """
+    from utils.metric_extractor import document_period
+
+    fy, _ = document_period(source)
+    return {"fy": 2000 + fy} if fy is not None else {}
+
 def save_ingested(data):
-    with open(TRACK_FILE, "w") as f:
+    tmp_file = TRACK_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp_file, TRACK_FILE)
+
+def load_manifest():
+    """
+    Loads the ingestion manifest: {"version": 2, "files": {"<stock>/<folder>/<file>": record}}.
+
+    The old format ({stock: {doc_type: [file, ...]}}) is returned under "legacy" so that
+    plan_ingest can adopt those files by hash instead of re-embedding them.
+    """
+    data = load_ingested()
+    if data.get("version") == MANIFEST_VERSION:
+        data.setdefault("files", {})
+        return data
+    return {"version": MANIFEST_VERSION, "files": {}, "legacy": data}
 
-def load_new_pdfs(base_dir="./reports"):
-    ingested = load_ingested()
-    new_chunks = []
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
+def save_manifest(manifest):
+    save_ingested({"version": MANIFEST_VERSION, "files": manifest["files"]})
 
+def file_digest(path, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def scan_reports(base_dir="./reports"):
+    """
+    Yields a record for every PDF under base_dir/<stock>/<folder> using only directory metadata.
+    """
     for stock in os.listdir(base_dir):
         stock_path = os.path.join(base_dir, stock)
         if not os.path.isdir(stock_path):
             continue
 
-        ingested.setdefault(stock, {})
-
         for folder in os.listdir(stock_path):
             folder_path = os.path.join(stock_path, folder)
             if not os.path.isdir(folder_path):
                 continue
 
             doc_type = TYPE_MAP.get(folder.lower(), folder.lower())
-            ingested[stock].setdefault(doc_type, [])
 
-            for file in os.listdir(folder_path):
-                if not file.endswith(".pdf") or file in ingested[stock][doc_type]:
-                    continue
-
-                loader = PyPDFLoader(os.path.join(folder_path, file))
-                pages = loader.load()
-                chunks = splitter.split_documents(pages)
-                print(f"For {stock} Report Type {doc_type} and file {file} is embeded!")
-                for chunk in chunks:
-                    chunk.metadata = {
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".pdf") or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    yield {
+                        "key": f"{stock}/{folder}/{entry.name}",
                         "stock": stock,
                         "type": doc_type,
-                        "source": file,
-                        "year": extract_year(file)
+                        "source": entry.name,
+                        "path": entry.path,
+                        "size": stat.st_size,
+                        "mtime": stat.st_mtime,
                     }
-                    new_chunks.append(chunk)
 
-                ingested[stock][doc_type].append(file)
+def plan_ingest(manifest, base_dir="./reports"):
+    """
+    Compares the reports tree against the manifest and returns (to_embed, to_remove).
+
+    Files whose size and mtime match the manifest are skipped without being opened.
+    Otherwise the file is hashed; identical content only refreshes the manifest record,
+    changed content is returned in to_embed with "replaces" set so its old vectors are dropped.
+    Files chunked with a different chunker (CHUNKER, chunk sizes) are re-embedded the same way.
+    Manifest records with no file on disk are returned in to_remove.
+    """
+    from common.chunking import chunker_id
+
+    chunker = chunker_id(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    files = manifest["files"]
+    legacy = manifest.pop("legacy", {})
+    seen = set()
+    to_embed = []
+
+    for record in scan_reports(base_dir):
+        key = record.pop("key")
+        seen.add(key)
+        known = files.get(key)
+
+        same_chunker = known and known.get("chunker", LEGACY_CHUNKER) == chunker
+        if same_chunker and known["size"] == record["size"] and known["mtime"] == record["mtime"]:
+            continue
+
+        record["sha256"] = file_digest(record["path"])
+        record["chunker"] = chunker
+        legacy_files = legacy.get(record["stock"], {}).get(record["type"], [])
+
+        if same_chunker and known["sha256"] == record["sha256"]:
+            files[key] = record
+        elif not known and record["source"] in legacy_files and chunker == LEGACY_CHUNKER:
+            # Embedded by the filename-only tracker; trust it and start tracking its hash.
+            files[key] = record
+        else:
+            record["key"] = key
+            record["replaces"] = bool(known) or record["source"] in legacy_files
+            to_embed.append(record)
+
+    to_remove = [dict(record, key=key) for key, record in files.items() if key not in seen]
+    # Legacy names still on disk are either adopted into `files` or re-embedded (replaces=True)
+    # above; only the ones that are gone are removed.
+    tracked = {(r["stock"], r["type"], r["source"]) for r in [*files.values(), *to_embed]}
+    for stock, doc_types in legacy.items():
+        for doc_type, names in doc_types.items():
+            for name in names:
+                if (stock, doc_type, name) not in tracked:
+                    to_remove.append({"key": None, "stock": stock, "type": doc_type, "source": name})
+
+    return to_embed, to_remove
+
+def chunk_ids(record, count):
+    """
+    Ids for a file's chunks, derived from the file, so embedding it again after an interrupted
+    ingest overwrites its chunks instead of adding a second copy.
+    """
+    base = hashlib.sha1(f"{record['stock']}/{record['type']}/{record['source']}".encode("utf-8")).hexdigest()[:16]
+    return [f"{base}-{i}" for i in range(count)]
+
+def source_filter(record):
+    return {
+        "$and": [
+            {"stock": {"$eq": record["stock"]}},
+            {"type": {"$eq": record["type"]}},
+            {"source": {"$eq": record["source"]}}
+        ]
+    }
+
+def split_pdf(record, page_workers=1):
+    """
+    Parses and splits a single PDF and extracts its financial metrics. Kept at module level
+    so it can run inside a process pool. page_workers > 1 (or None) parses the pages themselves in parallel.
+    Returns (record, chunks, metrics, seconds_taken).
+    """
+    from common.chunking import split_pages, CHUNK_METADATA
+    from common.pdf_text import load_pages
+    from utils.metric_extractor import extract_metrics
+
+    start = time.perf_counter()
+    pages = load_pages(record["path"], workers=page_workers)
+    chunks = split_pages(pages, doc_type=record["type"], chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    fy = fiscal_year_metadata(record["source"])
+    for chunk in chunks:
+        chunk.metadata = {
+            **{k: chunk.metadata[k] for k in CHUNK_METADATA if k in chunk.metadata},
+            "stock": record["stock"],
+            "type": record["type"],
+            "source": record["source"],
+            "year": extract_year(record["source"]),
+            **fy
+        }
+    metrics = extract_metrics(pages, record)
+    return record, chunks, metrics, time.perf_counter() - start
+
+def iter_pdf_chunks(records, workers=1, page_workers=None):
+    """
+    Yields (record, chunks, metrics) for each PDF record. With workers != 1 the files are parsed
+    across a process pool and yielded as soon as each one is done, so the caller can
+    upsert while the rest are still parsing. With workers == 1 each file's pages are parsed
+    across page_workers processes instead (None: one per CPU). Either way a file that fails to parse is logged
+    and skipped (it stays out of the manifest and is retried by the next ingest).
+    """
+    if not records:
+        return
+
+    started = time.perf_counter()
+    if workers == 1:
+        for record in records:
+            try:
+                record, chunks, metrics, took = split_pdf(record, page_workers=page_workers)
+            except Exception as e:
+                print("Error parsing PDF:", e)
+                continue
+            print(f"📄 {record['key']}: {len(chunks)} chunks, {len(metrics)} metrics parsed in {took:.2f}s")
+            yield record, chunks, metrics
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(split_pdf, record) for record in records]
+            for future in as_completed(futures):
+                try:
+                    record, chunks, metrics, took = future.result()
+                except Exception as e:
+                    print("Error parsing PDF:", e)
+                    continue
+                print(f"📄 {record['key']}: {len(chunks)} chunks, {len(metrics)} metrics parsed in {took:.2f}s")
+                yield record, chunks, metrics
 
-    save_ingested(ingested)
-    return new_chunks
\ No newline at end of file
+    print(f"⏱️ Parsed {len(records)} files in {time.perf_counter() - started:.2f}s")
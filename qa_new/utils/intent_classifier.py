@@ -1,7 +1,70 @@
-import google.generativeai as genai
+import os
+import re
+import json
+import time
+from common.llm import get_backend
 
-def get_doc_types(query: str) -> list[str]:
-    prompt = f"""
+# Shared with every other user of this model, so its gRPC clients are created once per process.
+classifier_model = get_backend("models/gemini-2.5-flash")
+
+DOC_TYPES = ("annual_report", "concall", "announcement")
+INTENT_LOG_FILE = "intent_log.jsonl"
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_LOCAL_THRESHOLD", "0.66"))
+
+# (pattern, weight) per doc type, mirroring the descriptions in the LLM prompt.
+# Weight 2 is for phrases that name the document or event outright.
+KEYWORD_RULES = {
+    "annual_report": [
+        (r"\bannual report|\byearly\b|\bbalance sheet|\bcash ?flow|\besg\b|\bsustainability|\bbusiness model", 2),
+        (r"\brevenue|\bnet profit|\bprofit\b|\bpat\b|\bfinancial performance|\bcapital expenditure|\bcapex\b", 1),
+        (r"\beps\b|\bearnings per share|\bsegment|\bheadcount|\bemployees|\bdebt\b|\breserves|\bfy ?\d{2,4}\b", 1),
+    ],
+    "concall": [
+        (r"\bconcall|\bearnings call|\bconference call|\bmanagement (?:said|commentary|discussion)|\bguidance\b", 2),
+        (r"\bstrategy|\boutlook|\bsentiment|\bplans?\b|\bmargins?\b|\binvestments?\b|\bhiring|\bcommentary", 1),
+        (r"\bdemand\b|\bdeal wins?|\bpipeline|\btcv\b|\battrition|\bgrow(?:th|ing)?\b|\bq[1-4]\b|\bquarter", 1),
+    ],
+    "announcement": [
+        (r"\bdividend|\bboard meeting|\bacqui(?:re|sition)|\bmerger|\bpress release|\bannouncement|\bbuy ?back|\brecord date", 2),
+        (r"\bnew projects?|\bleadership|\bappoint|\bresign|\bceo\b|\bcfo\b|\bexpansion|\bcompliance|\bfilings?\b", 1),
+        (r"\bagm\b|\bpartnership|\blaunch(?:ed|es)?\b|\border win|\bcontract\b|\bregulat", 1),
+    ],
+}
+COMPILED_RULES = {
+    doc_type: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+    for doc_type, rules in KEYWORD_RULES.items()
+}
+
+def classify_local(query: str) -> tuple[list[str], float]:
+    """
+    Keyword classifier used before falling back to the LLM.
+    Returns (doc_types, confidence); confidence grows with the total matched weight.
+    """
+    scores = {}
+    for doc_type, rules in COMPILED_RULES.items():
+        score = sum(weight for pattern, weight in rules if pattern.search(query))
+        if score:
+            scores[doc_type] = score
+
+    if not scores:
+        return [], 0.0
+
+    total = sum(scores.values())
+    top = max(scores.values())
+    # Drop labels that only picked up a stray weak keyword next to a clear winner.
+    labels = [d for d in DOC_TYPES if d in scores and (scores[d] >= 2 or scores[d] * 2 >= top)]
+    return labels, min(1.0, total / 3)
+
+def log_llm_label(query, doc_types, latency):
+    """Appends LLM-labelled queries for benchmarking and re-tuning the local rules."""
+    try:
+        with open(INTENT_LOG_FILE, "a") as f:
+            f.write(json.dumps({"query": query, "doc_types": doc_types, "latency": latency}) + "\n")
+    except OSError as e:
+        print("Error logging intent:", e)
+
+def build_prompt(query: str) -> str:
+    return f"""
     You are a smart multi-label document classifier for financial queries.
     Your task is to determine which types of company documents are relevant to answer the user's question.
 
@@ -15,12 +78,37 @@ def get_doc_types(query: str) -> list[str]:
     It might be only annual or annual and concall or all the three etc.
     ---
 
-    **Query:**  
+    **Query:**
     "{query}"
 
     ---
 
     Return only relevant document types in lowercase and comma-separated.
     """
-    response = genai.GenerativeModel("models/gemini-2.5-flash").generate_content(prompt)
-    return [d.strip() for d in response.text.strip().split(",")]
\ No newline at end of file
+
+def parse_doc_types(text: str) -> list[str]:
+    return [d.strip() for d in text.strip().split(",")]
+
+def get_doc_types_llm(query: str) -> list[str]:
+    start = time.perf_counter()
+    doc_types = parse_doc_types(classifier_model.generate(build_prompt(query)))
+    log_llm_label(query, doc_types, time.perf_counter() - start)
+    return doc_types
+
+async def get_doc_types_llm_async(query: str) -> list[str]:
+    start = time.perf_counter()
+    doc_types = parse_doc_types(await classifier_model.agenerate(build_prompt(query)))
+    log_llm_label(query, doc_types, time.perf_counter() - start)
+    return doc_types
+
+def get_doc_types(query: str) -> list[str]:
+    doc_types, confidence = classify_local(query)
+    if confidence >= LOCAL_CONFIDENCE_THRESHOLD:
+        return doc_types
+    return get_doc_types_llm(query)
+
+async def get_doc_types_async(query: str) -> list[str]:
+    doc_types, confidence = classify_local(query)
+    if confidence >= LOCAL_CONFIDENCE_THRESHOLD:
+        return doc_types
+    return await get_doc_types_llm_async(query)
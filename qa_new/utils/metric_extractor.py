@@ -0,0 +1,264 @@
+import re
+from datetime import date
+
+# (metric, pattern, kind): kind "amount" needs a currency amount, "percent" a percentage.
+METRICS = [
+    ("ebitda_margin", r"\bebitda margins?\b", "percent"),
+    ("operating_margin", r"\b(?:operating|ebit) margins?\b", "percent"),
+    ("net_margin", r"\b(?:net|pat) margins?\b", "percent"),
+    ("ebitda", r"\bebitda\b(?!\s+margin)", "amount"),
+    ("pat", r"\b(?:net profit|profit after tax|pat\b(?!\s+margin)|net income)", "amount"),
+    ("eps", r"\b(?:eps|earnings per share)\b", "amount"),
+    ("order_book", r"\border (?:book|backlog|inflow)s?\b", "amount"),
+    ("tcv", r"\b(?:tcv|total contract value)\b", "amount"),
+    ("revenue", r"\b(?:revenues?|total income|turnover)\b(?!\s+growth)", "amount"),
+]
+COMPILED_METRICS = [(metric, re.compile(pattern, re.IGNORECASE), kind) for metric, pattern, kind in METRICS]
+METRIC_LABELS = {
+    "revenue": "Revenue", "pat": "Net Profit (PAT)", "ebitda": "EBITDA", "ebitda_margin": "EBITDA Margin",
+    "operating_margin": "Operating Margin", "net_margin": "Net Margin", "eps": "EPS",
+    "order_book": "Order Book", "tcv": "TCV",
+}
+
+SCALES = {
+    "crore": "crore", "crores": "crore", "cr": "crore", "lakh": "lakh", "lakhs": "lakh",
+    "mn": "million", "million": "million", "bn": "billion", "billion": "billion", "trillion": "trillion",
+}
+AMOUNT_PATTERN = re.compile(
+    r"(?P<currency>₹|rs\.?|inr|us\s?\$|\$|usd)\s?(?P<number>\d[\d,]*(?:\.\d+)?)(?:\s?(?P<scale>crores?|cr\b|lakhs?|mn\b|million|bn\b|billion|trillion))?"
+    r"|(?P<bare>\d[\d,]*(?:\.\d+)?)\s?(?P<inr_scale>crores?|cr\b|lakhs?)",
+    re.IGNORECASE
+)
+PERCENT_PATTERN = re.compile(r"(?P<number>\d+(?:\.\d+)?)\s?%")
+# A value right after one of these words is a change, not the metric itself ("grew 5.1%").
+CHANGE_WORDS = re.compile(
+    r"\b(?:grew|growth|grow(?:ing|s)?|declined?|increased?|decreased?|up|down|rose|fell|expanded|contracted)(?:\s+(?:by|of))?\s*$",
+    re.IGNORECASE
+)
+# A value right after one of these words is a bound or an estimate, not an exact figure ("over US $30 billion").
+QUALIFIERS = re.compile(
+    r"(?<!\w)(?P<qualifier>over|above|more than|upwards of|in excess of|under|below|less than|nearly|almost|close to|"
+    r"about|around|roughly|approx(?:imately|\.)?|~)\s*$",
+    re.IGNORECASE
+)
+QUALIFIER_NAMES = {"approx.": "approx", "approximately": "approx", "~": "approx"}
+
+QUARTER_PATTERN = re.compile(r"\bq\s?([1-4])\s?(?:fy\s?'?\s?(\d{4}|\d{2}))?\b", re.IGNORECASE)
+FY_PATTERN = re.compile(r"\b(?:fy|financial year|fiscal(?: year)?)\s?'?\s?(\d{4}|\d{2})(?:\s?[-/]\s?(\d{4}|\d{2}))?\b", re.IGNORECASE)
+YEAR_ENDED_PATTERN = re.compile(
+    r"\byear end(?:ed|ing)\s+(?:on\s+)?(?:31(?:st)?\s+march|march\s+31(?:st)?),?\s+(\d{4})\b", re.IGNORECASE
+)
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z₹$\"'])")
+MAX_DISTANCE = 120
+# Sentences about one segment ("North America TCV reached $6.8 billion") or about the future
+# ("aspiration ... margins closer to 26%") are not company-level facts for the period.
+SEGMENT_WORDS = re.compile(
+    r"\b(?:north america|latin america|uk|europe|continental europe|india|middle east|africa|mea|asia[- ]pacific|apac|"
+    r"regional markets|emerging markets|bfsi|banking|financial services|insurance|consumer business(?: group)?|cbg|"
+    r"retail|cpg|manufacturing|life sciences|healthcare|technology (?:and|&) services|hi-?tech|communications|"
+    r"media|energy|utilities|segments?|verticals?|geograph(?:y|ies)|business units?|divisions?)\b",
+    re.IGNORECASE
+)
+FORWARD_WORDS = re.compile(
+    r"\b(?:aspir(?:e|es|ation|ations|ational)|targets?|targeting|guidance|guided?|outlook|expect(?:s|ed|ing|ations?)?|"
+    r"anticipate[sd]?|forecast|aim(?:s|ing)?|goal|plan(?:s|ned)? to|going forward|will be|would be|should be|"
+    r"getting closer to|in the (?:medium|long)[- ]term|next (?:year|quarter))\b",
+    re.IGNORECASE
+)
+
+def fiscal_year(text):
+    """'2025' / '25' -> 25. FY2024-25 is passed as its end year."""
+    return int(text[-2:])
+
+def period_label(fy, quarter=None):
+    return f"Q{quarter}FY{fy:02d}" if quarter else f"FY{fy:02d}"
+
+def period_key(label):
+    """Sort key: FY24 < Q1FY25 < ... < Q4FY25 < FY25."""
+    match = re.match(r"(?:Q(\d))?FY(\d+)", label)
+    quarter, fy = match.groups()
+    return int(fy), int(quarter) if quarter else 5
+
+def document_period(source, doc_type=None):
+    """
+    (fy, quarter) a report is about, from its file name: Q4_2025.pdf -> (25, 4),
+    AnnualReport2024.pdf -> (24, None), M6Y2025D20.pdf (20 Jun 2025) -> (26, 1).
+    """
+    match = re.search(r"M(\d{1,2})Y(\d{4})D(\d{1,2})", source, re.IGNORECASE)
+    if match:
+        month, year = int(match.group(1)), int(match.group(2))
+        fy = year + 1 if month >= 4 else year
+        return fy % 100, (month - 4) % 12 // 3 + 1
+
+    match = re.search(r"Q([1-4])[_\- ]?(?:FY)?'?(\d{4}|\d{2})", source, re.IGNORECASE)
+    if match:
+        return fiscal_year(match.group(2)), int(match.group(1))
+
+    match = re.search(r"(\d{4})", source)
+    if match:
+        return fiscal_year(match.group(1)), None
+    return None, None
+
+def sentence_period(sentence, default_fy, default_quarter):
+    quarter = QUARTER_PATTERN.search(sentence)
+    if quarter:
+        fy = fiscal_year(quarter.group(2)) if quarter.group(2) else default_fy
+        return period_label(fy, int(quarter.group(1))) if fy else None
+
+    fy = FY_PATTERN.search(sentence)
+    if fy:
+        return period_label(fiscal_year(fy.group(2) or fy.group(1)))
+    year_ended = YEAR_ENDED_PATTERN.search(sentence)
+    if year_ended:
+        return period_label(fiscal_year(year_ended.group(1)))
+    if re.search(r"\b(?:for the (?:full )?year|full[- ]year|annual)\b", sentence, re.IGNORECASE) and default_fy:
+        return period_label(default_fy)
+    if default_fy:
+        return period_label(default_fy, default_quarter)
+    return None
+
+def _number(text):
+    return float(text.replace(",", ""))
+
+def find_value(sentence, start, kind):
+    """
+    First value of the right kind within MAX_DISTANCE characters after the metric mention:
+    (value, unit, matched text, characters between the mention and the value, qualifier).
+    The qualifier is the word that makes the value a bound or an estimate ("over", "approx"), or None.
+    """
+    window = sentence[start:start + MAX_DISTANCE]
+    pattern = PERCENT_PATTERN if kind == "percent" else AMOUNT_PATTERN
+    for match in pattern.finditer(window):
+        before = window[:match.start()][-25:]
+        if CHANGE_WORDS.search(before):
+            continue
+        qualifier = QUALIFIERS.search(before)
+        if qualifier:
+            qualifier = qualifier.group("qualifier").lower()
+            qualifier = QUALIFIER_NAMES.get(qualifier, qualifier)
+        if kind == "percent":
+            return _number(match.group("number")), "%", match.group(), match.start(), qualifier
+        if match.group("bare"):
+            unit = f"₹ {SCALES[match.group('inr_scale').lower()]}"
+            return _number(match.group("bare")), unit, match.group(), match.start(), qualifier
+        currency = "$" if "$" in match.group("currency") or match.group("currency").lower() == "usd" else "₹"
+        scale = SCALES.get((match.group("scale") or "").lower())
+        unit = f"{currency} {scale}" if scale else currency
+        return _number(match.group("number")), unit, match.group(), match.start(), qualifier
+    return None
+
+def has_scale(metric, unit):
+    """
+    True when the unit says how big the value is: a percentage or an amount in crore/lakh/mn/bn.
+    EPS is per share, so a bare currency is its scale.
+    """
+    return unit == "%" or " " in unit or metric == "eps"
+
+def has_explicit_period(sentence):
+    return bool(QUARTER_PATTERN.search(sentence) or FY_PATTERN.search(sentence) or YEAR_ENDED_PATTERN.search(sentence)
+                or re.search(r"\b(?:for the (?:full )?year|full[- ]year|for the quarter)\b", sentence, re.IGNORECASE))
+
+def confidence(sentence, distance, scaled, explicit_period, qualifier=None):
+    """
+    0..1 score of how likely a row is the company-level figure for its period: the value sits
+    right after the metric name, the sentence names the period itself, an amount carries its
+    scale (₹64,479 with no "crore" is ambiguous), the value is exact rather than "over" or
+    "approx", and the sentence is short.
+    """
+    score = 1.0 - 0.3 * min(distance, MAX_DISTANCE) / MAX_DISTANCE
+    if not explicit_period:
+        score -= 0.2
+    if not scaled:
+        score -= 0.2
+    if qualifier:
+        score -= 0.2
+    if len(sentence) > 250:
+        score -= 0.1
+    return round(max(score, 0.0), 3)
+
+def extract_metrics(pages, record):
+    """
+    Pulls (metric, period, value, unit) rows out of a report's pages with regex rules.
+    Each row also carries stock/type/source/page, the sentence it came from, the value's
+    qualifier ("over", "approx") and a confidence score. Sentences naming a segment or looking
+    forward are skipped.
+    """
+    default_fy, default_quarter = document_period(record["source"], record["type"])
+    rows = []
+    seen = set()
+    for page in pages:
+        text = " ".join(page.page_content.split())
+        for sentence in SENTENCE_SPLIT.split(text):
+            if SEGMENT_WORDS.search(sentence) or FORWARD_WORDS.search(sentence):
+                continue
+            for metric, pattern, kind in COMPILED_METRICS:
+                mention = pattern.search(sentence)
+                if not mention:
+                    continue
+                found = find_value(sentence, mention.end(), kind)
+                period = sentence_period(sentence, default_fy, default_quarter)
+                if not found or not period:
+                    continue
+                value, unit, raw, distance, qualifier = found
+                key = (metric, period, value, unit)
+                if key in seen:
+                    continue
+                seen.add(key)
+                rows.append({
+                    "stock": record["stock"],
+                    "metric": metric,
+                    "period": period,
+                    "value": value,
+                    "unit": unit,
+                    "qualifier": qualifier,
+                    "type": record["type"],
+                    "source": record["source"],
+                    "page": page.metadata.get("page", 0) + 1,
+                    "text": sentence[:300],
+                    "confidence": confidence(
+                        sentence, distance, has_scale(metric, unit), has_explicit_period(sentence), qualifier
+                    ),
+                })
+    return rows
+
+# Questions that need explanation rather than a number stay on the LLM path.
+NARRATIVE = re.compile(
+    r"\b(?:why|how|explain|reason|strategy|strategic|outlook|guidance|plans?|commentary|driv(?:e|ers?|ing)|impact|sentiment|compare|summar)",
+    re.IGNORECASE
+)
+LAST_YEARS = re.compile(r"\blast\s+(\d+|two|three|four|five)\s+(?:financial\s+|fiscal\s+)?years\b", re.IGNORECASE)
+WORD_NUMBERS = {"two": 2, "three": 3, "four": 4, "five": 5}
+
+def current_fy(today=None):
+    today = today or date.today()
+    return (today.year + 1 if today.month >= 4 else today.year) % 100
+
+def parse_metric_query(query, today=None):
+    """
+    Recognises direct metric lookups ("What was TCS revenue in FY24?", "net margin trend").
+    Returns {"metrics", "periods", "last_years"} or None for anything narrative.
+    periods is None for "every period" (trend questions).
+    """
+    if NARRATIVE.search(query):
+        return None
+    metrics = []
+    for metric, pattern, _ in COMPILED_METRICS:
+        if pattern.search(query) and metric not in metrics:
+            metrics.append(metric)
+    if not metrics:
+        return None
+
+    periods = []
+    for match in QUARTER_PATTERN.finditer(query):
+        if match.group(2):
+            periods.append(period_label(fiscal_year(match.group(2)), int(match.group(1))))
+    for match in FY_PATTERN.finditer(QUARTER_PATTERN.sub(" ", query)):
+        periods.append(period_label(fiscal_year(match.group(2) or match.group(1))))
+    if re.search(r"\blast (?:financial |fiscal )?year\b", query, re.IGNORECASE):
+        periods.append(period_label(current_fy(today) - 1))
+
+    last_years = LAST_YEARS.search(query)
+    if last_years:
+        count = last_years.group(1).lower()
+        return {"metrics": metrics, "periods": None, "last_years": WORD_NUMBERS.get(count) or int(count)}
+    return {"metrics": metrics, "periods": periods or None, "last_years": None}
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import threading
+from utils.sparse_index import matches
+from utils.metric_extractor import period_key
+
+METRICS_TABLE_FILE = "metrics_table.json"
+# Version 2 added the confidence column, version 3 the qualifier ("over", "approx") column;
+# older tables are re-extracted by the next ingest.
+METRICS_TABLE_VERSION = 3
+COLUMNS = ("stock", "metric", "period", "value", "unit", "qualifier", "type", "source", "page", "text", "confidence")
+# When several reports state the same metric for the same period, prefer the audited one.
+TYPE_PRIORITY = {"annual_report": 0, "concall": 1, "announcement": 2}
+
+class MetricsTable:
+    """
+    Columnar table of extracted financial metrics (one list per column), written by ingest.py
+    and read by /chat for direct metric lookups. The server reloads it when the file changes.
+    """
+
+    def __init__(self, path=METRICS_TABLE_FILE, reload_interval=5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.columns = {name: [] for name in COLUMNS}
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+
+    def __len__(self):
+        return len(self.columns["stock"])
+
+    def _row(self, i):
+        return {name: self.columns[name][i] for name in COLUMNS}
+
+    def add(self, rows):
+        with self._lock:
+            for row in rows:
+                for name in COLUMNS:
+                    self.columns[name].append(row.get(name))
+
+    def delete(self, where):
+        with self._lock:
+            keep = [i for i in range(len(self)) if not matches(self._row(i), where)]
+            removed = len(self) - len(keep)
+            self.columns = {name: [values[i] for i in keep] for name, values in self.columns.items()}
+        return removed
+
+    def lookup(self, stock, metrics, periods=None):
+        """
+        One row per (metric, period) for the stock, oldest period first. periods=None returns
+        every period on record (trend questions).
+        """
+        self.refresh()
+        with self._lock:
+            stocks, names, labels = self.columns["stock"], self.columns["metric"], self.columns["period"]
+            hits = [
+                i for i in range(len(self))
+                if stocks[i] == stock and names[i] in metrics and (periods is None or labels[i] in periods)
+            ]
+            best = {}
+            for i in hits:
+                key = (names[i], labels[i])
+                rank = (-(self.columns["confidence"][i] or 0.0), TYPE_PRIORITY.get(self.columns["type"][i], 9), i)
+                if key not in best or rank < best[key][0]:
+                    best[key] = (rank, i)
+            rows = [self._row(i) for _, i in best.values()]
+        return sorted(rows, key=lambda row: (metrics.index(row["metric"]), period_key(row["period"])))
+
+    def save(self):
+        with self._lock:
+            data = {"version": METRICS_TABLE_VERSION, "columns": self.columns}
+            tmp_file = self.path + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_file, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+    def is_current(self):
+        """False when the file is missing or was written by an older METRICS_TABLE_VERSION."""
+        try:
+            with open(self.path) as f:
+                return json.load(f).get("version") == METRICS_TABLE_VERSION
+        except (OSError, json.JSONDecodeError):
+            return False
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            data = {}
+        with self._lock:
+            if data.get("version") == METRICS_TABLE_VERSION:
+                self.columns = {name: data["columns"].get(name, []) for name in COLUMNS}
+            else:
+                self.columns = {name: [] for name in COLUMNS}
+        return self
+
+    def refresh(self):
+        """Reloads the table if ingest.py has rewritten the file since the last check."""
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self._mtime = mtime
+            self.load()
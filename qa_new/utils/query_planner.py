@@ -0,0 +1,96 @@
+import os
+import re
+from utils.metric_extractor import QUARTER_PATTERN, FY_PATTERN, WORD_NUMBERS, current_fy, fiscal_year, period_label
+
+# Questions spanning more periods than this keep the most recent ones.
+MAX_PERIODS = int(os.getenv("QUERY_MAX_PERIODS", "5"))
+LAST_YEARS = re.compile(r"\b(?:last|past|previous)\s+(\d+|two|three|four|five)\s+(?:financial\s+|fiscal\s+)?years\b", re.IGNORECASE)
+LAST_YEAR = re.compile(r"\b(?:last|previous|prior)\s+(?:financial\s+|fiscal\s+)?year\b", re.IGNORECASE)
+THIS_YEAR = re.compile(r"\b(?:this|current)\s+(?:financial\s+|fiscal\s+)?year\b", re.IGNORECASE)
+# A bare year ("in 2024"), not part of an amount or an id.
+CALENDAR_YEAR = re.compile(r"(?<![\w₹$.,/-])(20\d{2})(?![\w%/-])")
+
+def plan_periods(query, available_fys=None, today=None):
+    """
+    Splits the time expressions of a question ("Q3 FY25", "FY2023-24", "in 2024", "last year",
+    "last 3 years") into the periods to retrieve for separately, oldest first:
+    [{"label": "FY24", "fy": 2024}, ...]. `fy` is the chunk metadata value the period filters
+    on: the fiscal year (ending March) ingest reads from the report's file name with
+    document_period, so an M6Y2025D20 announcement is FY2026. A bare "2024" is read as FY24.
+
+    `available_fys` (the fiscal years a shard has chunks for) resolves "last N years" to the
+    latest N years on record and drops periods with nothing to retrieve. Returns [] when the
+    question names no period, and the caller retrieves as before.
+    """
+    labels = {}
+
+    def add(fy, label):
+        labels.setdefault(2000 + fy, [])
+        if label not in labels[2000 + fy]:
+            labels[2000 + fy].append(label)
+
+    for match in QUARTER_PATTERN.finditer(query):
+        if match.group(2):
+            fy = fiscal_year(match.group(2))
+            add(fy, period_label(fy, int(match.group(1))))
+    without_quarters = QUARTER_PATTERN.sub(" ", query)
+    for match in FY_PATTERN.finditer(without_quarters):
+        fy = fiscal_year(match.group(2) or match.group(1))
+        add(fy, period_label(fy))
+    for match in CALENDAR_YEAR.finditer(FY_PATTERN.sub(" ", without_quarters)):
+        fy = fiscal_year(match.group(1))
+        add(fy, period_label(fy))
+    if LAST_YEAR.search(query):
+        add(current_fy(today) - 1, period_label(current_fy(today) - 1))
+    if THIS_YEAR.search(query):
+        add(current_fy(today), period_label(current_fy(today)))
+
+    last_years = LAST_YEARS.search(query)
+    if last_years:
+        count = WORD_NUMBERS.get(last_years.group(1).lower()) or int(last_years.group(1))
+        if available_fys:
+            fys = [fy % 100 for fy in sorted(available_fys)[-count:]]
+        else:
+            latest = current_fy(today) - 1
+            fys = range(latest - count + 1, latest + 1)
+        for fy in fys:
+            add(fy, period_label(fy))
+
+    fys = sorted(fy for fy in labels if available_fys is None or fy in available_fys)
+    return [
+        {"label": labels[fy][0] if len(labels[fy]) == 1 else period_label(fy % 100), "fy": fy}
+        for fy in fys[-MAX_PERIODS:]
+    ]
+
+def period_filter(filters, fy):
+    """`filters` narrowed to one period: the fiscal year goes into the vector store's where clause."""
+    clause = {"fy": {"$eq": fy}}
+    if not filters:
+        return clause
+    if list(filters) == ["$and"]:
+        return {"$and": filters["$and"] + [clause]}
+    return {"$and": [filters, clause]}
+
+def merge_by_period(rankings, limit):
+    """
+    Merges one ranking per period (best first) into at most `limit` documents, taking each
+    period's next best in turn, so every period gets an equal share and the one with the most
+    chunks cannot crowd out the others. Shares a short period cannot fill go to the rest;
+    the most recent periods get the remainder. Duplicates are matched like in RRF.
+    """
+    merged = []
+    seen = set()
+    rankings = [list(ranking) for ranking in reversed(rankings)]
+    for rank in range(max((len(ranking) for ranking in rankings), default=0)):
+        for ranking in rankings:
+            if rank >= len(ranking):
+                continue
+            doc = ranking[rank]
+            key = (doc.metadata.get("source"), doc.page_content)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(doc)
+            if len(merged) == limit:
+                return merged
+    return merged
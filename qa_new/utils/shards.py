@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from utils.sparse_index import SparseIndex, SPARSE_INDEX_FILE
+
+SHARDS_DIR = os.getenv("SHARDS_DIR", "./chroma_shards")
+MAX_OPEN_SHARDS = int(os.getenv("MAX_OPEN_SHARDS", "32"))
+LEGACY_DB_DIR = "./chroma_db"
+# Sits in SHARDS_DIR while ./chroma_db is being split; a split that failed partway leaves it
+# behind and the next ingest runs it again.
+MIGRATING_MARKER = ".migrating"
+# Per-shard facts recorded at ingest, e.g. {"embedding_model": "models/embedding-001"}: the
+# model the shard's vectors were built with, which snapshots export and ingest checks.
+SHARD_INFO_FILE = "shard.json"
+# "chroma" serves dense retrieval from each shard's Chroma collection; "faiss" from the
+# read-only, memory-mapped FAISS build ingest writes next to it (<shard>/faiss).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+def shard_name(stock):
+    """
+    Directory-safe shard name for a ticker ("M&M" -> "M_M"). Raises ValueError for names that
+    would not be a directory of their own under SHARDS_DIR ("", ".", "..").
+    """
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", stock.upper())
+    if not name.strip("."):
+        raise ValueError(f"Invalid stock name {stock!r}")
+    return name
+
+def shard_dir(stock, base_dir=SHARDS_DIR):
+    return os.path.join(base_dir, shard_name(stock))
+
+def read_shard_info(path):
+    try:
+        with open(os.path.join(path, SHARD_INFO_FILE)) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def write_shard_info(path, **info):
+    info = {**read_shard_info(path), **info}
+    tmp_file = os.path.join(path, SHARD_INFO_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp_file, os.path.join(path, SHARD_INFO_FILE))
+
+def list_shards(base_dir=SHARDS_DIR):
+    if not os.path.isdir(base_dir):
+        return []
+    return sorted(name for name in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, name)))
+
+class Shard:
+    """
+    One stock's vector store and the BM25 index over the same chunks. The vector store is the
+    Chroma collection, or its FAISS build for backend="faiss" (Chroma until one is built,
+    then the build, once refresh() sees it).
+    """
+
+    def __init__(self, stock, embedding_function, base_dir=SHARDS_DIR, backend="chroma", reload_interval=5.0):
+        self.stock = stock
+        self.path = shard_dir(stock, base_dir)
+        os.makedirs(self.path, exist_ok=True)
+        self.embedding_function = embedding_function
+        self.wanted_backend = backend
+        self.reload_interval = reload_interval
+        self._checked = time.monotonic()
+        self.backend = "chroma"
+        self.chroma = None
+        if backend != "faiss" or not self._open_faiss():
+            if backend == "faiss":
+                print(f"⚠️ {stock}: no FAISS index in {self.path}, serving from Chroma")
+            from langchain_community.vectorstores import Chroma
+
+            self.chroma = Chroma(persist_directory=self.path, embedding_function=embedding_function)
+            self.vectorstore = self.chroma
+        self.sparse = SparseIndex(path=os.path.join(self.path, SPARSE_INDEX_FILE))
+        # Requests currently using the shard, and whether the pool has dropped it (ShardPool.use).
+        self.users = 0
+        self.evicted = False
+
+    def _open_faiss(self):
+        from common.faiss_store import FaissStore, FAISS_DIR, current_build
+
+        faiss_path = os.path.join(self.path, FAISS_DIR)
+        if not current_build(faiss_path):
+            return False
+        self.vectorstore = FaissStore(faiss_path, embedding_function=self.embedding_function)
+        self.backend = "faiss"
+        return True
+
+    def refresh(self):
+        """
+        With backend="faiss", switches from Chroma to the FAISS build once ingest has published
+        one. Checked at most every reload_interval seconds; requests already holding the Chroma
+        store finish on it.
+        """
+        if self.backend == self.wanted_backend:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        if self._open_faiss():
+            print(f"✅ {self.stock}: FAISS index published, serving from it")
+
+    def close(self):
+        """
+        Releases the Chroma client. chromadb keeps one System (sqlite connections, segment
+        caches) per persist directory alive until the last client on it is closed.
+        """
+        client = getattr(self.chroma, "_client", None)
+        if client is not None and hasattr(client, "close"):
+            client.close()
+
+class ShardPool:
+    """
+    Bounded LRU of open shards. A stock's shard is opened on first use and the least recently
+    used one is dropped once more than `max_open` are open, so memory and file handles stay
+    flat however many tickers are ingested. A dropped shard is closed once the requests
+    still using it are done.
+    """
+
+    def __init__(self, embedding_function, max_open=MAX_OPEN_SHARDS, base_dir=SHARDS_DIR, create=False,
+                 backend=VECTOR_BACKEND):
+        self.embedding_function = embedding_function
+        # Ingest writes through Chroma; only serving reads from FAISS.
+        self.backend = "chroma" if create else backend
+        self.max_open = max_open
+        self.base_dir = base_dir
+        self.create = create
+        self.opened = 0
+        self.evicted = 0
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+        self._opening = {}
+
+    def exists(self, stock):
+        try:
+            return os.path.isdir(shard_dir(stock, self.base_dir))
+        except ValueError:
+            return False
+
+    @contextmanager
+    def use(self, stock):
+        """
+        `with pool.use(stock) as shard:` holds the stock's Shard, opening it if needed, and
+        keeps it from being closed by an eviction until the block exits. Raises KeyError for
+        a stock with no shard unless the pool was created with create=True (ingest).
+        """
+        shard = self._acquire(stock)
+        try:
+            shard.refresh()
+            yield shard
+        finally:
+            self._release(shard)
+
+    def _acquire(self, stock):
+        key = shard_name(stock)
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard:
+                self._shards.move_to_end(key)
+                shard.users += 1
+                return shard
+            # Only one thread opens a given shard; others wait for it.
+            opening = self._opening.setdefault(key, threading.Lock())
+
+        with opening:
+            with self._lock:
+                shard = self._shards.get(key)
+                if shard:
+                    self._shards.move_to_end(key)
+                    shard.users += 1
+                    return shard
+            if not self.create and not self.exists(stock):
+                raise KeyError(stock)
+            shard = Shard(stock, self.embedding_function, self.base_dir, self.backend)
+            idle = []
+            with self._lock:
+                shard.users += 1
+                self._shards[key] = shard
+                self.opened += 1
+                while len(self._shards) > self.max_open:
+                    _, dropped = self._shards.popitem(last=False)
+                    dropped.evicted = True
+                    self.evicted += 1
+                    if not dropped.users:
+                        idle.append(dropped)
+                self._opening.pop(key, None)
+            for dropped in idle:
+                dropped.close()
+            return shard
+
+    def _release(self, shard):
+        with self._lock:
+            shard.users -= 1
+            idle = shard.evicted and not shard.users
+        if idle:
+            shard.close()
+
+    def stats(self):
+        with self._lock:
+            return {"open": len(self._shards), "max_open": self.max_open, "opened": self.opened, "evicted": self.evicted}
+
+def migrate_legacy_db(base_dir=SHARDS_DIR, legacy_dir=LEGACY_DB_DIR, batch_size=1000):
+    """
+    Splits the old single ./chroma_db collection into per-stock shards, reusing the stored
+    embeddings (nothing is re-embedded). Returns {stock: chunks_copied}. Runs when SHARDS_DIR
+    does not exist yet or holds MIGRATING_MARKER from a split that did not finish; chunks are
+    upserted by id, so running it again is safe.
+    """
+    import chromadb
+
+    marker = os.path.join(base_dir, MIGRATING_MARKER)
+    if os.path.isdir(base_dir) and not os.path.exists(marker):
+        return {}
+    if not os.path.isfile(os.path.join(legacy_dir, "chroma.sqlite3")):
+        return {}
+    os.makedirs(base_dir, exist_ok=True)
+    open(marker, "w").close()
+
+    legacy = chromadb.PersistentClient(path=legacy_dir)
+    copied = {}
+    targets = {}
+    for collection in legacy.list_collections():
+        collection = legacy.get_collection(getattr(collection, "name", collection))
+        for offset in range(0, collection.count(), batch_size):
+            batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            by_stock = {}
+            for i, metadata in enumerate(batch["metadatas"]):
+                by_stock.setdefault((metadata or {}).get("stock", "UNKNOWN"), []).append(i)
+
+            for stock, rows in by_stock.items():
+                if stock not in targets:
+                    os.makedirs(shard_dir(stock, base_dir), exist_ok=True)
+                    client = chromadb.PersistentClient(path=shard_dir(stock, base_dir))
+                    # Same collection name langchain's Chroma opens by default.
+                    targets[stock] = client.get_or_create_collection("langchain")
+                targets[stock].upsert(
+                    ids=[batch["ids"][i] for i in rows],
+                    embeddings=[batch["embeddings"][i] for i in rows],
+                    documents=[batch["documents"][i] for i in rows],
+                    metadatas=[batch["metadatas"][i] for i in rows]
+                )
+                copied[stock] = copied.get(stock, 0) + len(rows)
+    os.remove(marker)
+    return copied
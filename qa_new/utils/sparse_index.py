@@ -0,0 +1,274 @@
+import os
+import re
+import json
+import math
+import heapq
+import time
+import threading
+from collections import Counter, defaultdict
+from common.filters import matches
+
+SPARSE_INDEX_FILE = "bm25_index.json"
+SPARSE_INDEX_VERSION = 1
+# Cached filter results (one per distinct where clause) kept before the cache is reset.
+MAX_DERIVED = 256
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+what which who how did does do we our you your they their
+""".split())
+
+UNITS = {
+    "crore": "cr", "crores": "cr", "cr": "cr", "lakh": "lakh", "lakhs": "lakh",
+    "mn": "mn", "million": "mn", "bn": "bn", "billion": "bn",
+}
+
+# Order matters: the longer financial forms are consumed before the plain number/word fallbacks.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<currency>(?:₹|rs\.?|inr|\$|usd)\s?(?P<amount>\d[\d,]*(?:\.\d+)?)(?:\s?(?P<unit>crores?|cr|lakhs?|mn|million|bn|billion)\b)?)
+  | (?P<quarter>\bq(?P<q>[1-4])\s?'?(?:fy\s?'?(?P<qfy>\d{4}|\d{2}))?\b)
+  | (?P<fiscal>\bfy\s?'?(?P<fy>\d{4}|\d{2})(?:\s?[-/]\s?(?P<fyend>\d{4}|\d{2}))?\b)
+  | (?P<percent>(?P<pct>\d[\d,]*(?:\.\d+)?)\s?%)
+  | (?P<bps>(?P<bp>\d[\d,]*(?:\.\d+)?)\s?(?:bps|basis\s+points?)\b)
+  | (?P<number>(?P<num>\d[\d,]*(?:\.\d+)?)(?:\s?(?P<numunit>crores?|cr|lakhs?|mn|million|bn|billion)\b)?)
+  | (?P<word>[^\W\d_][\w&-]*)
+""", re.IGNORECASE | re.VERBOSE)
+
+def _number(text):
+    return text.replace(",", "").rstrip(".")
+
+def _year(text):
+    return text[-2:]
+
+def tokenize(text):
+    """
+    BM25 tokens for financial text. Amounts, percentages, bps and FY/quarter references stay
+    whole ("₹5,200 crore" -> "₹5200cr", "Q3 FY25" -> "q3fy25") and also emit their bare parts
+    ("5200", "q3", "fy25") so a query written without the unit or year still matches.
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        kind = match.lastgroup
+        if kind == "currency":
+            sign = "$" if match.group().startswith(("$", "usd")) else "₹"
+            amount, unit = _number(match.group("amount")), UNITS.get(match.group("unit") or "", "")
+            tokens += [f"{sign}{amount}{unit}", amount]
+            if unit:
+                tokens.append(f"{amount}{unit}")
+        elif kind == "quarter":
+            quarter = f"q{match.group('q')}"
+            tokens.append(quarter)
+            if match.group("qfy"):
+                fy = f"fy{_year(match.group('qfy'))}"
+                tokens += [fy, quarter + fy]
+        elif kind == "fiscal":
+            # FY2024-25 is the year ending in 25, like FY25.
+            tokens.append(f"fy{_year(match.group('fyend') or match.group('fy'))}")
+        elif kind == "percent":
+            tokens += [f"{_number(match.group('pct'))}%", _number(match.group("pct"))]
+        elif kind == "bps":
+            tokens += [f"{_number(match.group('bp'))}bps", _number(match.group("bp"))]
+        elif kind == "number":
+            number, unit = _number(match.group("num")), UNITS.get(match.group("numunit") or "", "")
+            tokens.append(number)
+            if unit:
+                tokens.append(f"{number}{unit}")
+        else:
+            word = match.group().strip("-&")
+            if word and word not in STOPWORDS:
+                tokens.append(word)
+    return tokens
+
+class SparseIndex:
+    """
+    BM25 index over the same chunks as ./chroma_db, keyed by their Chroma ids. ingest.py keeps it in sync and saves it to SPARSE_INDEX_FILE; the server
+    reloads it when the file changes, building the new index on a background thread while
+    searches keep using the old one.
+    """
+
+    def __init__(self, path=SPARSE_INDEX_FILE, k1=1.5, b=0.75, reload_interval=5.0):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.reload_interval = reload_interval
+        self.docs = {}
+        self._postings = defaultdict(dict)
+        self._total_length = 0
+        # Derived from self.docs (field values, filtered id sets); cleared on every change.
+        self._derived = {}
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self._loaded = False
+        self._reloading = False
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _index(self, doc_id, doc):
+        counts = Counter(tokenize(doc["text"]))
+        doc["length"] = sum(counts.values())
+        self.docs[doc_id] = doc
+        self._total_length += doc["length"]
+        for token, tf in counts.items():
+            self._postings[token][doc_id] = tf
+
+    def _unindex(self, doc_id):
+        doc = self.docs.pop(doc_id)
+        self._total_length -= doc["length"]
+        for token in set(tokenize(doc["text"])):
+            postings = self._postings.get(token)
+            if postings:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[token]
+
+    def add(self, ids, documents):
+        with self._lock:
+            self._derived = {}
+            for doc_id, document in zip(ids, documents):
+                if doc_id in self.docs:
+                    self._unindex(doc_id)
+                self._index(doc_id, {"text": document.page_content, "metadata": dict(document.metadata)})
+
+    def delete(self, where):
+        with self._lock:
+            doomed = [doc_id for doc_id, doc in self.docs.items() if matches(doc["metadata"], where)]
+            self._derived = {}
+            for doc_id in doomed:
+                self._unindex(doc_id)
+        return len(doomed)
+
+    def field_values(self, field):
+        """Distinct values of a metadata field across the indexed chunks (e.g. the years a shard covers)."""
+        self.refresh()
+        with self._lock:
+            values = self._derive(("values", field), lambda: {doc["metadata"].get(field) for doc in self.docs.values()})
+            return values - {None}
+
+    def _derive(self, key, compute):
+        if key not in self._derived:
+            if len(self._derived) >= MAX_DERIVED:
+                self._derived = {}
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    def _allowed(self, where):
+        """Ids of the chunks matching `where`, so a filtered search only scores those."""
+        return self._derive(("where", json.dumps(where, sort_keys=True)), lambda: {
+            doc_id for doc_id, doc in self.docs.items() if matches(doc["metadata"], where)
+        })
+
+    def search(self, query, k=20, where=None):
+        """
+        Returns up to k (doc_id, score, document) tuples, best first, restricted to `where`.
+        """
+        from langchain_core.documents import Document
+
+        self.refresh()
+        with self._lock:
+            if not self.docs:
+                return []
+            n = len(self.docs)
+            avg_length = self._total_length / n or 1.0
+            allowed = self._allowed(where) if where else None
+            scores = defaultdict(float)
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                # idf stays corpus-wide, so a filtered search ranks like the unfiltered one.
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                if allowed is None:
+                    items = postings.items()
+                elif len(allowed) < len(postings):
+                    items = ((doc_id, postings[doc_id]) for doc_id in allowed if doc_id in postings)
+                else:
+                    items = ((doc_id, tf) for doc_id, tf in postings.items() if doc_id in allowed)
+                for doc_id, tf in items:
+                    length = self.docs[doc_id]["length"]
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+
+            ranked = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [
+                (doc_id, score, Document(page_content=self.docs[doc_id]["text"], metadata=dict(self.docs[doc_id]["metadata"])))
+                for doc_id, score in ranked
+            ]
+
+    def save(self):
+        with self._lock:
+            data = {
+                "version": SPARSE_INDEX_VERSION,
+                "docs": {doc_id: {"text": d["text"], "metadata": d["metadata"]} for doc_id, d in self.docs.items()},
+            }
+        tmp_file = self.path + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_file, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def load(self):
+        """Reads SPARSE_INDEX_FILE into a new index and swaps it in whole; searches meanwhile use the old one."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            data = {}
+        fresh = SparseIndex(self.path, self.k1, self.b)
+        if data.get("version") == SPARSE_INDEX_VERSION:
+            for doc_id, doc in data["docs"].items():
+                fresh._index(doc_id, doc)
+        with self._lock:
+            self.docs, self._postings, self._total_length, self._derived = fresh.docs, fresh._postings, fresh._total_length, {}
+            self._loaded = True
+        return self
+
+    def refresh(self):
+        """
+        Reloads the index if ingest.py has rewritten the file since the last check. Only the
+        first load blocks the caller; later ones run on a background thread.
+        """
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        if not self._loaded:
+            self._mtime = mtime
+            self.load()
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        self._mtime = mtime
+        threading.Thread(target=self._reload, name="sparse-index-reload", daemon=True).start()
+
+    def _reload(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"⚠️ Reloading {self.path} failed: {e}")
+        finally:
+            with self._lock:
+                self._reloading = False
+
+def reciprocal_rank_fusion(rankings, k=60, limit=None):
+    """
+    Fuses ranked lists of Documents (best first) with RRF: score = sum(1 / (k + rank)).
+    Documents are matched by (source, text) since dense results do not always carry ids.
+    """
+    scores = defaultdict(float)
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = (doc.metadata.get("source"), doc.page_content)
+            scores[key] += 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in fused[:limit]]
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import bisect
+import threading
+
+# Path of a JSONL file for one structured record per request ("-" for stdout). Off when unset.
+REQUEST_LOG = os.getenv("QA_REQUEST_LOG")
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+def _value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Registry:
+    """
+    Minimal in-process Prometheus registry: counters and fixed-bucket histograms updated under
+    one lock (a few dict operations per observation), plus collectors that are only called
+    when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * (len(buckets) + 1), "sum": 0.0}
+            histogram["counts"][bisect.bisect_left(histogram["buckets"], value)] += 1
+            histogram["sum"] += value
+
+    def add_collector(self, collect):
+        """`collect()` returns [(name, kind, help, labels_dict, value)], read at scrape time."""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        described = set()
+
+        def header(name, kind, help_text=None):
+            if name in described:
+                return
+            described.add(name)
+            kind, help_text = self._help.get(name, (kind, help_text or name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, dict(h, counts=list(h["counts"]))) for key, h in self._histograms.items())
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {_value(value)}")
+
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            cumulative += histogram["counts"][-1]
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_value(histogram['sum'])}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+        for collect in self._collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                print("Error collecting metrics:", e)
+                continue
+            for name, kind, help_text, labels, value in samples:
+                header(name, kind, help_text)
+                lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+registry.describe("qa_requests_total", "counter", "Answered requests by endpoint and outcome (cached, metrics, rag, error)")
+registry.describe("qa_request_seconds", "histogram", "End-to-end request latency")
+registry.describe("qa_stage_seconds", "histogram", "Latency of each pipeline stage")
+
+_log_lock = threading.Lock()
+
+def write_request_log(record):
+    line = json.dumps(record, ensure_ascii=False)
+    with _log_lock:
+        if REQUEST_LOG == "-":
+            print(line, flush=True)
+        else:
+            with open(REQUEST_LOG, "a") as f:
+                f.write(line + "\n")
+
+def record_request(timer, endpoint, outcome, **fields):
+    """
+    Folds a finished request's StageTimer into the registry (stage histograms, request
+    latency, one qa_<name>_total counter per count) and writes its structured log line.
+    """
+    total = time.perf_counter() - timer.started
+    registry.inc("qa_requests_total", endpoint=endpoint, outcome=outcome)
+    registry.observe("qa_request_seconds", total, endpoint=endpoint)
+    for stage, ms in timer.stages.items():
+        registry.observe("qa_stage_seconds", ms / 1000, stage=stage)
+    for name, value in timer.counts.items():
+        registry.inc(f"qa_{name}_total", value)
+
+    if REQUEST_LOG:
+        write_request_log(dict(
+            fields,
+            ts=round(time.time(), 3),
+            request_id=timer.request_id,
+            endpoint=endpoint,
+            outcome=outcome,
+            total_ms=round(total * 1000, 1),
+            stages=timer.report(),
+            counts=timer.counts,
+        ))
@@ -0,0 +1,40 @@
+import time
+import uuid
+from contextlib import contextmanager
+
+class StageTimer:
+    """
+    Wall time per pipeline stage (classify, retrieve, rerank, pack, generate, ...) for one
+    request, in milliseconds, plus per-request counts (retrieved docs, prompt tokens, ...).
+    A stage entered twice is summed. utils.telemetry.record_request exports both.
+    """
+
+    def __init__(self):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counts = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds * 1000
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    async def measure(self, name, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def report(self):
+        return {name: round(ms, 1) for name, ms in self.stages.items()}
@@ -0,0 +1,51 @@
+from dotenv import load_dotenv
+import json
+import argparse
+from common.pdf_text import load_pages
+from common.chunking import split_pages
+from common.summarizer import summarize_single_shot, summarize_map_reduce
+from common.llm import get_backend
+
+load_dotenv()
+
+def split_pdf_into_chunks(pdf_path: str):
+    documents = load_pages(pdf_path)
+    return split_pages(documents, doc_type="concall")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a concall PDF into an ExtractedReport")
+    parser.add_argument("pdf")
+    parser.add_argument("--mode", choices=["map_reduce", "single_shot", "compare"], default="map_reduce",
+                        help="compare runs both modes and prints their wall-clock and token use side by side")
+    parser.add_argument("--model", default="models/gemini-2.5-flash", help="Gemini or OpenAI model; LLM_PROVIDER=stub runs offline")
+    parser.add_argument("--map-budget", type=int, default=6000, help="Max input tokens per map call")
+    parser.add_argument("--reduce-budget", type=int, default=12000, help="Max tokens of merged facts sent to the reduce call")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent map calls")
+    parser.add_argument("--out", help="Write the report JSON here (map_reduce result in compare mode)")
+    args = parser.parse_args()
+
+    backend = get_backend(args.model)
+    chunks = split_pdf_into_chunks(args.pdf)
+
+    runs = []
+    if args.mode in ("single_shot", "compare"):
+        runs.append(summarize_single_shot(backend, chunks))
+    if args.mode in ("map_reduce", "compare"):
+        runs.append(summarize_map_reduce(
+            backend, chunks,
+            map_budget=args.map_budget,
+            reduce_budget=args.reduce_budget,
+            workers=args.workers
+        ))
+
+    print(f"{'mode':<12} {'calls':>5} {'input tok':>10} {'output tok':>10} {'wall s':>8}")
+    for _, stats in runs:
+        row = stats.as_dict()
+        print(f"{row['mode']:<12} {row['calls']:>5} {row['input_tokens']:>10} {row['output_tokens']:>10} {row['wall_seconds']:>8}")
+
+    report = runs[-1][0]
+    if args.out:
+        with open(args.out, 'w') as jsn:
+            jsn.write(json.dumps(report.model_dump(), indent=2))
+    else:
+        print(json.dumps(report.model_dump(), indent=2))